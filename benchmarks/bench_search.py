@@ -0,0 +1,66 @@
+"""
+Product search: FTS5 index versus the previous `icontains` scan.
+
+    python -m benchmarks.bench_search [PRODUCTS]
+"""
+import random
+import sys
+
+from benchmarks.utils import measure, report, setup_django
+
+WORDS = (
+    'wireless bluetooth speaker phone case leather wallet desk lamp garden hose '
+    'kettle steel bottle running shoes cotton shirt wool socks gaming mouse '
+    'keyboard monitor stand charger cable backpack travel mug ceramic plate'
+).split()
+SYLLABLES = 'ka lo mi nu re sa ti vo ze pa'.split()
+QUERIES = ['wireless speaker', 'leather', 'gaming mou', 'kalomi', 'nusa tivo']
+
+
+def main():
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else 50000
+    setup_django()
+
+    from django.test import override_settings
+    from django.urls import reverse
+    from rest_framework.test import APIClient
+
+    from products.models import Product
+    from products.search import get_search_backend
+
+    rng = random.Random(0)
+    # A few thousand rare words make most queries selective, as in a real catalog.
+    vocabulary = WORDS + [''.join(rng.choices(SYLLABLES, k=3)) for _ in range(5000)]
+    Product.objects.bulk_create(
+        [
+            Product(
+                title=f"{' '.join(rng.choices(vocabulary, k=3))} #{i}",
+                slug=f'product-{i}',
+                description=' '.join(rng.choices(vocabulary, k=40)),
+                price=rng.randint(1, 500),
+            )
+            for i in range(count)
+        ],
+        batch_size=2000
+    )
+    get_search_backend().rebuild()
+    print(f'{count} products')
+
+    client = APIClient()
+    url = reverse('product-list')
+    backends = {
+        'icontains': 'products.search.DatabaseSearchBackend',
+        'fts5': 'products.search.SQLiteFTS5Backend',
+    }
+    for name, path in backends.items():
+        with override_settings(PRODUCT_SEARCH={'BACKEND': path}):
+            backend = get_search_backend()
+            report(f'{name}: search()', measure(lambda i: backend.search(QUERIES[i % len(QUERIES)], 1000), 50))
+            report(
+                f'{name}: GET products/?search=',
+                measure(lambda i: client.get(url, {'search': QUERIES[i % len(QUERIES)]}), 50)
+            )
+
+
+if __name__ == '__main__':
+    main()
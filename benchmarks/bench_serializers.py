@@ -0,0 +1,76 @@
+"""
+Product list serialization: compiled field plan versus DRF's per-field dispatch.
+
+Serializes the same already-loaded products both ways, so only CPU time is
+measured, and checks that the rendered JSON is identical.
+
+    python -m benchmarks.bench_serializers [PRODUCTS]
+"""
+import random
+import sys
+
+from benchmarks.utils import measure, report, setup_django
+
+REPEAT = 30
+
+
+def main():
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else 1000
+    setup_django()
+
+    from rest_framework.renderers import JSONRenderer
+    from rest_framework.request import Request
+    from rest_framework.test import APIRequestFactory
+
+    from products.compiled import CompiledListSerializer, compile_serializer, render
+    from products.models import Product, ProductCategory, ProductTag
+    from products.serializers import ProductSerializer
+
+    rng = random.Random(0)
+    categories = [ProductCategory.objects.create(title=f'Category {i}') for i in range(10)]
+    tags = [ProductTag.objects.create(title=f'Tag {i}') for i in range(20)]
+    Product.objects.bulk_create(
+        [
+            Product(
+                title=f'Product {i}',
+                slug=f'product-{i}',
+                description='lorem ipsum ' * 20,
+                price=f'{rng.randint(1, 100000) / 100:.2f}',
+                category=rng.choice(categories),
+            )
+            for i in range(count)
+        ],
+        batch_size=2000
+    )
+    Product.tags.through.objects.bulk_create([
+        Product.tags.through(product_id=product_id, producttag_id=tag.pk)
+        for product_id in Product.objects.values_list('pk', flat=True)
+        for tag in rng.sample(tags, 3)
+    ])
+    print(f'{count} products')
+
+    factory = APIRequestFactory()
+    renderer = JSONRenderer()
+
+    def serialize(params):
+        request = Request(factory.get('/products/', params))
+        products = list(Product.objects.all())
+        return ProductSerializer(products, many=True, context={'request': request})
+
+    for label, params in (('default', {}), ('?fields=id,title,price', {'fields': 'id,title,price'})):
+        serializer = serialize(params)
+        CompiledListSerializer.compiled = False
+        expected = renderer.render(serializer.to_representation(serializer.instance))
+        report(f'{label}: drf', measure(lambda i: serializer.to_representation(serializer.instance), REPEAT))
+        CompiledListSerializer.compiled = True
+        assert renderer.render(serializer.to_representation(serializer.instance)) == expected
+        report(f'{label}: compiled', measure(lambda i: serializer.to_representation(serializer.instance), REPEAT))
+
+    request = Request(factory.get('/products/', {'fields': 'id,title,price,category,created_at'}))
+    rows = list(Product.objects.values('id', 'title', 'price', 'category', 'created_at'))
+    plan = compile_serializer(ProductSerializer(many=True, context={'request': request}).child, rows=True)
+    report('values() rows: compiled', measure(lambda i: [render(plan, row) for row in rows], REPEAT))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,42 @@
+"""
+Product detail latency with and without the view buffer.
+
+Every request comes from a new IP address, so each one records a view.
+
+    python -m benchmarks.bench_view_buffer
+"""
+from benchmarks.utils import measure, report, setup_django
+
+REQUESTS = 500
+
+
+def main():
+    setup_django()
+
+    from django.test import override_settings
+    from django.urls import reverse
+    from rest_framework.test import APIClient
+
+    from products.models import Product
+    from products.tracking import view_buffer
+
+    client = APIClient()
+
+    def run(title):
+        # A fresh product per run keeps the ProductView lookups comparable.
+        product = Product.objects.create(title=title, description='', price=10)
+        url = reverse('product-detail', kwargs={'pk': product.pk})
+
+        def request(i):
+            client.get(url, REMOTE_ADDR=f'10.0.{i // 256}.{i % 256}')
+        return request
+
+    with override_settings(PRODUCT_VIEW_BUFFER={'ENABLED': False}):
+        report('detail, unbuffered', measure(run('unbuffered'), REQUESTS))
+    with override_settings(PRODUCT_VIEW_BUFFER={'ENABLED': True}):
+        report('detail, buffered (incl. flushes)', measure(run('buffered'), REQUESTS))
+    view_buffer.flush()
+
+
+if __name__ == '__main__':
+    main()
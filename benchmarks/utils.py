@@ -0,0 +1,59 @@
+"""
+Helpers shared by the benchmark scripts.
+
+Benchmarks run against a throw-away test database, e.g.:
+
+    python -m benchmarks.bench_view_buffer
+"""
+import atexit
+import os
+import statistics
+import tempfile
+import time
+
+
+def setup_django():
+    """
+    Configure Django with the response cache off and create an empty,
+    file-backed test database.
+
+    A file is used rather than SQLite's in-memory default so that writes pay
+    the same commit cost they would in a real deployment.
+    """
+    os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'shop_api.settings')
+    import django
+    from django.conf import settings
+
+    workdir = tempfile.mkdtemp(prefix='shop-bench-')
+    settings.DATABASES['default']['TEST'] = {'NAME': os.path.join(workdir, 'bench.sqlite3')}
+    # Measure the code paths, not responses cached by an earlier pass.
+    settings.PRODUCT_RESPONSE_CACHE = {'ENABLED': False}
+    django.setup()
+
+    from django.db import connection
+    from django.test.utils import setup_test_environment
+
+    setup_test_environment()
+    old_name = connection.creation.create_test_db(verbosity=0)
+    atexit.register(connection.creation.destroy_test_db, old_name, verbosity=0)
+
+
+def measure(func, repeat):
+    """
+    Call `func(i)` `repeat` times and return latency statistics in milliseconds.
+    """
+    timings = []
+    for i in range(repeat):
+        start = time.perf_counter()
+        func(i)
+        timings.append((time.perf_counter() - start) * 1000)
+    timings.sort()
+    return {
+        'mean': statistics.mean(timings),
+        'p50': timings[len(timings) // 2],
+        'p95': timings[int(len(timings) * 0.95) - 1],
+    }
+
+
+def report(name, stats):
+    print(f"{name:<40} mean {stats['mean']:8.3f} ms   p50 {stats['p50']:8.3f} ms   p95 {stats['p95']:8.3f} ms")
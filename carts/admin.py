@@ -1,5 +1,5 @@
 from django.contrib import admin
-from .models import Cart, CartItem, DiscountCode, CartDiscountUse
+from .models import Cart, CartItem, DiscountCode, CartDiscountUse, StockReservation
 
 class CartItemInline(admin.TabularInline):
     model = CartItem
@@ -14,6 +14,12 @@ class CartAdmin(admin.ModelAdmin):
 class CartItemAdmin(admin.ModelAdmin):
     list_display = ('cart', 'product', 'quantity', 'total_price')
 
+@admin.register(StockReservation)
+class StockReservationAdmin(admin.ModelAdmin):
+    list_display = ('item', 'product', 'quantity', 'expires_at')
+    raw_id_fields = ('item', 'product')
+    ordering = ('expires_at', )
+
 @admin.register(DiscountCode)
 class DiscountCodeAdmin(admin.ModelAdmin):
     list_display = ('title', 'code', 'expires_in', 'created_at', 'expired_at', 'discount_value', 'discount_type', 'is_active', 'can_uses', 'use_count')
@@ -0,0 +1,28 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from carts.reservations import release_expired
+
+
+class Command(BaseCommand):
+    help = 'Give the stock of expired cart reservations back to the products.'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--interval',
+            type=float,
+            default=0,
+            help='Keep running and sweep every INTERVAL seconds.'
+        )
+
+    def handle(self, *args, **options):
+        interval = options['interval']
+        while True:
+            released = 0
+            while batch := release_expired():
+                released += batch
+            self.stdout.write(f'Released {released} expired reservations.')
+            if not interval:
+                break
+            time.sleep(interval)
@@ -48,6 +48,19 @@ class CartItem(models.Model):
     def total_price(self):
         return self.product.price * self.quantity
 
+class StockReservation(models.Model):
+    """
+    Stock held for a cart item until `expires_at`. The held quantity is also
+    counted in `Product.reserved_quantity` (see carts.reservations).
+    """
+    item = models.OneToOneField(CartItem, on_delete=models.CASCADE, related_name='reservation')
+    product = models.ForeignKey(Product, on_delete=models.CASCADE, related_name='reservations')
+    quantity = models.PositiveIntegerField()
+    expires_at = models.DateTimeField(db_index=True)
+
+    def __str__(self):
+        return f"{self.quantity} × {self.product_id} until {self.expires_at:%Y-%m-%d %H:%M}"
+
 class DiscountCode(models.Model):
     class DiscountTypes(models.TextChoices):
         PERCENTAGE = ('P', 'Percentage')
@@ -0,0 +1,118 @@
+from django.conf import settings
+from django.core.exceptions import ValidationError
+from django.db import IntegrityError, transaction
+from django.db.models import F
+from django.utils import timezone
+from django.utils.timezone import timedelta
+
+from products.models import Product
+from .models import StockReservation
+
+RESERVATION_DEFAULTS = {
+    'TTL': 15 * 60,
+    'BATCH_SIZE': 500,
+}
+
+
+def get_reservation_settings():
+    """Return the CART_RESERVATIONS setting merged over the defaults."""
+    return {**RESERVATION_DEFAULTS, **getattr(settings, 'CART_RESERVATIONS', {})}
+
+
+def reserve(item, quantity=None):
+    """
+    Hold `quantity` units (default: the item's quantity) for a cart item and
+    restart its TTL.
+
+    Only the difference to what the item already holds is applied, with one
+    conditional UPDATE on the product's `reserved_quantity` counter, so the
+    cost does not depend on how many carts hold the product.
+
+    Row locks are not relied on (SELECT ... FOR UPDATE is a no-op on
+    SQLite): the reservation row only changes if it still holds the
+    quantity the difference was computed from, and the stock check and the
+    increment are a single UPDATE. A concurrent change of the same item
+    makes the call start over.
+
+    Raises:
+        ValidationError: Not enough stock is available.
+    """
+    quantity = item.quantity if quantity is None else quantity
+    while True:
+        with transaction.atomic():
+            reservation = StockReservation.objects.filter(item=item).first()
+            if _apply_reservation(item, reservation, quantity):
+                return StockReservation.objects.filter(item=item).first()
+
+
+def _apply_reservation(item, reservation, quantity):
+    """
+    Move `item`'s hold from `reservation` (as read) to `quantity`.
+
+    Returns:
+        bool: False if the reservation changed since it was read.
+    """
+    held = reservation.quantity if reservation else 0
+    expires_at = timezone.now() + timedelta(seconds=get_reservation_settings()['TTL'])
+    if reservation is None:
+        if quantity == 0:
+            return True
+        try:
+            with transaction.atomic():
+                StockReservation.objects.create(
+                    item=item, product_id=item.product_id, quantity=quantity, expires_at=expires_at
+                )
+        except IntegrityError:
+            # Another call created the item's reservation first
+            return False
+    else:
+        current = StockReservation.objects.filter(pk=reservation.pk, quantity=held)
+        changed = current.delete()[0] if quantity == 0 else current.update(quantity=quantity, expires_at=expires_at)
+        if not changed:
+            return False
+
+    delta = quantity - held
+    products = Product.objects.filter(pk=item.product_id)
+    if delta > 0:
+        if not products.filter(quantity__gte=F('reserved_quantity') + delta).update(
+            reserved_quantity=F('reserved_quantity') + delta
+        ):
+            available = products.values_list('quantity', 'reserved_quantity').first() or (0, 0)
+            raise ValidationError(
+                f'Only {max(0, available[0] - available[1])} units of this product are available.'
+            )
+    elif delta < 0:
+        products.update(reserved_quantity=F('reserved_quantity') + delta)
+    return True
+
+
+def release(item):
+    """Give back whatever a cart item holds."""
+    reserve(item, 0)
+
+
+def release_expired(now=None, batch_size=None):
+    """
+    Release up to `batch_size` holds that expired by `now`, oldest first.
+
+    The batch is read through the `expires_at` index; its quantities are
+    summed per product so each product's counter takes one UPDATE.
+
+    Returns:
+        int: Number of holds released.
+    """
+    now = now or timezone.now()
+    batch_size = batch_size or get_reservation_settings()['BATCH_SIZE']
+    with transaction.atomic():
+        expired = list(
+            StockReservation.objects.select_for_update().filter(expires_at__lte=now).order_by(
+                'expires_at'
+            ).values_list('pk', 'product_id', 'quantity')[:batch_size]
+        )
+        held = {}
+        for _, product_id, quantity in expired:
+            held[product_id] = held.get(product_id, 0) + quantity
+        for product_id, quantity in held.items():
+            Product.objects.filter(pk=product_id).update(reserved_quantity=F('reserved_quantity') - quantity)
+        StockReservation.objects.filter(pk__in=[pk for pk, _, _ in expired]).delete()
+    return len(expired)
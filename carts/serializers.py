@@ -1,19 +1,23 @@
+from django.core.exceptions import ValidationError as DjangoValidationError
+from django.db import transaction
 from rest_framework import serializers
 
 from products.models import Product
 from .models import CartItem, Cart, CartDiscountUse, DiscountCode
+from .reservations import reserve
 
 
 class CartItemSerializer(serializers.ModelSerializer):
     product_id = serializers.PrimaryKeyRelatedField(
-        queryset=Product.objects.filter(is_active=True, is_delete=False),
+        queryset=Product.published.all(),
         write_only=True,
         source='product'
     )
+    reserved_until = serializers.DateTimeField(source='reservation.expires_at', read_only=True)
 
     class Meta:
         model = CartItem
-        fields = ('id', 'product_id', 'quantity', 'total_price')
+        fields = ('id', 'product_id', 'quantity', 'total_price', 'reserved_until')
         read_only_fields = ('id', 'total_price')
 
 
@@ -25,20 +29,29 @@ class CartSerializer(serializers.ModelSerializer):
         fields = ('id', 'user', 'items', 'total_price', 'created_at', 'updated_at', 'discount')
         read_only_fields = ('id', 'user', 'total_price', 'created_at', 'updated_at', 'discount')
 
+    @transaction.atomic
     def create(self, validated_data):
         items_data = validated_data.pop('items', [])
         cart = Cart.objects.create(**validated_data)
-        for item in items_data:
-            CartItem.objects.create(cart=cart, **item)
+        self.add_items(cart, items_data)
         return cart
 
+    @transaction.atomic
     def update(self, instance, validated_data):
         items_data = validated_data.pop('items', [])
         instance.items.all().delete()
-        for item in items_data:
-            CartItem.objects.create(cart=instance, **item)
+        self.add_items(instance, items_data)
         return instance
 
+    def add_items(self, cart, items_data):
+        """Create the items and hold their stock (see carts.reservations)."""
+        for item in items_data:
+            item = CartItem.objects.create(cart=cart, **item)
+            try:
+                reserve(item)
+            except DjangoValidationError as error:
+                raise serializers.ValidationError({'items': error.messages})
+
 
 class DiscountUseSerializer(serializers.ModelSerializer):
     cart = CartSerializer(read_only=True)
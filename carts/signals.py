@@ -0,0 +1,11 @@
+from django.db.models.signals import pre_delete
+from django.dispatch import receiver
+
+from .models import CartItem
+from .reservations import release
+
+
+@receiver(pre_delete, sender=CartItem)
+def release_item_stock(sender, instance, **kwargs):
+    """Removing an item, or its cart, gives its held stock back."""
+    release(instance)
@@ -1,3 +1,6 @@
+import re
+
+
 def product_image_upload_to(instance, filename):
     """
     Returns path: product_images/<product-slug>/<original-filename>
@@ -20,3 +23,26 @@ def get_client_ip(request):
     else:
         ip = request.META.get('REMOTE_ADDR')
     return ip
+
+MAX_ID = 2 ** 63 - 1
+
+
+def parse_id(value):
+    """
+    Parse a positive integer ID from a query or path value.
+
+    Only ASCII digits are accepted (`str.isdigit` also accepts characters
+    such as '²' that `int()` rejects), and the result must fit a 64-bit
+    database integer.
+
+    Args:
+        value: The raw value, usually a string.
+
+    Returns:
+        int | None: The ID, or None if the value is not a valid ID.
+    """
+    value = str(value)
+    if not re.fullmatch(r'[0-9]+', value):
+        return None
+    value = int(value)
+    return value if value <= MAX_ID else None
@@ -76,7 +76,7 @@ class ProductInventoryInline(admin.TabularInline):
 class ProductAdmin(SlugPrepoulatedFieldMixin, ActiveDeleteAdmin):
     list_display = (
         'title', 'slug', 'price', 'category', 'quantity',
-        'view_count', 'like_count', 'is_active', 'is_delete', 'created_at'
+        'view_count', 'like_count', 'rating_average', 'is_active', 'is_delete', 'created_at'
     )
     search_fields = ('title', 'slug', 'description')
     raw_id_fields = ('category',)
@@ -104,7 +104,7 @@ class ProductCommentAdmin(BaseAdmin):
 class ProductCategoryAdmin(ActiveDeleteAdmin):
     list_display = ('title', 'slug', 'parnt', 'is_active', 'is_delete', 'created_at')
     search_fields = ('title', 'slug')
-    ordering = ('title',)
+    ordering = ('path',)
 
 
 @admin.register(ProductTag)
@@ -142,3 +142,7 @@ class ProductInventoryAdmin(BaseAdmin):
     list_display = ('product__title', 'change', 'created_at')
     list_filter = ('product', 'created_at')
     ordering = ('change', )
+
+    def has_change_permission(self, request, obj=None):
+        # The ledger is append-only; corrections are new entries.
+        return obj is None
@@ -0,0 +1,150 @@
+from functools import reduce
+
+from django.db.models import Q
+from rest_framework.filters import BaseFilterBackend
+
+from .cache import get_cache, get_response_cache_settings
+from .models import AttributeValue, ProductAttributeValue
+
+# Above this many matches the filter joins on ProductAttributeValue instead
+# of inlining the ids, which would run into SQLite's bound-variable limit.
+MAX_INLINE_IDS = 500
+
+
+def posting_key(value_id):
+    return f'products:attribute-index:{value_id}'
+
+
+def get_posting_lists(value_ids):
+    """
+    Inverted index lookup: {attribute_value_id: sorted list of product ids}.
+
+    Lists are read from the cache in one round trip; the missing ones are
+    loaded with a single query and cached. Signals drop the list of a value
+    whenever one of its ProductAttributeValue rows changes.
+    """
+    value_ids = set(value_ids)
+    cache = get_cache()
+    cached = cache.get_many([posting_key(value_id) for value_id in value_ids])
+    postings = {value_id: cached[posting_key(value_id)] for value_id in value_ids if posting_key(value_id) in cached}
+
+    missing = value_ids - postings.keys()
+    if missing:
+        loaded = {value_id: [] for value_id in missing}
+        rows = ProductAttributeValue.objects.filter(attribute_value_id__in=missing).order_by(
+            'attribute_value_id', 'product_id'
+        ).values_list('attribute_value_id', 'product_id')
+        for value_id, product_id in rows:
+            loaded[value_id].append(product_id)
+        cache.set_many(
+            {posting_key(value_id): ids for value_id, ids in loaded.items()},
+            get_response_cache_settings()['TIMEOUT']
+        )
+        postings.update(loaded)
+    return postings
+
+
+def invalidate_posting_lists(value_ids):
+    get_cache().delete_many([posting_key(value_id) for value_id in value_ids])
+
+
+def parse_attribute_filters(values):
+    """
+    `['color:red,blue', 'size:m']` -> {'color': {'red', 'blue'}, 'size': {'m'}}.
+    Values are matched case-insensitively; malformed terms are ignored.
+    """
+    filters = {}
+    for term in values:
+        slug, _, options = term.partition(':')
+        options = {option.strip().lower() for option in options.split(',') if option.strip()}
+        if slug.strip() and options:
+            filters.setdefault(slug.strip(), set()).update(options)
+    return filters
+
+
+def resolve_values(filters):
+    """
+    {attribute slug: [attribute value ids]} for `filters`, or None when some
+    attribute has none of the given values (nothing can match).
+    """
+    condition = reduce(
+        Q.__or__,
+        (Q(attribute__slug=slug, value__iexact=value) for slug, options in filters.items() for value in options)
+    )
+    values = AttributeValue.objects.filter(condition).values_list('pk', 'attribute__slug', 'value')
+    wanted = {slug: [] for slug in filters}
+    for pk, slug, value in values:
+        if value.lower() in filters.get(slug, ()):
+            wanted[slug].append(pk)
+    return wanted if all(wanted.values()) else None
+
+
+def match_products(filters, wanted=None):
+    """
+    Product ids having, for every attribute, at least one of the given values.
+
+    Each attribute is the union of its values' posting lists and the
+    attributes are intersected, smallest first, so the database is only
+    asked to resolve the values themselves.
+
+    Args:
+        filters: {attribute slug: set of lower-cased values}.
+        wanted: The values already resolved by `resolve_values`, if any.
+
+    Returns:
+        set: The matching product ids.
+    """
+    if wanted is None:
+        wanted = resolve_values(filters)
+    if not wanted:
+        return set()
+
+    postings = get_posting_lists(pk for pks in wanted.values() for pk in pks)
+    groups = sorted(
+        (set().union(*(postings[pk] for pk in pks)) for pks in wanted.values()),
+        key=len
+    )
+    return groups[0].intersection(*groups[1:])
+
+
+class AttributeFilter(BaseFilterBackend):
+    """
+    `?attribute=color:red,blue&attribute=size:m`: products that are red or
+    blue, and size M. Served from per-value posting lists (see
+    `match_products`) instead of one join per attribute; only when more
+    than MAX_INLINE_IDS products match are the attributes filtered through
+    ProductAttributeValue subqueries.
+    """
+    attribute_param = 'attribute'
+
+    def filter_queryset(self, request, queryset, view):
+        filters = parse_attribute_filters(request.query_params.getlist(self.attribute_param))
+        if not filters:
+            return queryset
+        wanted = resolve_values(filters)
+        if wanted is None:
+            return queryset.none()
+        ids = match_products(filters, wanted)
+        if not ids:
+            return queryset.none()
+        if len(ids) <= MAX_INLINE_IDS:
+            return queryset.filter(pk__in=sorted(ids))
+        for value_ids in wanted.values():
+            queryset = queryset.filter(pk__in=ProductAttributeValue.objects.filter(
+                attribute_value_id__in=value_ids
+            ).values('product_id'))
+        return queryset
+
+    def get_schema_operation_parameters(self, view):
+        return [{
+            'name': self.attribute_param,
+            'required': False,
+            'in': 'query',
+            'description': (
+                'Attribute filter as `<attribute slug>:<value>[,<value>...]`. '
+                'Values of one attribute are ORed; repeat the parameter to AND attributes.'
+            ),
+            'schema': {'type': 'array', 'items': {'type': 'string'}},
+            'style': 'form',
+            'explode': True,
+        }]
@@ -0,0 +1,147 @@
+import hashlib
+import time
+from urllib.parse import urlencode
+
+from django.conf import settings
+from django.core.cache import caches
+from django.utils.cache import get_conditional_response
+from django.utils.http import parse_http_date_safe
+from rest_framework.response import Response
+
+RESPONSE_CACHE_DEFAULTS = {
+    'ENABLED': True,
+    'ALIAS': 'catalog-file',
+    'TIMEOUT': 300,
+}
+
+CATALOG_VERSION_KEY = 'products:version:catalog'
+HITS_KEY = 'products:cache:hits'
+MISSES_KEY = 'products:cache:misses'
+
+
+def get_response_cache_settings():
+    """Return the PRODUCT_RESPONSE_CACHE setting merged over the defaults."""
+    return {**RESPONSE_CACHE_DEFAULTS, **getattr(settings, 'PRODUCT_RESPONSE_CACHE', {})}
+
+
+def get_cache():
+    return caches[get_response_cache_settings()['ALIAS']]
+
+
+def _initial_version():
+    # Time-based, so a version that was evicted never comes back with a value
+    # that older cache entries were stored under.
+    return time.time_ns() // 1000
+
+
+def get_version(key):
+    cache = get_cache()
+    version = cache.get(key)
+    if version is None:
+        cache.add(key, _initial_version(), None)
+        version = cache.get(key)
+    return version
+
+
+def bump_version(key):
+    cache = get_cache()
+    try:
+        cache.incr(key)
+    except ValueError:
+        cache.set(key, _initial_version(), None)
+
+
+def bump_catalog_version():
+    """Invalidate every cached list response."""
+    bump_version(CATALOG_VERSION_KEY)
+
+
+def normalized_query(request):
+    """The query string with keys and repeated values in a stable order."""
+    return urlencode(
+        sorted((key, value) for key, values in request.query_params.lists() for value in values)
+    )
+
+
+def _record(key):
+    cache = get_cache()
+    try:
+        cache.incr(key)
+    except ValueError:
+        cache.add(key, 0, None)
+        cache.incr(key)
+
+
+def get_cache_stats():
+    """Hit/miss counters of the response cache."""
+    cache = get_cache()
+    hits = cache.get(HITS_KEY, 0)
+    misses = cache.get(MISSES_KEY, 0)
+    total = hits + misses
+    return {
+        'hits': hits,
+        'misses': misses,
+        'hit_rate': round(hits / total, 4) if total else 0,
+    }
+
+
+class CachedResponseMixin:
+    """
+    Serve anonymous GET responses from the cache configured in
+    PRODUCT_RESPONSE_CACHE.
+
+    Entries are keyed on the view, its URL kwargs, the normalized query
+    string and the versions from `get_cache_versions()`: the catalog version
+    counter by default, which model signals bump (see products.signals), so
+    a change makes the affected entries unreachable instead of deleting
+    them; they age out after TIMEOUT seconds. Counters that change without
+    a save (views, likes) are refreshed at the latest after TIMEOUT seconds.
+
+    A cached response keeps its ETag/Last-Modified headers, and conditional
+    requests are answered with 304 from them. Responses carry an
+    `X-Cache: HIT` or `X-Cache: MISS` header.
+    """
+    cache_prefix = None
+
+    def get_cache_versions(self):
+        return [get_version(CATALOG_VERSION_KEY)]
+
+    def get_cache_key(self, request):
+        versions = ':'.join(str(version) for version in self.get_cache_versions())
+        kwargs = ':'.join(f'{key}={value}' for key, value in sorted(self.kwargs.items()))
+        query = hashlib.md5(normalized_query(request).encode()).hexdigest()
+        return f'products:response:{self.cache_prefix}:{kwargs}:{versions}:{query}'
+
+    def get_cached_response(self, request, build_response):
+        config = get_response_cache_settings()
+        if not config['ENABLED'] or request.user.is_authenticated:
+            return build_response()
+
+        cache = get_cache()
+        key = self.get_cache_key(request)
+        entry = cache.get(key)
+        if entry is not None:
+            _record(HITS_KEY)
+            response = Response(entry['data'], headers=entry['headers'])
+            response['X-Cache'] = 'HIT'
+            return get_conditional_response(
+                request,
+                etag=entry['headers'].get('ETag'),
+                last_modified=entry['last_modified'],
+                response=response
+            )
+
+        _record(MISSES_KEY)
+        response = build_response()
+        if response.status_code == 200:
+            headers = {
+                name: response[name] for name in ('ETag', 'Last-Modified') if response.has_header(name)
+            }
+            last_modified = headers.get('Last-Modified')
+            cache.set(key, {
+                'data': response.data,
+                'headers': headers,
+                'last_modified': last_modified and parse_http_date_safe(last_modified),
+            }, config['TIMEOUT'])
+        response['X-Cache'] = 'MISS'
+        return response
@@ -0,0 +1,115 @@
+from django.db.models import Q
+
+from core.utils import parse_id
+
+from .cache import bump_version, get_cache, get_response_cache_settings, get_version
+from .models import ProductCategory
+
+CATEGORY_VERSION_KEY = 'products:version:categories'
+PATH_SEPARATOR = '/'
+
+
+def subtree_filter(path, prefix=''):
+    """
+    Match a category and all of its descendants by materialized path.
+
+    Every path in the subtree starts with `path`, which ends with the
+    separator, so the subtree is the half-open range [path, path with the
+    separator replaced by the next character): one range scan on the index.
+
+    Args:
+        path: The materialized path of the subtree root.
+        prefix: Lookup prefix for filtering related models, e.g. 'category__'.
+    """
+    upper = path[:-1] + chr(ord(PATH_SEPARATOR) + 1)
+    return Q(**{f'{prefix}path__gte': path, f'{prefix}path__lt': upper})
+
+
+def get_category(value):
+    """Return the active category with the given pk or slug, or None."""
+    categories = ProductCategory.published.all()
+    pk = parse_id(value)
+    lookup = {'pk': pk} if pk is not None else {'slug': value}
+    return categories.filter(**lookup).first()
+
+
+def rebuild_category_paths():
+    """
+    Recompute every stored path from the `parnt` links (one read, one bulk
+    write). Categories whose parent chain is broken keep their old path.
+
+    Returns:
+        int: Number of categories whose path changed.
+    """
+    categories = {category.pk: category for category in ProductCategory.objects.only('pk', 'parnt', 'path')}
+    paths = {}
+
+    def resolve(category, seen=()):
+        if category.pk in paths:
+            return paths[category.pk]
+        if category.pk in seen:
+            return None
+        parent_path = ''
+        if category.parnt_id:
+            parent = categories.get(category.parnt_id)
+            parent_path = parent and resolve(parent, (*seen, category.pk))
+            if parent_path is None:
+                return None
+        paths[category.pk] = parent_path + ProductCategory.path_segment(category.pk)
+        return paths[category.pk]
+
+    changed = []
+    for category in categories.values():
+        path = resolve(category)
+        if path is not None and path != category.path:
+            category.path = path
+            changed.append(category)
+    ProductCategory.objects.bulk_update(changed, ['path'], batch_size=500)
+    bump_category_version()
+    return len(changed)
+
+
+def build_category_tree():
+    """
+    The active category tree from one query, siblings ordered by title.
+
+    Returns:
+        list: Root nodes as {'id', 'title', 'slug', 'children': [...]}.
+        Children of inactive or deleted categories are left out.
+    """
+    rows = ProductCategory.published.order_by('title').values(
+        'id', 'title', 'slug', 'parnt_id'
+    )
+    nodes = {}
+    parents = {}
+    for row in rows:
+        parents[row['id']] = row.pop('parnt_id')
+        nodes[row['id']] = {**row, 'children': []}
+
+    roots = []
+    for pk, node in nodes.items():
+        parent_id = parents[pk]
+        if parent_id is None:
+            roots.append(node)
+        elif parent_id in nodes:
+            nodes[parent_id]['children'].append(node)
+    return roots
+
+
+def get_category_version():
+    return get_version(CATEGORY_VERSION_KEY)
+
+
+def bump_category_version():
+    bump_version(CATEGORY_VERSION_KEY)
+
+
+def get_category_tree():
+    """`build_category_tree()`, cached until a category changes."""
+    cache = get_cache()
+    key = f'products:category-tree:{get_category_version()}'
+    tree = cache.get(key)
+    if tree is None:
+        tree = build_category_tree()
+        cache.set(key, tree, get_response_cache_settings()['TIMEOUT'])
+    return tree
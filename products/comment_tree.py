@@ -0,0 +1,135 @@
+from collections import defaultdict
+
+from django.conf import settings
+from django.db.models import Count, F, Q, Window
+from django.db.models.functions import RowNumber
+
+from .models import ProductComment
+
+COMMENT_DEFAULTS = {
+    'PAGE_SIZE': 20,
+    'REPLY_PREVIEW': 3,
+}
+
+
+def get_comment_settings():
+    """Return the PRODUCT_COMMENTS setting merged over the defaults."""
+    return {**COMMENT_DEFAULTS, **getattr(settings, 'PRODUCT_COMMENTS', {})}
+
+
+def visible_comments(product_id):
+    return ProductComment.published.filter(product_id=product_id)
+
+
+def load_comment_trees(products):
+    """
+    Load the visible comment tree of several products with a single query.
+
+    Every active, non-deleted ProductComment of the given products is fetched
+    at once and the reply tree is built in memory. Each product gets a
+    `_comment_tree` attribute (its top-level comments) and each comment gets a
+    `_reply_list` attribute (its direct replies), which the serializers read
+    instead of querying the database again.
+
+    Replies whose parent is inactive or deleted are not reachable from a root
+    and are therefore hidden, the same as before.
+
+    Args:
+        products: Iterable of Product instances.
+
+    Returns:
+        list: The products, with their comment trees attached.
+    """
+    products = list(products)
+    if not products:
+        return products
+
+    comments = ProductComment.published.filter(
+        product_id__in={product.pk for product in products}
+    ).order_by('pk')
+
+    roots = defaultdict(list)
+    children = defaultdict(list)
+    for comment in comments:
+        if comment.reply_id is None:
+            roots[comment.product_id].append(comment)
+        else:
+            children[comment.reply_id].append(comment)
+        comment._reply_list = children[comment.pk]
+
+    for product in products:
+        product._comment_tree = roots.get(product.pk, [])
+    return products
+
+
+def reply_counts(product_ids, comment_ids):
+    """{comment id: number of visible direct replies}, from one grouped query."""
+    if not comment_ids:
+        return {}
+    return dict(
+        ProductComment.published.filter(
+            product_id__in=product_ids, reply_id__in=comment_ids
+        ).order_by().values('reply_id').annotate(total=Count('pk')).values_list('reply_id', 'total')
+    )
+
+
+def load_reply_previews(comments, limit=None):
+    """
+    Attach the first replies of several comments, with three queries.
+
+    Each comment gets `_reply_count` (its visible direct replies) and
+    `_reply_preview` (the oldest `limit` of them, REPLY_PREVIEW by default),
+    and each previewed reply gets its own `_reply_count`, so clients know
+    when to fetch more from the replies endpoint.
+
+    Args:
+        comments: Iterable of ProductComment instances of the same product(s).
+        limit: Replies previewed per comment.
+
+    Returns:
+        list: The comments.
+    """
+    comments = list(comments)
+    limit = get_comment_settings()['REPLY_PREVIEW'] if limit is None else limit
+    product_ids = {comment.product_id for comment in comments}
+    ids = [comment.pk for comment in comments]
+    counts = reply_counts(product_ids, ids)
+
+    previews = defaultdict(list)
+    if limit and counts:
+        replies = ProductComment.published.filter(
+            product_id__in=product_ids, reply_id__in=list(counts)
+        ).annotate(
+            position=Window(RowNumber(), partition_by=[F('reply_id')], order_by=[F('created_at').asc(), F('pk').asc()])
+        ).filter(position__lte=limit).order_by('reply_id', 'created_at', 'pk')
+        for reply in replies:
+            previews[reply.reply_id].append(reply)
+    preview_counts = reply_counts(product_ids, [reply.pk for replies in previews.values() for reply in replies])
+
+    for comment in comments:
+        comment._reply_count = counts.get(comment.pk, 0)
+        comment._reply_preview = previews.get(comment.pk, [])
+        for reply in comment._reply_preview:
+            reply._reply_count = preview_counts.get(reply.pk, 0)
+    return comments
+
+
+def load_comment_summaries(products):
+    """
+    Attach `_comment_summary` ({'count': ..., 'threads': ...}: visible
+    comments and top-level ones among them) to products, with one query.
+    """
+    products = list(products)
+    summaries = {}
+    if products:
+        summaries = {
+            row['product_id']: row for row in ProductComment.published.filter(
+                product_id__in=[product.pk for product in products]
+            ).order_by().values('product_id').annotate(
+                count=Count('pk'), threads=Count('pk', filter=Q(reply__isnull=True))
+            )
+        }
+    for product in products:
+        row = summaries.get(product.pk, {})
+        product._comment_summary = {'count': row.get('count', 0), 'threads': row.get('threads', 0)}
+    return products
@@ -0,0 +1,183 @@
+import decimal
+from operator import attrgetter, itemgetter
+
+from django.core.exceptions import FieldDoesNotExist
+from rest_framework import fields as drf_fields, relations, serializers
+from rest_framework.fields import SkipField
+from rest_framework.relations import PKOnlyObject
+from rest_framework.settings import api_settings
+
+SKIP = object()
+
+
+def _plain(field, method):
+    """True when `field` uses the stock `method` of its DRF class unchanged."""
+    return getattr(type(field), method.__name__) is method
+
+
+def _decimal_converter(field):
+    if (
+        not getattr(field, 'coerce_to_string', api_settings.COERCE_DECIMAL_TO_STRING)
+        or field.localize or field.normalize_output
+    ):
+        return field.to_representation
+    # DecimalField.quantize, with its context and exponent built once.
+    context = decimal.getcontext().copy()
+    if field.max_digits is not None:
+        context.prec = field.max_digits
+    exponent = decimal.Decimal('.1') ** field.decimal_places if field.decimal_places is not None else None
+    if exponent is None:
+        return field.to_representation
+
+    def convert(value):
+        if not isinstance(value, decimal.Decimal):
+            value = decimal.Decimal(str(value).strip())
+        return '{:f}'.format(value.quantize(exponent, rounding=field.rounding, context=context))
+    return convert
+
+
+def _datetime_converter(field):
+    output_format = getattr(field, 'format', api_settings.DATETIME_FORMAT)
+    if output_format is None or output_format.lower() != drf_fields.ISO_8601:
+        return field.to_representation
+
+    def convert(value):
+        if isinstance(value, str):
+            return value
+        value = field.enforce_timezone(value).isoformat()
+        return value[:-6] + 'Z' if value.endswith('+00:00') else value
+    return convert
+
+
+def _converter(field):
+    """The to_representation of a scalar field, as a plain callable."""
+    for cls, method, fast in (
+        (drf_fields.IntegerField, drf_fields.IntegerField.to_representation, int),
+        (drf_fields.FloatField, drf_fields.FloatField.to_representation, float),
+        (drf_fields.CharField, drf_fields.CharField.to_representation, str),
+        (drf_fields.BooleanField, drf_fields.BooleanField.to_representation, None),
+    ):
+        if isinstance(field, cls) and _plain(field, method):
+            return fast or field.to_representation
+    if isinstance(field, drf_fields.DecimalField) and _plain(field, drf_fields.DecimalField.to_representation):
+        return _decimal_converter(field)
+    if isinstance(field, drf_fields.DateTimeField) and _plain(field, drf_fields.DateTimeField.to_representation):
+        return _datetime_converter(field)
+    return field.to_representation
+
+
+def _none_or(get, convert):
+    def read(instance):
+        value = get(instance)
+        return None if value is None else convert(value)
+    return read
+
+
+def _generic(field):
+    """Field.get_attribute + to_representation, as Serializer.to_representation does."""
+    def read(instance):
+        try:
+            attribute = field.get_attribute(instance)
+        except SkipField:
+            return SKIP
+        check_for_none = attribute.pk if isinstance(attribute, PKOnlyObject) else attribute
+        return None if check_for_none is None else field.to_representation(attribute)
+    return read
+
+
+def _model_field(serializer, source):
+    model = getattr(getattr(serializer, 'Meta', None), 'model', None)
+    if model is None:
+        return None
+    try:
+        return model._meta.get_field(source)
+    except FieldDoesNotExist:
+        return None
+
+
+def _compile_field(serializer, field, rows):
+    source = field.source_attrs[0] if len(field.source_attrs) == 1 else None
+    model_field = _model_field(serializer, source) if source else None
+
+    if isinstance(field, serializers.SerializerMethodField):
+        if rows:
+            raise TypeError(f'`{field.field_name}` needs model instances.')
+        return getattr(serializer, field.method_name)
+
+    if (
+        isinstance(field, relations.PrimaryKeyRelatedField) and source
+        and _plain(field, relations.PrimaryKeyRelatedField.to_representation)
+        and _plain(field, relations.RelatedField.get_attribute)
+        and field.use_pk_only_optimization() and field.pk_field is None
+    ):
+        # `category` -> the `category_id` column, as PKOnlyObject would
+        if rows:
+            return itemgetter(source)
+        if model_field is not None and (model_field.many_to_one or model_field.one_to_one) and model_field.concrete:
+            return attrgetter(model_field.attname)
+
+    if (
+        isinstance(field, relations.ManyRelatedField) and source and not rows
+        and type(field.child_relation) is relations.PrimaryKeyRelatedField and field.child_relation.pk_field is None
+        and _plain(field, relations.ManyRelatedField.get_attribute)
+    ):
+        def read_pks(instance):
+            return [related.pk for related in getattr(instance, source).all()]
+        return read_pks
+
+    if (
+        source and not isinstance(field, (serializers.BaseSerializer, relations.RelatedField, relations.ManyRelatedField))
+        and _plain(field, drf_fields.Field.get_attribute)
+        and (rows or (model_field is not None and model_field.concrete and not model_field.is_relation))
+    ):
+        return _none_or(itemgetter(source) if rows else attrgetter(source), _converter(field))
+
+    if rows:
+        raise TypeError(f'`{field.field_name}` needs model instances.')
+    return _generic(field)
+
+
+def compile_serializer(serializer, rows=False):
+    """
+    Turn a serializer's readable fields into a flat plan, once.
+
+    Each entry is (name, read), where `read(instance)` returns the field's
+    representation: plain attribute getters and converters for scalar
+    fields, the bound method for SerializerMethodFields, primary keys read
+    straight from the instance for PrimaryKeyRelatedFields, and DRF's own
+    get_attribute/to_representation for anything else. The output is the
+    same as `serializer.to_representation`.
+
+    Args:
+        serializer: A bound serializer; its context decides the fields.
+        rows: Build the plan for `values()` dicts instead of instances.
+            Only scalar and primary key fields can be read from rows.
+
+    Raises:
+        TypeError: `rows` was asked for but a field needs instances.
+    """
+    return tuple(
+        (field.field_name, _compile_field(serializer, field, rows))
+        for field in serializer._readable_fields
+    )
+
+
+def render(plan, instance):
+    return {name: value for name, read in plan if (value := read(instance)) is not SKIP}
+
+
+class CompiledListSerializer(serializers.ListSerializer):
+    """
+    Serializes the items through the child's compiled plan (see
+    `compile_serializer`) instead of calling its `to_representation` per
+    item. Set `compiled = False` to use the regular DRF path.
+    """
+    compiled = True
+
+    def to_representation(self, data):
+        if hasattr(data, 'all'):
+            data = data.all()
+        if not self.compiled:
+            return super().to_representation(data)
+        plan = compile_serializer(self.child)
+        return [render(plan, item) for item in data]
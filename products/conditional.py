@@ -0,0 +1,80 @@
+import hashlib
+
+from django.utils.cache import get_conditional_response
+from django.utils.http import http_date
+
+from .cache import normalized_query
+from .likes import get_like_version
+from .serializers import requested_expansions, requested_fields
+
+# Product columns whose values make up a product's version stamp.
+# `modified_at` also moves when comments, images or tags change
+# (see products.signals) and when the rating statistics are rewritten
+# (see products.ratings).
+STAMP_FIELDS = ('modified_at', 'view_count', 'like_count')
+
+
+def representation_variant(request):
+    """
+    What besides the data decides the response body: the query string, the
+    negotiated format and, through `liked_by_me`, the user and their likes.
+    """
+    user = request.user.pk if request.user.is_authenticated else 'anon'
+    context = {'request': request}
+    if user != 'anon' and 'liked_by_me' in requested_expansions(context) | (requested_fields(context) or set()):
+        # Likes go to counter shards and leave the products' stamps alone.
+        user = f'{user}:{get_like_version(user)}'
+    media_type = getattr(request, 'accepted_media_type', '')
+    return f'{normalized_query(request)}|{media_type}|{user}'
+
+
+def make_etag(request, stamps, extra=()):
+    """
+    Strong ETag from product version stamps, without rendering the body.
+
+    Args:
+        request: The request, for the representation variant.
+        stamps: Iterable of dicts with `pk` and the STAMP_FIELDS.
+        extra: Further values the body depends on (e.g. pagination links).
+    """
+    digest = hashlib.md5(representation_variant(request).encode())
+    for stamp in stamps:
+        digest.update(f"|{stamp['pk']}:{stamp['modified_at'].timestamp()}:{stamp['view_count']}:{stamp['like_count']}".encode())
+    for value in extra:
+        digest.update(f'|{value}'.encode())
+    return f'"{digest.hexdigest()}"'
+
+
+def last_modified_of(stamps):
+    """
+    The newest `modified_at` as a POSIX timestamp, or None.
+
+    Only meaningful for a single product: a list also changes when products
+    leave or join it, which doesn't move any remaining stamp, so lists send
+    the ETag alone.
+    """
+    stamps = list(stamps)
+    if not stamps:
+        return None
+    return int(max(stamp['modified_at'] for stamp in stamps).timestamp())
+
+
+def set_validators(response, etag, last_modified):
+    response['ETag'] = etag
+    if last_modified is not None:
+        response['Last-Modified'] = http_date(last_modified)
+    return response
+
+
+def conditional_response(request, etag, last_modified, build_response):
+    """
+    Answer `If-None-Match` / `If-Modified-Since` with 304 before calling
+    `build_response()`; otherwise return its response with the validators set.
+    """
+    not_modified = get_conditional_response(request, etag=etag, last_modified=last_modified)
+    if not_modified is not None:
+        return set_validators(not_modified, etag, last_modified)
+    response = build_response()
+    if 200 <= response.status_code < 300:
+        set_validators(response, etag, last_modified)
+    return response
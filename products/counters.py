@@ -0,0 +1,114 @@
+import random
+from collections import defaultdict
+
+from django.conf import settings
+from django.db import IntegrityError, transaction
+from django.db.models import F, Sum
+from django.utils import timezone
+
+from .models import Product, ProductCounterShard
+
+COUNTER_FIELDS = ('like_count', 'view_count')
+
+COUNTER_DEFAULTS = {
+    'SHARDS': 8,
+}
+
+
+def get_counter_settings():
+    """Return the PRODUCT_COUNTERS setting merged over the defaults."""
+    return {**COUNTER_DEFAULTS, **getattr(settings, 'PRODUCT_COUNTERS', {})}
+
+
+def increment(product_id, field, amount=1):
+    """
+    Atomically add `amount` to a product counter.
+
+    With more than one shard configured the delta goes to a random
+    ProductCounterShard row and reaches `Product.<field>` on the next
+    rollup; otherwise the Product row is updated directly. Either way the
+    product's `modified_at` moves when the count reaches it, so incremental
+    exports pick the new count up.
+    """
+    if field not in COUNTER_FIELDS:
+        raise ValueError(f'Unknown counter: {field!r}')
+
+    shards = get_counter_settings()['SHARDS']
+    if shards <= 1:
+        Product.objects.filter(pk=product_id).update(**{field: F(field) + amount}, modified_at=timezone.now())
+        return
+
+    shard = random.randrange(shards)
+    lookup = {'product_id': product_id, 'shard': shard}
+    if ProductCounterShard.objects.filter(**lookup).update(**{field: F(field) + amount}):
+        return
+    try:
+        with transaction.atomic():
+            ProductCounterShard.objects.create(**lookup, **{field: amount})
+    except IntegrityError:
+        # Another writer created the shard first
+        ProductCounterShard.objects.filter(**lookup).update(**{field: F(field) + amount})
+
+
+def get_counts(product_id):
+    """
+    Return the exact like/view counts of a product, including deltas that
+    have not been rolled up yet.
+    """
+    product = Product.objects.filter(pk=product_id).values(*COUNTER_FIELDS).get()
+    pending = ProductCounterShard.objects.filter(product_id=product_id).aggregate(
+        **{field: Sum(field) for field in COUNTER_FIELDS}
+    )
+    return {field: product[field] + (pending[field] or 0) for field in COUNTER_FIELDS}
+
+
+def get_many_counts(product_ids, field):
+    """
+    Like `get_counts`, for one counter of several products in two queries.
+
+    Returns:
+        dict: {product_id: count}
+    """
+    if field not in COUNTER_FIELDS:
+        raise ValueError(f'Unknown counter: {field!r}')
+    counts = dict(Product.objects.filter(pk__in=product_ids).values_list('pk', field))
+    pending = ProductCounterShard.objects.filter(product_id__in=product_ids).order_by().values(
+        'product_id'
+    ).annotate(total=Sum(field)).values_list('product_id', 'total')
+    for product_id, total in pending:
+        if product_id in counts:
+            counts[product_id] += total or 0
+    return counts
+
+
+def rollup_counters():
+    """
+    Move the deltas held in ProductCounterShard rows into Product.
+
+    Each shard is decremented by exactly the amount that was read, so
+    increments that land while the rollup runs are kept for the next one.
+
+    Returns:
+        int: Number of products updated.
+    """
+    shards = ProductCounterShard.objects.exclude(like_count=0, view_count=0).values_list(
+        'pk', 'product_id', *COUNTER_FIELDS
+    )
+    totals = defaultdict(lambda: dict.fromkeys(COUNTER_FIELDS, 0))
+
+    with transaction.atomic():
+        for pk, product_id, like_count, view_count in shards:
+            ProductCounterShard.objects.filter(pk=pk).update(
+                like_count=F('like_count') - like_count,
+                view_count=F('view_count') - view_count
+            )
+            totals[product_id]['like_count'] += like_count
+            totals[product_id]['view_count'] += view_count
+
+        now = timezone.now()
+        for product_id, deltas in totals.items():
+            Product.objects.filter(pk=product_id).update(
+                **{field: F(field) + delta for field, delta in deltas.items()},
+                modified_at=now
+            )
+    return len(totals)
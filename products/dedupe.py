@@ -0,0 +1,183 @@
+import hashlib
+import math
+import threading
+
+from django.conf import settings
+
+from .models import ProductView
+
+VIEW_DEDUPE_DEFAULTS = {
+    'MODE': 'exact',
+    'FALSE_POSITIVE_RATE': 0.001,
+    'MAX_MEMORY': 4 * 1024 * 1024,
+}
+
+
+def get_view_dedupe_settings():
+    """Return the PRODUCT_VIEW_DEDUPE setting merged over the defaults."""
+    return {**VIEW_DEDUPE_DEFAULTS, **getattr(settings, 'PRODUCT_VIEW_DEDUPE', {})}
+
+
+class BloomFilter:
+    """
+    A fixed-size Bloom filter over strings.
+
+    Sized for `capacity` items at the given false-positive rate; it never
+    reports a false negative.
+    """
+
+    def __init__(self, capacity, false_positive_rate):
+        self.capacity = max(int(capacity), 1)
+        self.size = max(
+            int(-self.capacity * math.log(false_positive_rate) / math.log(2) ** 2),
+            8
+        )
+        self.hash_count = max(int(round(self.size / self.capacity * math.log(2))), 1)
+        self.bits = bytearray((self.size + 7) // 8)
+        self.count = 0
+
+    @classmethod
+    def for_memory(cls, memory_bytes, false_positive_rate):
+        """Build the largest filter that fits in `memory_bytes`."""
+        bits = memory_bytes * 8
+        capacity = bits * math.log(2) ** 2 / -math.log(false_positive_rate)
+        return cls(capacity, false_positive_rate)
+
+    def _positions(self, item):
+        digest = hashlib.blake2b(item.encode(), digest_size=16).digest()
+        h1 = int.from_bytes(digest[:8], 'little')
+        h2 = int.from_bytes(digest[8:], 'little') | 1
+        return [(h1 + i * h2) % self.size for i in range(self.hash_count)]
+
+    def __contains__(self, item):
+        return all(self.bits[pos >> 3] & (1 << (pos & 7)) for pos in self._positions(item))
+
+    def add(self, item):
+        for pos in self._positions(item):
+            self.bits[pos >> 3] |= 1 << (pos & 7)
+        self.count += 1
+
+    @property
+    def is_full(self):
+        return self.count >= self.capacity
+
+    @property
+    def memory_bytes(self):
+        return len(self.bits)
+
+
+class RotatingBloomFilter:
+    """
+    Two Bloom filter generations that rotate when the current one fills up.
+
+    Lookups check both generations, so an item is remembered for at least
+    one full generation. Memory stays bounded at `memory_bytes`, and the
+    overall false-positive rate stays within `false_positive_rate`.
+    """
+
+    def __init__(self, memory_bytes, false_positive_rate):
+        # Each lookup checks two filters, so give each half the error budget.
+        self._memory = max(memory_bytes // 2, 1)
+        self._rate = false_positive_rate / 2
+        self._lock = threading.Lock()
+        self.clear()
+
+    def _new_filter(self):
+        return BloomFilter.for_memory(self._memory, self._rate)
+
+    def clear(self):
+        self.current = self._new_filter()
+        self.previous = self._new_filter()
+
+    def __contains__(self, item):
+        return item in self.current or item in self.previous
+
+    def add(self, item):
+        with self._lock:
+            if self.current.is_full:
+                self.previous, self.current = self.current, self._new_filter()
+            self.current.add(item)
+
+    @property
+    def capacity(self):
+        return self.current.capacity
+
+    @property
+    def memory_bytes(self):
+        return self.current.memory_bytes + self.previous.memory_bytes
+
+
+class ExactViewDeduplicator:
+    """
+    Looks the (product, viewer) pair up in the `unique_product_viewer` index.
+    """
+    mode = 'exact'
+
+    def seen(self, product_id, viewer_key):
+        return ProductView.objects.filter(product_id=product_id, viewer_key=viewer_key).exists()
+
+    def remember(self, product_id, viewer_key):
+        pass
+
+    def clear(self):
+        pass
+
+    def stats(self):
+        return {'mode': self.mode}
+
+
+class BloomViewDeduplicator:
+    """
+    Remembers (product, viewer) pairs in a memory-bounded rotating Bloom filter.
+
+    Repeat visitors are answered from memory without touching the database.
+    A false positive means a genuine first view is occasionally not counted,
+    at the configured rate. Pairs the filter has forgotten, or that another
+    process has seen, are still caught by the unique index when views are
+    written.
+    """
+    mode = 'bloom'
+
+    def __init__(self, false_positive_rate, max_memory):
+        self.false_positive_rate = false_positive_rate
+        self.filter = RotatingBloomFilter(max_memory, false_positive_rate)
+
+    @staticmethod
+    def _item(product_id, viewer_key):
+        return f'{product_id}|{viewer_key}'
+
+    def seen(self, product_id, viewer_key):
+        return self._item(product_id, viewer_key) in self.filter
+
+    def remember(self, product_id, viewer_key):
+        self.filter.add(self._item(product_id, viewer_key))
+
+    def clear(self):
+        self.filter.clear()
+
+    def stats(self):
+        return {
+            'mode': self.mode,
+            'false_positive_rate': self.false_positive_rate,
+            'capacity': self.filter.capacity,
+            'memory_bytes': self.filter.memory_bytes,
+        }
+
+
+_deduplicators = {}
+
+
+def get_view_deduplicator():
+    """Return the deduplicator configured by PRODUCT_VIEW_DEDUPE."""
+    config = get_view_dedupe_settings()
+    key = (config['MODE'], config['FALSE_POSITIVE_RATE'], config['MAX_MEMORY'])
+    if key not in _deduplicators:
+        if config['MODE'] == 'bloom':
+            _deduplicators[key] = BloomViewDeduplicator(
+                config['FALSE_POSITIVE_RATE'], config['MAX_MEMORY']
+            )
+        elif config['MODE'] == 'exact':
+            _deduplicators[key] = ExactViewDeduplicator()
+        else:
+            raise ValueError(f"Unknown PRODUCT_VIEW_DEDUPE mode: {config['MODE']!r}")
+    return _deduplicators[key]
@@ -0,0 +1,120 @@
+import csv
+import json
+from datetime import datetime, time, timezone as dt_timezone
+from itertools import islice
+
+from django.core.serializers.json import DjangoJSONEncoder
+from django.utils import timezone
+from django.utils.dateparse import parse_date, parse_datetime
+
+from .models import Product, ProductCategory, ProductImage
+
+EXPORT_FIELDS = [
+    'id', 'title', 'slug', 'description', 'price', 'quantity', 'category', 'tags', 'images',
+    'view_count', 'like_count', 'rating_average', 'is_active', 'is_delete', 'created_at', 'modified_at',
+]
+PRODUCT_COLUMNS = [
+    'id', 'title', 'slug', 'description', 'price', 'quantity', 'category_id',
+    'view_count', 'like_count', 'rating_average', 'is_active', 'is_delete', 'created_at', 'modified_at',
+]
+
+
+def export_queryset(since=None):
+    """
+    Products to export: the active catalog in pk order, or with `since`,
+    every product modified at or after it (including deactivated and
+    soft-deleted ones, so consumers can drop them) in modification order.
+
+    Stock changes, ratings and counter rollups move `modified_at`, so every
+    exported column is covered; sharded like/view counts show up once they
+    are rolled up.
+    """
+    if since is None:
+        return Product.published.order_by('pk')
+    return Product.objects.filter(modified_at__gte=since).order_by('modified_at', 'pk')
+
+
+def iter_export_rows(queryset, chunk_size=1000, build_url=None):
+    """
+    Yield one plain dict per product, reading `chunk_size` rows at a time.
+
+    Categories, tags and images are resolved with one query each per chunk,
+    so memory stays bounded by the chunk whatever the catalog size.
+
+    Args:
+        queryset: Products to export, already ordered.
+        chunk_size: Rows fetched per database round trip.
+        build_url: Optional callable turning a media URL into an absolute one.
+    """
+    storage = ProductImage._meta.get_field('image').storage
+    rows = queryset.values(*PRODUCT_COLUMNS).iterator(chunk_size=chunk_size)
+    while chunk := list(islice(rows, chunk_size)):
+        ids = [row['id'] for row in chunk]
+        categories = dict(ProductCategory.objects.filter(
+            pk__in={row['category_id'] for row in chunk} - {None}
+        ).values_list('pk', 'slug'))
+        tags = {}
+        for product_id, slug in Product.tags.through.objects.filter(product_id__in=ids).order_by(
+            'producttag__title'
+        ).values_list('product_id', 'producttag__slug'):
+            tags.setdefault(product_id, []).append(slug)
+        images = {}
+        for product_id, name in ProductImage.objects.filter(product_id__in=ids).order_by('pk').values_list(
+            'product_id', 'image'
+        ):
+            url = storage.url(name)
+            images.setdefault(product_id, []).append(build_url(url) if build_url else url)
+
+        for row in chunk:
+            row['category'] = categories.get(row.pop('category_id'))
+            row['tags'] = tags.get(row['id'], [])
+            row['images'] = images.get(row['id'], [])
+            yield {field: row[field] for field in EXPORT_FIELDS}
+
+
+def render_ndjson(rows):
+    for row in rows:
+        yield json.dumps(row, cls=DjangoJSONEncoder, ensure_ascii=False) + '\n'
+
+
+class _LineBuffer:
+    """File-like object whose `write` returns the line instead of storing it."""
+
+    def write(self, value):
+        return value
+
+
+def render_csv(rows):
+    """CSV with a header row; list values are joined with `|`."""
+    writer = csv.writer(_LineBuffer())
+    yield writer.writerow(EXPORT_FIELDS)
+    for row in rows:
+        yield writer.writerow([
+            '|'.join(value) if isinstance(value, list) else
+            value.isoformat() if hasattr(value, 'isoformat') else value
+            for value in (row[field] for field in EXPORT_FIELDS)
+        ])
+
+
+RENDERERS = {
+    'ndjson': (render_ndjson, 'application/x-ndjson'),
+    'csv': (render_csv, 'text/csv'),
+}
+
+
+def parse_since(value):
+    """
+    Parse an ISO 8601 `since` value; naive values are taken as UTC.
+
+    Raises:
+        ValueError: The value is not a date or datetime.
+    """
+    moment = parse_datetime(value)
+    if moment is None:
+        day = parse_date(value)
+        if day is None:
+            raise ValueError('Expected an ISO 8601 date or datetime.')
+        moment = datetime.combine(day, time.min)
+    if timezone.is_naive(moment):
+        moment = timezone.make_aware(moment, dt_timezone.utc)
+    return moment
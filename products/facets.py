@@ -0,0 +1,131 @@
+import hashlib
+from decimal import Decimal
+from urllib.parse import urlencode
+
+from django.conf import settings
+from django.db.models import Count, Q
+
+from .cache import CATALOG_VERSION_KEY, get_cache, get_version
+from .models import Product, ProductAttributeValue
+
+FACET_DEFAULTS = {
+    'PRICE_BUCKETS': (0, 50, 100, 250, 500, 1000),
+    'TIMEOUT': 300,
+}
+
+FACET_QUERY_PARAM = 'facets'
+FACET_NAMES = ('category', 'tag', 'attribute', 'price')
+
+# Query parameters that change the page or its shape but not the matching products.
+NON_FILTER_PARAMS = {'page', 'page_size', 'cursor', 'pagination', 'ordering', 'expand', 'fields', 'format', FACET_QUERY_PARAM}
+
+
+def get_facet_settings():
+    """Return the PRODUCT_FACETS setting merged over the defaults."""
+    return {**FACET_DEFAULTS, **getattr(settings, 'PRODUCT_FACETS', {})}
+
+
+def requested_facets(request):
+    """The facets asked for with `?facets=category,price` (or `?facets=all`), in a stable order."""
+    names = {name.strip() for name in request.query_params.get(FACET_QUERY_PARAM, '').split(',')}
+    if 'all' in names:
+        return FACET_NAMES
+    return tuple(name for name in FACET_NAMES if name in names)
+
+
+def category_facet(ids):
+    rows = Product.objects.filter(pk__in=ids, category__isnull=False).values(
+        'category_id', 'category__title', 'category__slug'
+    ).annotate(count=Count('pk')).order_by('-count', 'category__title')
+    return [
+        {'id': row['category_id'], 'title': row['category__title'], 'slug': row['category__slug'], 'count': row['count']}
+        for row in rows
+    ]
+
+
+def tag_facet(ids):
+    rows = Product.tags.through.objects.filter(product_id__in=ids).values(
+        'producttag_id', 'producttag__title', 'producttag__slug'
+    ).annotate(count=Count('pk')).order_by('-count', 'producttag__title')
+    return [
+        {'id': row['producttag_id'], 'title': row['producttag__title'], 'slug': row['producttag__slug'], 'count': row['count']}
+        for row in rows
+    ]
+
+
+def attribute_facet(ids):
+    """Counts per attribute value, grouped by attribute: {slug: [{'id', 'value', 'count'}]}."""
+    rows = ProductAttributeValue.objects.filter(product_id__in=ids).values(
+        'attribute_value_id', 'attribute_value__value', 'attribute_value__attribute__slug'
+    ).annotate(count=Count('pk')).order_by('attribute_value__attribute__slug', '-count', 'attribute_value__value')
+    facet = {}
+    for row in rows:
+        facet.setdefault(row['attribute_value__attribute__slug'], []).append(
+            {'id': row['attribute_value_id'], 'value': row['attribute_value__value'], 'count': row['count']}
+        )
+    return facet
+
+
+def price_facet(ids):
+    """Counts per PRICE_BUCKETS range, [min, max), from one conditional aggregate."""
+    edges = list(get_facet_settings()['PRICE_BUCKETS'])
+    buckets = list(zip(edges, edges[1:] + [None]))
+    aggregates = {}
+    for index, (low, high) in enumerate(buckets):
+        condition = Q(price__gte=Decimal(str(low)))
+        if high is not None:
+            condition &= Q(price__lt=Decimal(str(high)))
+        aggregates[f'bucket_{index}'] = Count('pk', filter=condition)
+    counts = Product.objects.filter(pk__in=ids).aggregate(**aggregates)
+    return [
+        {'min': low, 'max': high, 'count': counts[f'bucket_{index}']}
+        for index, (low, high) in enumerate(buckets)
+    ]
+
+
+FACETS = {
+    'category': category_facet,
+    'tag': tag_facet,
+    'attribute': attribute_facet,
+    'price': price_facet,
+}
+
+
+def compute_facets(queryset, names=FACET_NAMES):
+    """
+    Facet counts over every product matched by `queryset`, not just a page.
+
+    Each facet is one grouped query over the matching ids, which stay a
+    subquery, so the cost is bounded by the number of facets rather than
+    by the number of options.
+    """
+    ids = queryset.order_by().values('pk')
+    return {name: FACETS[name](ids) for name in names}
+
+
+def facet_cache_key(request, names):
+    filters = urlencode(sorted(
+        (key, value)
+        for key, values in request.query_params.lists()
+        if key not in NON_FILTER_PARAMS
+        for value in values
+    ))
+    digest = hashlib.md5(f"{filters}|{','.join(names)}".encode()).hexdigest()
+    return f'products:facets:{get_version(CATALOG_VERSION_KEY)}:{digest}'
+
+
+def get_facets(request, queryset, names):
+    """
+    `compute_facets()`, cached per set of filters until the catalog changes.
+
+    The key ignores pagination and ordering, so every page of a listing, and
+    every user, shares one entry; the unfiltered catalog and popular searches
+    are computed once per catalog version.
+    """
+    cache = get_cache()
+    key = facet_cache_key(request, names)
+    facets = cache.get(key)
+    if facets is None:
+        facets = compute_facets(queryset, names)
+        cache.set(key, facets, get_facet_settings()['TIMEOUT'])
+    return facets
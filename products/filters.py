@@ -0,0 +1,27 @@
+from django_filters import rest_framework as filters
+
+from .categories import get_category, subtree_filter
+from .models import Product
+
+
+class ProductFilter(filters.FilterSet):
+    """
+    Filters for the product list endpoint.
+
+    - `?min_rating=4` / `?max_rating=2.5` filter on the stored (indexed) rating average.
+    - `?category=<id or slug>` keeps products in that category or any of its
+      subcategories, as one range on the materialized category path.
+    """
+    min_rating = filters.NumberFilter(field_name='rating_average', lookup_expr='gte')
+    max_rating = filters.NumberFilter(field_name='rating_average', lookup_expr='lte')
+    category = filters.CharFilter(method='filter_category')
+
+    class Meta:
+        model = Product
+        fields = ['min_rating', 'max_rating', 'category']
+
+    def filter_category(self, queryset, name, value):
+        category = get_category(value)
+        if category is None:
+            return queryset.none()
+        return queryset.filter(subtree_filter(category.path, prefix='category__'))
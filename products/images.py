@@ -0,0 +1,156 @@
+import atexit
+import logging
+import os
+import threading
+from concurrent.futures import ProcessPoolExecutor
+from functools import partial
+from io import BytesIO
+
+from django.conf import settings
+from django.core.files.base import ContentFile
+from django.db import connection
+from PIL import Image, ImageOps
+
+from .cache import bump_catalog_version
+from .models import ProductImage
+
+logger = logging.getLogger(__name__)
+
+IMAGE_VARIANT_DEFAULTS = {
+    'WIDTHS': (320, 640, 1280),
+    'FORMATS': ('webp', 'jpeg'),
+    'QUALITY': 80,
+    'WORKERS': 2,
+    'ASYNC': True,
+}
+
+EXTENSIONS = {'webp': 'webp', 'jpeg': 'jpg', 'png': 'png'}
+
+
+def get_image_variant_settings():
+    """Return the PRODUCT_IMAGE_VARIANTS setting merged over the defaults."""
+    return {**IMAGE_VARIANT_DEFAULTS, **getattr(settings, 'PRODUCT_IMAGE_VARIANTS', {})}
+
+
+def render_variants(data, widths, formats, quality):
+    """
+    Resize an encoded image to each width in each format.
+
+    Pure Pillow work on bytes, without Django, so it can run in a worker
+    process. Widths above the original's are skipped rather than upscaled.
+
+    Returns:
+        dict: {(fmt, width): encoded bytes}
+    """
+    rendered = {}
+    with Image.open(BytesIO(data)) as original:
+        source = ImageOps.exif_transpose(original)
+        for width in sorted(set(widths)):
+            if width > source.width:
+                continue
+            resized = source.resize((width, max(1, round(source.height * width / source.width))), Image.LANCZOS)
+            for fmt in formats:
+                image = resized
+                if fmt == 'jpeg' and image.mode not in ('RGB', 'L'):
+                    image = image.convert('RGB')
+                buffer = BytesIO()
+                image.save(buffer, format=fmt.upper(), quality=quality)
+                rendered[(fmt, width)] = buffer.getvalue()
+    return rendered
+
+
+def variant_name(name, fmt, width):
+    """`product_images/<slug>/front.jpg` -> `product_images/<slug>/front.320w.webp`"""
+    root, _ = os.path.splitext(name)
+    return f'{root}.{width}w.{EXTENSIONS[fmt]}'
+
+
+def needs_variants(image):
+    """True when the stored variants were not generated from the current original."""
+    return image.variants_source != image.image.name
+
+
+def delete_variants(storage, variants):
+    for sizes in variants.values():
+        for name in sizes.values():
+            storage.delete(name)
+
+
+def read_original(image):
+    with image.image.storage.open(image.image.name, 'rb') as source:
+        return source.read()
+
+
+def render_arguments(image):
+    config = get_image_variant_settings()
+    return read_original(image), config['WIDTHS'], config['FORMATS'], config['QUALITY']
+
+
+def store_variants(image_id, rendered, source):
+    """
+    Save variants rendered from the original `source` next to it and record
+    their names, along with `source` itself.
+
+    Nothing is stored once the row points at another original, so a
+    concurrent re-upload wins. The update bypasses signals, so the
+    product's version stamp and the catalog version are moved here.
+    """
+    from .signals import touch_product
+    image = ProductImage.objects.filter(pk=image_id, image=source).first()
+    if image is None:
+        return
+    storage = image.image.storage
+    delete_variants(storage, image.variants)
+
+    variants = {}
+    for (fmt, width), data in sorted(rendered.items()):
+        name = variant_name(source, fmt, width)
+        storage.delete(name)
+        variants.setdefault(fmt, {})[str(width)] = storage.save(name, ContentFile(data))
+    if ProductImage.objects.filter(pk=image_id, image=source).update(variants=variants, variants_source=source):
+        touch_product(image.product_id)
+        bump_catalog_version()
+    else:
+        delete_variants(storage, variants)
+
+
+_executor = None
+_executor_lock = threading.Lock()
+
+
+def get_executor(workers=None):
+    """The shared process pool, created on first use."""
+    global _executor
+    with _executor_lock:
+        if _executor is None:
+            _executor = ProcessPoolExecutor(max_workers=workers or get_image_variant_settings()['WORKERS'])
+            atexit.register(_executor.shutdown)
+    return _executor
+
+
+def _store_result(image_id, source, submitter, future):
+    try:
+        store_variants(image_id, future.result(), source)
+    except Exception:
+        logger.exception('Generating variants of product image %s failed.', image_id)
+    finally:
+        # Callbacks of futures that finish later run on a pool thread, which
+        # must not keep its own database connection open.
+        if threading.get_ident() != submitter:
+            connection.close()
+
+
+def schedule_variants(image_id):
+    """
+    Generate the variants of a product image in the process pool, or
+    inline when PRODUCT_IMAGE_VARIANTS['ASYNC'] is off.
+    """
+    image = ProductImage.objects.filter(pk=image_id).first()
+    if image is None or not image.image:
+        return
+    arguments = render_arguments(image)
+    if not get_image_variant_settings()['ASYNC']:
+        store_variants(image_id, render_variants(*arguments), image.image.name)
+        return
+    future = get_executor().submit(render_variants, *arguments)
+    future.add_done_callback(partial(_store_result, image_id, image.image.name, threading.get_ident()))
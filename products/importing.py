@@ -0,0 +1,267 @@
+import csv
+import json
+from decimal import Decimal, InvalidOperation
+from functools import reduce
+
+from django.db import transaction
+from django.db.models import Q
+from django.utils.text import slugify
+
+from .attributes import invalidate_posting_lists
+from .cache import bump_catalog_version
+from .models import Attribute, AttributeValue, Product, ProductAttributeValue, ProductCategory, ProductTag
+from .search import get_search_backend
+
+# Columns an existing product takes from the input when its title matches.
+UPSERT_FIELDS = ['description', 'price', 'quantity', 'category', 'modified_at']
+
+
+def read_rows(stream, file_format):
+    """
+    Yield (line number, raw row) from a CSV or JSONL stream, one at a time.
+    JSONL rows are decoded in `clean_row`, so a bad line is a row error.
+    """
+    if file_format == 'csv':
+        reader = csv.DictReader(stream)
+        for row in reader:
+            yield reader.line_num, row
+    else:
+        for number, line in enumerate(stream, start=1):
+            if line.strip():
+                yield number, line
+
+
+def split_list(value, separator):
+    if isinstance(value, str):
+        return [item.strip() for item in value.split(separator) if item.strip()]
+    return [str(item).strip() for item in value or () if str(item).strip()]
+
+
+def clean_row(raw):
+    """
+    Validate one input row.
+
+    Accepted keys: `title` and `price` (required), `description`, `quantity`,
+    `category` (slug or title of an existing category), `tags` (list, or
+    comma-separated in CSV) and `attributes` ({slug: value}, or
+    `color:Red;size:M` in CSV). Keys that are absent leave the stored
+    tags/attributes of an existing product untouched.
+
+    Raises:
+        ValueError: The row is invalid.
+    """
+    row = json.loads(raw) if isinstance(raw, str) else raw
+    if not isinstance(row, dict):
+        raise ValueError('row must be an object')
+
+    title = str(row.get('title') or '').strip()
+    if not title:
+        raise ValueError('title is required')
+    try:
+        price = Decimal(str(row.get('price', '')).strip())
+        if not price.is_finite():
+            raise ValueError
+        price = price.quantize(Decimal('0.01'))
+        quantity = int(row.get('quantity') or 0)
+    except (InvalidOperation, ValueError, TypeError, OverflowError):
+        raise ValueError('price and quantity must be numbers')
+    if price < 0 or quantity < 0:
+        raise ValueError('price and quantity cannot be negative')
+
+    cleaned = {
+        'title': title,
+        'description': str(row.get('description') or ''),
+        'price': price,
+        'quantity': quantity,
+        'category': str(row.get('category') or '').strip() or None,
+    }
+    if row.get('tags') not in (None, ''):
+        if not isinstance(row['tags'], (list, str)):
+            raise ValueError('tags must be a list or a comma-separated string')
+        cleaned['tags'] = split_list(row['tags'], ',')
+    if row.get('attributes') not in (None, ''):
+        attributes = row['attributes']
+        if isinstance(attributes, str):
+            attributes = dict(item.partition(':')[::2] for item in split_list(attributes, ';'))
+        if not isinstance(attributes, dict):
+            raise ValueError('attributes must be an object or `slug:value;...`')
+        cleaned['attributes'] = {
+            str(slug).strip(): str(value).strip()
+            for slug, value in attributes.items() if str(slug).strip() and str(value).strip()
+        }
+    return cleaned
+
+
+def assign_slugs(model, titles):
+    """
+    Collision-free slugs for new `titles` of `model`, with at most two
+    queries per batch: existing slugs are looked up in bulk, and only the
+    bases that collide are probed for their `-2`, `-3`, ... suffixes.
+
+    Returns:
+        dict: {title: slug}
+    """
+    max_length = model._meta.get_field('slug').max_length - 8
+    bases = {title: (slugify(title) or model._meta.model_name)[:max_length] for title in titles}
+    taken = set(model.objects.filter(slug__in=set(bases.values())).values_list('slug', flat=True))
+
+    seen = set()
+    collided = set()
+    for base in bases.values():
+        if base in taken or base in seen:
+            collided.add(base)
+        seen.add(base)
+    if collided:
+        condition = reduce(Q.__or__, (Q(slug__startswith=f'{base}-') for base in collided))
+        taken.update(model.objects.filter(condition).values_list('slug', flat=True))
+
+    slugs = {}
+    for title, base in bases.items():
+        slug, suffix = base, 2
+        while slug in taken:
+            slug, suffix = f'{base}-{suffix}', suffix + 1
+        taken.add(slug)
+        slugs[title] = slug
+    return slugs
+
+
+def resolve_categories(names):
+    """{name: category pk} for names matching a category slug or title."""
+    if not names:
+        return {}
+    found = {}
+    for pk, slug, title in ProductCategory.objects.filter(Q(slug__in=names) | Q(title__in=names)).values_list(
+        'pk', 'slug', 'title'
+    ):
+        found[slug] = found[title] = pk
+    return found
+
+
+def resolve_tags(titles):
+    """{title: tag pk}, creating the missing tags in bulk."""
+    if not titles:
+        return {}
+    found = dict(ProductTag.objects.filter(title__in=titles).values_list('title', 'pk'))
+    missing = sorted(set(titles) - found.keys())
+    if missing:
+        slugs = assign_slugs(ProductTag, missing)
+        ProductTag.objects.bulk_create(
+            [ProductTag(title=title, slug=slugs[title]) for title in missing], ignore_conflicts=True
+        )
+        found.update(ProductTag.objects.filter(title__in=missing).values_list('title', 'pk'))
+    return found
+
+
+def resolve_attribute_values(pairs):
+    """{(attribute slug, value): value pk}, creating the missing values in bulk."""
+    if not pairs:
+        return {}
+    attributes = dict(Attribute.objects.filter(slug__in={slug for slug, _ in pairs}).values_list('slug', 'pk'))
+    pairs = {(slug, value) for slug, value in pairs if slug in attributes}
+
+    def lookup():
+        rows = AttributeValue.objects.filter(
+            attribute_id__in=attributes.values(), value__in={value for _, value in pairs}
+        ).values_list('attribute__slug', 'value', 'pk')
+        return {(slug, value): pk for slug, value, pk in rows if (slug, value) in pairs}
+
+    found = lookup()
+    missing = pairs - found.keys()
+    if missing:
+        AttributeValue.objects.bulk_create(
+            [AttributeValue(attribute_id=attributes[slug], value=value) for slug, value in missing],
+            ignore_conflicts=True
+        )
+        found = lookup()
+    return found
+
+
+def import_chunk(rows):
+    """
+    Upsert a chunk of cleaned rows in one transaction.
+
+    Products are matched on their (unique) title: new titles are inserted
+    with a generated slug, existing ones get UPSERT_FIELDS updated, all in a
+    single `bulk_create(update_conflicts=True)`. Tags and attributes present
+    in a row replace the product's current ones. Since `bulk_create` skips
+    signals, the search index, attribute posting lists and catalog version
+    are updated here.
+
+    Args:
+        rows: List of (line number, cleaned row); a later row with the same
+            title wins.
+
+    Returns:
+        tuple: (created, updated, errors), errors as [(line number, message)].
+    """
+    errors = []
+    rows = list({row['title']: (number, row) for number, row in rows}.values())
+
+    categories = resolve_categories({row['category'] for _, row in rows if row['category']})
+    attributes = resolve_attribute_values({
+        pair for _, row in rows for pair in row.get('attributes', {}).items()
+    })
+    valid = []
+    for number, row in rows:
+        if row['category'] and row['category'] not in categories:
+            errors.append((number, f"unknown category {row['category']!r}"))
+            continue
+        unknown = [slug for slug, value in row.get('attributes', {}).items() if (slug, value) not in attributes]
+        if unknown:
+            errors.append((number, f"unknown attributes {', '.join(sorted(unknown))}"))
+            continue
+        valid.append(row)
+    if not valid:
+        return 0, 0, errors
+
+    with transaction.atomic():
+        titles = [row['title'] for row in valid]
+        existing = dict(Product.objects.filter(title__in=titles).values_list('title', 'slug'))
+        slugs = {**assign_slugs(Product, [title for title in titles if title not in existing]), **existing}
+        Product.objects.bulk_create(
+            [
+                Product(
+                    title=row['title'],
+                    slug=slugs[row['title']],
+                    description=row['description'],
+                    price=row['price'],
+                    quantity=row['quantity'],
+                    category_id=categories.get(row['category']),
+                )
+                for row in valid
+            ],
+            update_conflicts=True,
+            unique_fields=['title'],
+            update_fields=UPSERT_FIELDS
+        )
+        ids = dict(Product.objects.filter(title__in=titles).values_list('title', 'pk'))
+
+        tagged = [row for row in valid if 'tags' in row]
+        if tagged:
+            tags = resolve_tags({title for row in tagged for title in row['tags']})
+            through = Product.tags.through
+            through.objects.filter(product_id__in=[ids[row['title']] for row in tagged]).delete()
+            through.objects.bulk_create([
+                through(product_id=ids[row['title']], producttag_id=tags[title])
+                for row in tagged for title in set(row['tags'])
+            ])
+
+        described = [row for row in valid if 'attributes' in row]
+        if described:
+            links = ProductAttributeValue.objects.filter(product_id__in=[ids[row['title']] for row in described])
+            touched = set(links.values_list('attribute_value_id', flat=True))
+            links.delete()
+            new_links = [
+                ProductAttributeValue(product_id=ids[row['title']], attribute_value_id=attributes[pair])
+                for row in described for pair in row['attributes'].items()
+            ]
+            ProductAttributeValue.objects.bulk_create(new_links)
+            touched.update(link.attribute_value_id for link in new_links)
+            transaction.on_commit(lambda: invalidate_posting_lists(touched))
+
+        get_search_backend().index(
+            Product.objects.filter(pk__in=ids.values()).only('pk', 'title', 'description', 'is_active', 'is_delete')
+        )
+        transaction.on_commit(bump_catalog_version)
+
+    return len(valid) - len(existing), len(existing), errors
@@ -0,0 +1,56 @@
+from django.db import transaction
+from django.db.models import Count, Max, Sum
+
+from .models import ProductInventory, ProductInventorySnapshot
+
+
+def compact_inventory(before, batch_size=500):
+    """
+    Fold the ledger entries created before `before` into one snapshot row
+    per product and delete them.
+
+    Entries are only appended and `before` should lie in the past, so the
+    compacted set is fixed by its highest pk; entries written meanwhile are
+    left for the next run.
+
+    Returns:
+        tuple: (products compacted, entries removed)
+    """
+    with transaction.atomic():
+        old = ProductInventory.objects.filter(created_at__lt=before)
+        last_pk = old.aggregate(last=Max('pk'))['last']
+        if last_pk is None:
+            return 0, 0
+        old = old.filter(pk__lte=last_pk)
+
+        totals = {
+            row['product_id']: row
+            for row in old.order_by().values('product_id').annotate(
+                total=Sum('change'), count=Count('pk'), last=Max('created_at')
+            )
+        }
+        snapshots = ProductInventorySnapshot.objects.select_for_update().filter(product_id__in=totals)
+        existing = {snapshot.product_id: snapshot for snapshot in snapshots}
+        for product_id, row in totals.items():
+            snapshot = existing.get(product_id)
+            if snapshot is None:
+                snapshot = existing[product_id] = ProductInventorySnapshot(product_id=product_id)
+            snapshot.change += row['total']
+            snapshot.entries += row['count']
+            snapshot.compacted_until = max(filter(None, [snapshot.compacted_until, row['last']]))
+
+        new = [snapshot for snapshot in existing.values() if snapshot.pk is None]
+        changed = [snapshot for snapshot in existing.values() if snapshot.pk is not None]
+        ProductInventorySnapshot.objects.bulk_create(new, batch_size=batch_size)
+        ProductInventorySnapshot.objects.bulk_update(
+            changed, ['change', 'entries', 'compacted_until'], batch_size=batch_size
+        )
+        removed, _ = old.delete()
+    return len(totals), removed
+
+
+def ledger_balance(product_id):
+    """The sum of a product's whole ledger, compacted part included."""
+    snapshot = ProductInventorySnapshot.objects.filter(product_id=product_id).values_list('change', flat=True).first()
+    live = ProductInventory.objects.filter(product_id=product_id).aggregate(total=Sum('change'))['total']
+    return (snapshot or 0) + (live or 0)
@@ -0,0 +1,97 @@
+from functools import partial
+
+from django.db import IntegrityError, transaction
+
+from .cache import bump_version, get_version
+from .counters import increment
+from .models import ProductLike
+
+
+def like_version_key(user_id):
+    return f'products:version:likes:{user_id}'
+
+
+def get_like_version(user_id):
+    """A stamp that moves whenever the user likes or unlikes a product."""
+    return get_version(like_version_key(user_id))
+
+
+def like_product(product, user):
+    """
+    Like `product` as `user`. Safe to call repeatedly or concurrently: the
+    (product, user) unique constraint decides which call creates the like,
+    and the like and its counter increment commit together.
+
+    Returns:
+        bool: True if a like was created by this call.
+    """
+    try:
+        with transaction.atomic():
+            ProductLike.objects.create(product=product, user=user)
+            increment(product.pk, 'like_count', 1)
+            transaction.on_commit(partial(bump_version, like_version_key(user.pk)))
+    except IntegrityError:
+        return False
+    return True
+
+
+def unlike_product(product, user):
+    """
+    Remove the like of `user` on `product`, if any.
+
+    Returns:
+        bool: True if a like was deleted by this call.
+    """
+    with transaction.atomic():
+        deleted, _ = ProductLike.objects.filter(product=product, user=user).delete()
+        if deleted:
+            increment(product.pk, 'like_count', -1)
+            transaction.on_commit(partial(bump_version, like_version_key(user.pk)))
+    return bool(deleted)
+
+
+def set_like(product, user, liked=None):
+    """
+    Set the like status of `user` on `product`.
+
+    `liked=True`/`False` is idempotent; `liked=None` toggles the current
+    status.
+
+    Returns:
+        bool: Whether the product is liked afterwards.
+    """
+    if liked is None:
+        if unlike_product(product, user):
+            return False
+        like_product(product, user)
+        return True
+    if liked:
+        like_product(product, user)
+    else:
+        unlike_product(product, user)
+    return liked
+
+
+def load_liked_by(products, user):
+    """
+    Mark which of `products` are liked by `user` with one membership query.
+
+    Each product gets a boolean `_liked_by_me` attribute, read by
+    `ProductSerializer.get_liked_by_me`.
+
+    Returns:
+        list: The products.
+    """
+    products = list(products)
+    liked = set()
+    if user is not None and user.is_authenticated and products:
+        liked = set(
+            ProductLike.objects.filter(
+                user=user,
+                product_id__in=[product.pk for product in products]
+            ).values_list('product_id', flat=True)
+        )
+    for product in products:
+        product._liked_by_me = product.pk in liked
+    return products
+
@@ -0,0 +1,35 @@
+import time
+from datetime import timedelta
+
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+
+from products.inventory import compact_inventory
+
+
+class Command(BaseCommand):
+    help = 'Fold old inventory ledger entries into per-product snapshots.'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--days',
+            type=float,
+            default=30,
+            help='Compact entries older than this many days.'
+        )
+        parser.add_argument(
+            '--interval',
+            type=float,
+            default=0,
+            help='Keep running and compact every INTERVAL seconds.'
+        )
+
+    def handle(self, *args, **options):
+        interval = options['interval']
+        while True:
+            before = timezone.now() - timedelta(days=options['days'])
+            products, entries = compact_inventory(before)
+            self.stdout.write(f'Compacted {entries} inventory entries of {products} products.')
+            if not interval:
+                break
+            time.sleep(interval)
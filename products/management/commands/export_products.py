@@ -0,0 +1,53 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from products.exporting import RENDERERS, export_queryset, iter_export_rows, parse_since
+
+
+class Command(BaseCommand):
+    help = 'Export the product catalog as NDJSON or CSV, streaming it in chunks.'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--format',
+            choices=list(RENDERERS),
+            default='ndjson',
+            help='Output format.'
+        )
+        parser.add_argument(
+            '--since',
+            help='Only products modified since this ISO 8601 date or datetime.'
+        )
+        parser.add_argument(
+            '--output',
+            help='File to write. Defaults to standard output.'
+        )
+        parser.add_argument(
+            '--chunk-size',
+            type=int,
+            default=1000,
+            help='Number of products read per query.'
+        )
+
+    def handle(self, *args, **options):
+        try:
+            since = parse_since(options['since']) if options['since'] else None
+        except ValueError as error:
+            raise CommandError(f'--since: {error}')
+
+        render, _ = RENDERERS[options['format']]
+        exported = 0
+
+        def counted(rows):
+            nonlocal exported
+            for row in rows:
+                exported += 1
+                yield row
+
+        lines = render(counted(iter_export_rows(export_queryset(since), chunk_size=options['chunk_size'])))
+        if options['output']:
+            with open(options['output'], 'w', newline='', encoding='utf-8') as stream:
+                stream.writelines(lines)
+            self.stdout.write(self.style.SUCCESS(f'Exported {exported} products.'))
+        else:
+            for line in lines:
+                self.stdout.write(line, ending='')
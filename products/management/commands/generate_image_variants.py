@@ -0,0 +1,60 @@
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+
+from django.core.management.base import BaseCommand
+
+from products.images import get_image_variant_settings, needs_variants, render_arguments, render_variants, store_variants
+from products.models import ProductImage
+
+
+class Command(BaseCommand):
+    help = 'Generate the resized/WebP variants of existing product images in parallel.'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--workers',
+            type=int,
+            default=get_image_variant_settings()['WORKERS'],
+            help='Number of worker processes.'
+        )
+        parser.add_argument(
+            '--force',
+            action='store_true',
+            help='Regenerate variants that are already up to date.'
+        )
+
+    def handle(self, *args, **options):
+        workers = max(1, options['workers'])
+        images = ProductImage.objects.exclude(image='').only('pk', 'image', 'variants_source').order_by('pk')
+        done = failed = 0
+
+        # At most two images per worker are in flight, so only that many
+        # originals are held in memory at once.
+        with ProcessPoolExecutor(max_workers=workers) as executor:
+            pending = {}
+            for image in images.iterator(chunk_size=500):
+                if not options['force'] and not needs_variants(image):
+                    continue
+                try:
+                    pending[executor.submit(render_variants, *render_arguments(image))] = (image.pk, image.image.name)
+                except OSError as error:
+                    self.stderr.write(f'Image {image.pk}: {error}')
+                    failed += 1
+                if len(pending) >= workers * 2:
+                    finished, _ = wait(pending, return_when=FIRST_COMPLETED)
+                    done, failed = self.store(pending, finished, done, failed)
+            while pending:
+                finished, _ = wait(pending, return_when=FIRST_COMPLETED)
+                done, failed = self.store(pending, finished, done, failed)
+
+        self.stdout.write(self.style.SUCCESS(f'Generated variants for {done} images ({failed} failed).'))
+
+    def store(self, pending, finished, done, failed):
+        for future in finished:
+            image_id, source = pending.pop(future)
+            try:
+                store_variants(image_id, future.result(), source)
+                done += 1
+            except Exception as error:
+                self.stderr.write(f'Image {image_id}: {error}')
+                failed += 1
+        return done, failed
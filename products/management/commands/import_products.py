@@ -0,0 +1,88 @@
+import json
+import os
+import time
+from itertools import islice
+
+from django.core.management.base import BaseCommand, CommandError
+
+from products.importing import clean_row, import_chunk, read_rows
+
+
+class Command(BaseCommand):
+    help = (
+        'Import products from a CSV or JSONL file, upserting on title. '
+        'Each chunk is committed on its own and recorded in a state file, '
+        'so an interrupted import continues with --resume.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('path', help='CSV or JSONL file to import.')
+        parser.add_argument(
+            '--format',
+            choices=['csv', 'jsonl'],
+            help='Input format. Defaults to the file extension.'
+        )
+        parser.add_argument(
+            '--chunk-size',
+            type=int,
+            default=1000,
+            help='Number of rows written per transaction.'
+        )
+        parser.add_argument(
+            '--resume',
+            action='store_true',
+            help='Skip the rows committed by a previous run of the same file.'
+        )
+        parser.add_argument(
+            '--state-file',
+            help='Where committed progress is recorded. Defaults to <path>.import-state.'
+        )
+
+    def handle(self, *args, **options):
+        path = options['path']
+        file_format = options['format'] or ('csv' if path.lower().endswith('.csv') else 'jsonl')
+        state_file = options['state_file'] or f'{path}.import-state'
+        chunk_size = options['chunk_size']
+        if chunk_size < 1:
+            raise CommandError('--chunk-size must be positive.')
+
+        skip = 0
+        if options['resume'] and os.path.exists(state_file):
+            with open(state_file) as state:
+                skip = json.load(state)['rows']
+            self.stdout.write(f'Resuming after {skip} rows.')
+
+        created = updated = failed = 0
+        done = skip
+        started = time.monotonic()
+        with open(path, newline='', encoding='utf-8') as stream:
+            rows = islice(read_rows(stream, file_format), skip, None)
+            while chunk := list(islice(rows, chunk_size)):
+                cleaned = []
+                for number, raw in chunk:
+                    try:
+                        cleaned.append((number, clean_row(raw)))
+                    except ValueError as error:
+                        self.report_error(number, error)
+                        failed += 1
+                chunk_created, chunk_updated, errors = import_chunk(cleaned)
+                for number, error in errors:
+                    self.report_error(number, error)
+                created += chunk_created
+                updated += chunk_updated
+                failed += len(errors)
+                done += len(chunk)
+
+                with open(state_file, 'w') as state:
+                    json.dump({'rows': done}, state)
+                elapsed = time.monotonic() - started
+                self.stdout.write(f'{done} rows processed ({(done - skip) / elapsed:.0f} rows/s)')
+
+        if os.path.exists(state_file):
+            os.remove(state_file)
+        self.stdout.write(self.style.SUCCESS(
+            f'Imported {created + updated} products ({created} created, {updated} updated, {failed} rows skipped).'
+        ))
+
+    def report_error(self, number, error):
+        self.stderr.write(f'Row {number}: {error}')
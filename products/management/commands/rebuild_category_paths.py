@@ -0,0 +1,13 @@
+from django.core.management.base import BaseCommand
+
+from products.cache import bump_catalog_version
+from products.categories import rebuild_category_paths
+
+
+class Command(BaseCommand):
+    help = 'Recompute the materialized path of every category from its parent links.'
+
+    def handle(self, *args, **options):
+        changed = rebuild_category_paths()
+        bump_catalog_version()
+        self.stdout.write(self.style.SUCCESS(f'Updated the path of {changed} categories.'))
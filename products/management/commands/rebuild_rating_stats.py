@@ -0,0 +1,34 @@
+from django.core.management.base import BaseCommand
+
+from products.cache import bump_catalog_version
+from products.models import Product
+from products.ratings import refresh_rating_stats
+
+
+class Command(BaseCommand):
+    help = 'Rebuild the stored rating statistics of every product from its comments.'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--batch-size',
+            type=int,
+            default=1000,
+            help='Number of products aggregated and written per batch.'
+        )
+
+    def handle(self, *args, **options):
+        batch_size = options['batch_size']
+        product_ids = Product.objects.order_by('pk').values_list('pk', flat=True)
+
+        updated = 0
+        batch = []
+        for product_id in product_ids.iterator(chunk_size=batch_size):
+            batch.append(product_id)
+            if len(batch) >= batch_size:
+                updated += refresh_rating_stats(batch)
+                batch = []
+        if batch:
+            updated += refresh_rating_stats(batch)
+        bump_catalog_version()
+
+        self.stdout.write(self.style.SUCCESS(f'Rebuilt rating statistics for {updated} products.'))
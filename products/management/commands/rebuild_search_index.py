@@ -0,0 +1,21 @@
+from django.core.management.base import BaseCommand
+
+from products.cache import bump_catalog_version
+from products.search import get_search_backend
+
+
+class Command(BaseCommand):
+    help = 'Rebuild the product search index from scratch.'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--chunk-size',
+            type=int,
+            default=1000,
+            help='Number of products read and indexed per chunk.'
+        )
+
+    def handle(self, *args, **options):
+        count = get_search_backend().rebuild(chunk_size=options['chunk_size'])
+        bump_catalog_version()
+        self.stdout.write(self.style.SUCCESS(f'Indexed {count} products.'))
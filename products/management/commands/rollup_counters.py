@@ -0,0 +1,26 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from products.counters import rollup_counters
+
+
+class Command(BaseCommand):
+    help = 'Roll the sharded like/view counters up into Product.'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--interval',
+            type=float,
+            default=0,
+            help='Keep running and roll up every INTERVAL seconds.'
+        )
+
+    def handle(self, *args, **options):
+        interval = options['interval']
+        while True:
+            updated = rollup_counters()
+            self.stdout.write(f'Rolled up counters for {updated} products.')
+            if not interval:
+                break
+            time.sleep(interval)
@@ -0,0 +1,33 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from products.recommendations import update_recommendations
+
+
+class Command(BaseCommand):
+    help = 'Apply the likes added and removed since the last run to the product recommendations.'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--interval',
+            type=float,
+            default=0,
+            help='Keep running and update every INTERVAL seconds.'
+        )
+        parser.add_argument(
+            '--rebuild',
+            action='store_true',
+            help='Recount every like from scratch first.'
+        )
+
+    def handle(self, *args, **options):
+        interval = options['interval']
+        rebuild = options['rebuild']
+        while True:
+            likes, products = update_recommendations(rebuild=rebuild)
+            self.stdout.write(f'Counted {likes} likes and refreshed recommendations of {products} products.')
+            if not interval:
+                break
+            rebuild = False
+            time.sleep(interval)
@@ -0,0 +1,26 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from products.trending import update_trending_scores
+
+
+class Command(BaseCommand):
+    help = 'Add the views and likes recorded since the last run to the trending scores.'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--interval',
+            type=float,
+            default=0,
+            help='Keep running and update every INTERVAL seconds.'
+        )
+
+    def handle(self, *args, **options):
+        interval = options['interval']
+        while True:
+            updated = update_trending_scores()
+            self.stdout.write(f'Updated trending scores of {updated} products.')
+            if not interval:
+                break
+            time.sleep(interval)
@@ -1,12 +1,33 @@
 from django.utils.text import slugify
-from django.db import models
+from django.db import models, transaction
+from django.db.models import Q, Value
+from django.db.models.functions import Concat, Substr
 from django.contrib.auth import get_user_model
 from django.utils.text import Truncator
+from django.utils import timezone
 from django.core.exceptions import ValidationError
 from core.utils import product_image_upload_to
 
 User = get_user_model()
 
+# The rows every public read path shows. Partial indexes use the same
+# condition, so queries written with `published()` can use them.
+PUBLISHED = Q(is_active=True, is_delete=False)
+
+
+class PublishedQuerySet(models.QuerySet):
+    def published(self):
+        """Only active, non-deleted rows."""
+        return self.filter(PUBLISHED)
+
+
+class PublishedManager(models.Manager.from_queryset(PublishedQuerySet)):
+    """`Model.published`: the active, non-deleted rows only."""
+
+    def get_queryset(self):
+        return super().get_queryset().published()
+
+
 class BaseProduct(models.Model):
     title = models.CharField(max_length=255, unique=True)
     slug = models.SlugField(max_length=255, unique=True, blank=True)
@@ -14,6 +35,9 @@ class BaseProduct(models.Model):
     is_active = models.BooleanField(default=True)
     is_delete = models.BooleanField(default=False)
 
+    objects = PublishedQuerySet.as_manager()
+    published = PublishedManager()
+
     class Meta:
         abstract = True
     
@@ -34,10 +58,46 @@ class ProductCategory(BaseProduct):
         null=True,
         blank=True
     )
+    # Materialized path: the zero-padded pks from the root down, e.g.
+    # '0000000001/0000000007/'. A subtree is one range on this index
+    # (see products.categories).
+    path = models.CharField(max_length=255, db_index=True, editable=False, default='')
+
+    PATH_STEP = 10
     
     class Meta:
         verbose_name_plural = "Categories"
         ordering = ['title']
+
+    @classmethod
+    def path_segment(cls, pk):
+        return f'{pk:0{cls.PATH_STEP}d}/'
+
+    def clean(self):
+        if self.parnt_id and self.pk:
+            parent_path = ProductCategory.objects.values_list('path', flat=True).get(pk=self.parnt_id)
+            if self.path and parent_path.startswith(self.path):
+                raise ValidationError({'parnt': 'A category cannot be moved below itself.'})
+
+    def save(self, *args, **kwargs) -> None:
+        with transaction.atomic():
+            self.clean()
+            super().save(*args, **kwargs)
+            parent_path = ''
+            if self.parnt_id:
+                parent_path = ProductCategory.objects.values_list('path', flat=True).get(pk=self.parnt_id)
+            path = parent_path + self.path_segment(self.pk)
+            if path == self.path:
+                return
+            if self.path:
+                # Moved: rewrite the prefix of the whole subtree in one UPDATE.
+                from .categories import subtree_filter
+                ProductCategory.objects.filter(subtree_filter(self.path)).update(
+                    path=Concat(Value(path), Substr('path', len(self.path) + 1))
+                )
+            else:
+                ProductCategory.objects.filter(pk=self.pk).update(path=path)
+            self.path = path
     
 class ProductTag(BaseProduct):
     class Meta:
@@ -47,6 +107,8 @@ class Product(BaseProduct):
     description = models.TextField()
     price = models.DecimalField(max_digits=10, decimal_places=2)
     quantity = models.PositiveIntegerField(default=0)
+    # Units held by carts, maintained with the holds (see carts.reservations).
+    reserved_quantity = models.PositiveIntegerField(default=0, editable=False)
 
     category = models.ForeignKey(
         ProductCategory,
@@ -62,27 +124,67 @@ class Product(BaseProduct):
     )
     view_count = models.PositiveIntegerField(default=0)
     like_count = models.PositiveIntegerField(default=0)
+    # Version stamp: moves on every save and whenever comments, images or
+    # tags change (see products.signals).
+    modified_at = models.DateTimeField(auto_now=True, db_index=True)
+
+    # Rating statistics, kept in sync with ProductComment (see products.ratings)
+    rating_count = models.PositiveIntegerField(default=0, editable=False)
+    rating_sum = models.PositiveIntegerField(default=0, editable=False)
+    rating_average = models.FloatField(default=0, editable=False)
+    rating_1_count = models.PositiveIntegerField(default=0, editable=False)
+    rating_2_count = models.PositiveIntegerField(default=0, editable=False)
+    rating_3_count = models.PositiveIntegerField(default=0, editable=False)
+    rating_4_count = models.PositiveIntegerField(default=0, editable=False)
+    rating_5_count = models.PositiveIntegerField(default=0, editable=False)
+    # Time-decayed popularity relative to ProductTrendingState.epoch
+    # (see products.trending)
+    trending_score = models.FloatField(default=0, editable=False)
     
     class Meta:
         ordering = ['-created_at']
+        indexes = [
+            # Keyset pagination of lists that aren't limited to published
+            # products, such as the liked products (see products.pagination)
+            models.Index(fields=['created_at', 'id'], name='product_created_id_idx'),
+            models.Index(fields=['price', 'id'], name='product_price_id_idx'),
+            # Published products in each list ordering (and its keyset
+            # pagination, see products.pagination), and within a category
+            models.Index(fields=['created_at', 'id'], condition=PUBLISHED, name='product_pub_created_idx'),
+            models.Index(fields=['price', 'id'], condition=PUBLISHED, name='product_pub_price_idx'),
+            models.Index(fields=['rating_average', 'id'], condition=PUBLISHED, name='product_pub_rating_idx'),
+            models.Index(fields=['trending_score', 'id'], condition=PUBLISHED, name='product_pub_trending_idx'),
+            models.Index(fields=['category', 'created_at'], condition=PUBLISHED, name='product_pub_category_idx'),
+        ]
         
+    @property
+    def available_quantity(self):
+        """Stock that is neither sold nor held by a cart."""
+        return max(0, self.quantity - self.reserved_quantity)
+
     @property
     def average_rating(self):
         """Return the average rating for this product (0 if no ratings)."""
-        return round(
-            self.comments.filter(
-                rate__isnull=False,
-                is_active=True,
-                is_delete=False
-            ).aggregate(avg=models.Avg('rate'))['avg'] or 0,
-            1
-        )
+        return round(self.rating_average, 1)
+
+    @property
+    def rating_histogram(self):
+        """Return the number of ratings per star, e.g. {1: 0, ..., 5: 12}."""
+        return {
+            rate: getattr(self, f'rating_{rate}_count')
+            for rate in ProductComment.RatingChoices.values
+        }
 
 class ProductImage(models.Model):
     product = models.ForeignKey(Product, on_delete=models.CASCADE, related_name='images')
     image = models.ImageField(
         upload_to=product_image_upload_to,
         )
+    # Resized copies stored next to the original, {format: {width: name}},
+    # and the original they were made from (see products.images). An
+    # original narrower than every width has a source but no variants.
+    variants = models.JSONField(default=dict, blank=True, editable=False)
+    variants_source = models.CharField(max_length=100, blank=True, editable=False)
     created_at = models.DateTimeField(auto_now_add=True)
     
 
@@ -124,9 +226,23 @@ class ProductComment(models.Model):
         default=RatingChoices.EXCELLENT,
         help_text="Rate from 1 (Very Bad) to 5 (Excellent)"
     )
-    
-    
-    
+
+    objects = PublishedQuerySet.as_manager()
+    published = PublishedManager()
+
+    class Meta:
+        indexes = [
+            # Visible top-level comments or replies of a product by date, and
+            # their counts, answered from the index alone (see products.comment_tree).
+            # SQLite compares booleans as bare terms, so the flags sit in the
+            # condition and after the (created_at, id) order, only to cover
+            # the counts.
+            models.Index(
+                fields=['product', 'reply', 'created_at', 'id', 'is_active', 'is_delete'],
+                condition=PUBLISHED,
+                name='comment_thread_idx'
+            ),
+        ]
 
     def __str__(self):
         return Truncator(self.text).words(4, truncate='...')
@@ -136,8 +252,26 @@ class ProductView(models.Model):
     product = models.ForeignKey(Product, on_delete=models.CASCADE, related_name='product_views')
     user = models.ForeignKey(User, null=True, blank=True, on_delete=models.CASCADE, related_name='user_views')
     ip_address = models.GenericIPAddressField(null=True, blank=True)
+    viewer_key = models.CharField(max_length=64, editable=False)
     created_at = models.DateTimeField(auto_now_add=True)
 
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['product', 'viewer_key'], name='unique_product_viewer'),
+        ]
+
+    @staticmethod
+    def make_viewer_key(user_id, ip_address):
+        """A viewer is identified by the user when authenticated, otherwise by the IP."""
+        if user_id is not None:
+            return f'user:{user_id}'
+        return f'ip:{ip_address}'
+
+    def save(self, *args, **kwargs):
+        if not self.viewer_key:
+            self.viewer_key = self.make_viewer_key(self.user_id, self.ip_address)
+        super().save(*args, **kwargs)
+
     def __str__(self):
         return f'{self.product}-{self.user}-{self.ip_address}'
 
@@ -152,10 +286,110 @@ class ProductLike(models.Model):
     def __str__(self):
         return f'{self.product}-{self.user}'
 
+class ProductCounterShard(models.Model):
+    """
+    One of N counter slots per product.
+
+    Likes and views are added to a random shard instead of the Product row,
+    so concurrent writers rarely touch the same row. The shards hold deltas
+    that are periodically rolled up into Product (see products.counters).
+    """
+    product = models.ForeignKey(Product, on_delete=models.CASCADE, related_name='counter_shards')
+    shard = models.PositiveSmallIntegerField()
+    like_count = models.IntegerField(default=0)
+    view_count = models.IntegerField(default=0)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['product', 'shard'], name='unique_product_counter_shard'),
+        ]
+
+    def __str__(self):
+        return f'{self.product_id}#{self.shard}: {self.like_count} likes, {self.view_count} views'
+
+
+class ProductTrendingState(models.Model):
+    """
+    Progress of the trending score job: the scores' reference time and the
+    last view and like already counted (see products.trending).
+    """
+    epoch = models.DateTimeField()
+    last_view_id = models.BigIntegerField(default=0)
+    last_like_id = models.BigIntegerField(default=0)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    def __str__(self):
+        return f'Trending scores up to view {self.last_view_id}, like {self.last_like_id}'
+
+
+class ProductCoOccurrence(models.Model):
+    """
+    How many users liked both products; one row per ordered pair
+    (see products.recommendations).
+    """
+    product = models.ForeignKey(Product, on_delete=models.CASCADE, related_name='co_occurrences')
+    other = models.ForeignKey(Product, on_delete=models.CASCADE, related_name='+')
+    count = models.PositiveIntegerField(default=0)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['product', 'other'], name='unique_product_co_occurrence'),
+        ]
+
+    def __str__(self):
+        return f'{self.product_id} & {self.other_id}: {self.count}'
+
+
+class ProductRecommendation(models.Model):
+    """The top-K neighbours of a product, by rank."""
+    product = models.ForeignKey(Product, on_delete=models.CASCADE, related_name='recommendations')
+    recommended = models.ForeignKey(Product, on_delete=models.CASCADE, related_name='recommended_for')
+    rank = models.PositiveSmallIntegerField()
+    score = models.FloatField()
+
+    class Meta:
+        ordering = ['product', 'rank']
+        constraints = [
+            models.UniqueConstraint(fields=['product', 'rank'], name='unique_product_recommendation_rank'),
+        ]
+
+    def __str__(self):
+        return f'{self.product_id} -> {self.recommended_id} (#{self.rank})'
+
+
+class ProductRecommendationState(models.Model):
+    """The last like already counted into ProductCoOccurrence."""
+    last_like_id = models.BigIntegerField(default=0)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    def __str__(self):
+        return f'Recommendations up to like {self.last_like_id}'
+
+
+class ProductLikeRemoval(models.Model):
+    """
+    A deleted like, kept until the next recommendations run takes it out of
+    ProductCoOccurrence (see products.recommendations). Plain ids rather than
+    foreign keys: the like, and possibly its user or product, are gone.
+    """
+    like_id = models.BigIntegerField()
+    product_id = models.BigIntegerField()
+    user_id = models.BigIntegerField()
+
+    def __str__(self):
+        return f'Removed like {self.like_id}'
+
+
 class ProductInventory(models.Model):
+    """
+    Append-only stock ledger: every entry is applied to `Product.quantity`
+    with one conditional UPDATE, so concurrent adjustments never overwrite
+    each other and stock never goes below zero. Old entries are folded into
+    ProductInventorySnapshot (see products.inventory).
+    """
     product = models.ForeignKey(Product, on_delete=models.CASCADE, related_name='inventory_logs')
     change = models.IntegerField()
-    created_at = models.DateTimeField(auto_now_add=True)
+    created_at = models.DateTimeField(auto_now_add=True, db_index=True)
 
     class Meta:
         ordering = ('created_at', )
@@ -171,9 +405,29 @@ class ProductInventory(models.Model):
             raise ValidationError({'change': 'The product quantity cannot be less than 0.'})
     
     def save(self, *args, **kwargs):
-        self.product.quantity += self.change
-        self.product.save(update_fields=['quantity'])
-        return super().save(*args, **kwargs)
+        if not self._state.adding:
+            raise ValidationError('Inventory entries cannot be changed; add a correcting entry instead.')
+        with transaction.atomic():
+            # UPDATE ... SET quantity = quantity + change WHERE quantity + change >= 0
+            applied = Product.objects.filter(pk=self.product_id, quantity__gte=-self.change).update(
+                quantity=models.F('quantity') + self.change,
+                modified_at=timezone.now()
+            )
+            if not applied:
+                raise ValidationError({'change': 'The product quantity cannot be less than 0.'})
+            super().save(*args, **kwargs)
+            self.product.refresh_from_db(fields=['quantity'])
+
+
+class ProductInventorySnapshot(models.Model):
+    """The compacted part of a product's inventory ledger."""
+    product = models.OneToOneField(Product, on_delete=models.CASCADE, related_name='inventory_snapshot')
+    change = models.IntegerField(default=0)
+    entries = models.PositiveIntegerField(default=0)
+    compacted_until = models.DateTimeField(null=True, blank=True)
+
+    def __str__(self):
+        return f'{self.product_id}: {self.change} over {self.entries} entries'
 
 # -- Attribiute --
 
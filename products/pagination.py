@@ -0,0 +1,166 @@
+import base64
+import binascii
+import json
+
+from django.core.exceptions import ValidationError
+from django.db.models import Q
+from rest_framework.exceptions import NotFound
+from rest_framework.pagination import BasePagination, PageNumberPagination
+from rest_framework.response import Response
+from rest_framework.settings import api_settings
+from rest_framework.utils.urls import remove_query_param, replace_query_param
+
+from .comment_tree import get_comment_settings
+
+
+class KeysetPagination(BasePagination):
+    """
+    Cursor pagination on (ordering field, pk).
+
+    The ordering comes from `?ordering=` when it names one of
+    `ordering_fields`, otherwise `default_ordering`. The primary key breaks
+    ties, so page boundaries never skip or repeat rows even when many
+    products share a price or timestamp. Each page is a range scan on the
+    matching (field, id) index: no OFFSET and no COUNT(*), so page N costs
+    the same as page 1.
+
+    Response JSON example:
+    {
+        "next": "http://.../products/?pagination=cursor&cursor=eyJ2Ijo...",
+        "previous": null,
+        "results": [...]
+    }
+    """
+    cursor_query_param = 'cursor'
+    ordering_query_param = 'ordering'
+    page_size = api_settings.PAGE_SIZE
+    ordering_fields = ('created_at', 'price')
+    default_ordering = '-created_at'
+    invalid_cursor_message = 'Invalid cursor'
+
+    def get_ordering(self, request):
+        ordering = request.query_params.get(self.ordering_query_param, '').split(',')[0].strip()
+        if ordering.lstrip('-') in self.ordering_fields:
+            return ordering
+        return self.default_ordering
+
+    def encode_cursor(self, obj, reverse):
+        payload = {'v': str(getattr(obj, self.field)), 'pk': obj.pk, 'r': reverse}
+        token = base64.urlsafe_b64encode(json.dumps(payload).encode()).decode()
+        return replace_query_param(self.base_url, self.cursor_query_param, token)
+
+    def decode_cursor(self, request, model):
+        token = request.query_params.get(self.cursor_query_param)
+        if not token:
+            return None
+        try:
+            payload = json.loads(base64.urlsafe_b64decode(token.encode()))
+            value = model._meta.get_field(self.field).to_python(payload['v'])
+            return value, int(payload['pk']), bool(payload['r'])
+        except (binascii.Error, ValueError, TypeError, KeyError, ValidationError):
+            raise NotFound(self.invalid_cursor_message)
+
+    def after(self, value, pk, descending):
+        """Rows strictly after (value, pk) in the given direction."""
+        op = 'lt' if descending else 'gt'
+        return Q(**{f'{self.field}__{op}e': value}) & (
+            Q(**{f'{self.field}__{op}': value}) | Q(**{f'pk__{op}': pk})
+        )
+
+    def paginate_queryset(self, queryset, request, view=None):
+        self.base_url = remove_query_param(request.build_absolute_uri(), 'page')
+        ordering = self.get_ordering(request)
+        self.field = ordering.lstrip('-')
+        cursor = self.decode_cursor(request, queryset.model)
+        reverse = cursor[2] if cursor else False
+
+        # Walking backwards flips the direction, then the page is flipped back.
+        descending = ordering.startswith('-') != reverse
+        prefix = '-' if descending else ''
+        queryset = queryset.order_by(f'{prefix}{self.field}', f'{prefix}pk')
+        if cursor:
+            queryset = queryset.filter(self.after(cursor[0], cursor[1], descending))
+
+        rows = list(queryset[:self.page_size + 1])
+        has_more = len(rows) > self.page_size
+        rows = rows[:self.page_size]
+        if reverse:
+            rows.reverse()
+            self.has_next, self.has_previous = cursor is not None, has_more
+        else:
+            self.has_next, self.has_previous = has_more, cursor is not None
+
+        self.page = rows
+        return rows
+
+    def get_next_link(self):
+        if not (self.has_next and self.page):
+            return None
+        return self.encode_cursor(self.page[-1], reverse=False)
+
+    def get_previous_link(self):
+        if not (self.has_previous and self.page):
+            return None
+        return self.encode_cursor(self.page[0], reverse=True)
+
+    def get_paginated_response(self, data):
+        return Response({
+            'next': self.get_next_link(),
+            'previous': self.get_previous_link(),
+            'results': data,
+        })
+
+    def get_paginated_response_schema(self, schema):
+        return {
+            'type': 'object',
+            'required': ['results'],
+            'properties': {
+                'next': {'type': 'string', 'nullable': True, 'format': 'uri'},
+                'previous': {'type': 'string', 'nullable': True, 'format': 'uri'},
+                'results': schema,
+            },
+        }
+
+
+class CommentPagination(KeysetPagination):
+    """
+    Keyset pagination of comments, oldest first (`?ordering=-created_at` for
+    newest first), PRODUCT_COMMENTS['PAGE_SIZE'] per page. Pages are range
+    scans of the comment thread index.
+    """
+    ordering_fields = ('created_at',)
+    default_ordering = 'created_at'
+
+    def __init__(self):
+        self.page_size = get_comment_settings()['PAGE_SIZE']
+
+
+class ProductPagination(PageNumberPagination):
+    """
+    Page-number pagination by default. Clients opt in to keyset pagination
+    per request with `?pagination=cursor` (cursor links keep the flag).
+    """
+    mode_query_param = 'pagination'
+
+    def use_cursor(self, request):
+        return (
+            request.query_params.get(self.mode_query_param) == 'cursor'
+            or KeysetPagination.cursor_query_param in request.query_params
+        )
+
+    def paginate_queryset(self, queryset, request, view=None):
+        self.keyset = KeysetPagination() if self.use_cursor(request) else None
+        if self.keyset:
+            return self.keyset.paginate_queryset(queryset, request, view)
+        return super().paginate_queryset(queryset, request, view)
+
+    def get_paginated_response(self, data):
+        if self.keyset:
+            return self.keyset.get_paginated_response(data)
+        return super().get_paginated_response(data)
+
+    def get_page_signature(self):
+        """Everything besides the rows that the paginated body contains."""
+        if self.keyset:
+            return (self.keyset.get_next_link(), self.keyset.get_previous_link())
+        return (self.page.paginator.count, self.get_next_link(), self.get_previous_link())
@@ -0,0 +1,72 @@
+from django.db.models import Count, Q, Sum
+from django.utils import timezone
+
+from .models import Product, ProductComment
+
+HISTOGRAM_FIELDS = {
+    rate: f'rating_{rate}_count' for rate in ProductComment.RatingChoices.values
+}
+RATING_FIELDS = ['rating_count', 'rating_sum', 'rating_average', *HISTOGRAM_FIELDS.values()]
+
+
+def compute_rating_stats(product_ids):
+    """
+    Aggregate the rating statistics of several products in one grouped query.
+
+    Only active, non-deleted comments with a rate are counted, which matches
+    what `Product.average_rating` used to compute live.
+
+    Args:
+        product_ids: Iterable of product primary keys.
+
+    Returns:
+        dict: {product_id: {field_name: value}} for every requested product,
+        including products that have no ratings at all.
+    """
+    product_ids = list(product_ids)
+    empty = dict.fromkeys(RATING_FIELDS, 0)
+    stats = {product_id: dict(empty) for product_id in product_ids}
+
+    rows = ProductComment.published.filter(
+        product_id__in=product_ids,
+        rate__isnull=False
+    ).order_by().values('product_id').annotate(
+        rating_count=Count('pk'),
+        rating_sum=Sum('rate'),
+        **{
+            field: Count('pk', filter=Q(rate=rate))
+            for rate, field in HISTOGRAM_FIELDS.items()
+        }
+    )
+    for row in rows:
+        product_id = row.pop('product_id')
+        row['rating_average'] = row['rating_sum'] / row['rating_count']
+        stats[product_id] = row
+    return stats
+
+
+def refresh_rating_stats(product_ids, batch_size=500):
+    """
+    Recompute and store the rating statistics of the given products.
+
+    Only products whose statistics changed are written, and their
+    `modified_at` moves with them so ETags and Last-Modified follow the
+    new ratings.
+
+    Args:
+        product_ids: Iterable of product primary keys.
+        batch_size: Number of rows written per UPDATE batch.
+
+    Returns:
+        int: Number of products updated.
+    """
+    stats = compute_rating_stats(product_ids)
+    stored = Product.objects.filter(pk__in=list(stats)).values('pk', *RATING_FIELDS)
+    now = timezone.now()
+    products = []
+    for row in stored:
+        product_id = row.pop('pk')
+        values = stats[product_id]
+        if values != row:
+            products.append(Product(pk=product_id, modified_at=now, **values))
+    return Product.objects.bulk_update(products, [*RATING_FIELDS, 'modified_at'], batch_size=batch_size)
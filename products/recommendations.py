@@ -0,0 +1,247 @@
+import heapq
+import math
+from collections import Counter, defaultdict
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Max
+
+from .cache import bump_version
+from .counters import get_many_counts
+from .models import (
+    Product, ProductCoOccurrence, ProductLike, ProductLikeRemoval, ProductRecommendation, ProductRecommendationState
+)
+
+RECOMMENDATION_DEFAULTS = {
+    'TOP_K': 20,
+    'BATCH_SIZE': 5000,
+    'MAX_USER_LIKES': 500,
+}
+
+RECOMMENDATION_VERSION_KEY = 'products:version:recommendations'
+
+
+def get_recommendation_settings():
+    """Return the PRODUCT_RECOMMENDATIONS setting merged over the defaults."""
+    return {**RECOMMENDATION_DEFAULTS, **getattr(settings, 'PRODUCT_RECOMMENDATIONS', {})}
+
+
+def count_pairs(after_id, upto_id):
+    """
+    Co-like pairs contributed by the likes in (after_id, upto_id].
+
+    Two queries: the new likes, then the earlier likes of the same users.
+    Only a user's MAX_USER_LIKES most recent likes of each kind are used,
+    which bounds the work per user. Every new like pairs with each earlier
+    like of its user and with the user's other new likes, so each pair of
+    likes is counted exactly once across runs.
+
+    Returns:
+        Counter: {(product_id, other_id): count}, symmetric.
+    """
+    cap = get_recommendation_settings()['MAX_USER_LIKES']
+    fresh = defaultdict(list)
+    for user_id, product_id in ProductLike.objects.filter(pk__gt=after_id, pk__lte=upto_id).order_by(
+        '-pk'
+    ).values_list('user_id', 'product_id'):
+        if len(fresh[user_id]) < cap:
+            fresh[user_id].append(product_id)
+
+    history = defaultdict(list)
+    for user_id, product_id in ProductLike.objects.filter(user_id__in=fresh, pk__lte=after_id).order_by(
+        'user_id', '-pk'
+    ).values_list('user_id', 'product_id'):
+        if len(history[user_id]) < cap:
+            history[user_id].append(product_id)
+
+    pairs = Counter()
+    for user_id, products in fresh.items():
+        earlier = set(history[user_id]) - set(products)
+        for index, product_id in enumerate(products):
+            for other_id in (*earlier, *products[index + 1:]):
+                pairs[product_id, other_id] += 1
+                pairs[other_id, product_id] += 1
+    return pairs
+
+
+def add_pairs(pairs, batch_size=500):
+    """Add `pairs` to the stored co-occurrence counts, in bulk."""
+    by_product = defaultdict(dict)
+    for (product_id, other_id), count in pairs.items():
+        by_product[product_id][other_id] = count
+
+    product_ids = sorted(by_product)
+    for start in range(0, len(product_ids), batch_size):
+        chunk = product_ids[start:start + batch_size]
+        existing = ProductCoOccurrence.objects.filter(product_id__in=chunk)
+        changed = []
+        for row in existing:
+            count = by_product[row.product_id].pop(row.other_id, 0)
+            if count:
+                row.count += count
+                changed.append(row)
+        ProductCoOccurrence.objects.bulk_update(changed, ['count'], batch_size=batch_size)
+        ProductCoOccurrence.objects.bulk_create(
+            [
+                ProductCoOccurrence(product_id=product_id, other_id=other_id, count=count)
+                for product_id in chunk for other_id, count in by_product[product_id].items()
+            ],
+            batch_size=batch_size
+        )
+
+
+def subtract_pairs(pairs, batch_size=500):
+    """Subtract `pairs` from the stored co-occurrence counts, dropping pairs that reach zero."""
+    by_product = defaultdict(dict)
+    for (product_id, other_id), count in pairs.items():
+        by_product[product_id][other_id] = count
+
+    product_ids = sorted(by_product)
+    for start in range(0, len(product_ids), batch_size):
+        chunk = product_ids[start:start + batch_size]
+        changed, emptied = [], []
+        for row in ProductCoOccurrence.objects.filter(product_id__in=chunk):
+            count = by_product[row.product_id].get(row.other_id, 0)
+            if count:
+                row.count -= count
+                (changed if row.count > 0 else emptied).append(row)
+        ProductCoOccurrence.objects.bulk_update(changed, ['count'], batch_size=batch_size)
+        ProductCoOccurrence.objects.filter(pk__in=[row.pk for row in emptied]).delete()
+
+
+def forget_like(like):
+    """
+    Queue a deleted like for the next `update_recommendations` run, which
+    takes it out of the co-occurrence counts. One INSERT, so unliking stays
+    cheap.
+    """
+    ProductLikeRemoval.objects.create(like_id=like.pk, product_id=like.product_id, user_id=like.user_id)
+
+
+def forget_removed_likes(removals, last_like_id):
+    """
+    Pairs contributed by the removed likes among those counted up to
+    `last_like_id`.
+
+    A removed like is unpaired from its user's MAX_USER_LIKES most recent
+    counted likes that remain, and from the user's other removed likes,
+    which matches how `count_pairs` paired them unless the user has liked
+    more than that many products since. Likes that were never counted are
+    skipped.
+
+    Args:
+        removals: (like_id, user_id, product_id) tuples.
+
+    Returns:
+        Counter: {(product_id, other_id): count}, symmetric.
+    """
+    cap = get_recommendation_settings()['MAX_USER_LIKES']
+    removed = defaultdict(list)
+    for like_id, user_id, product_id in sorted(removals, reverse=True):
+        if like_id <= last_like_id:
+            removed[user_id].append(product_id)
+
+    remaining = defaultdict(list)
+    for user_id, product_id in ProductLike.objects.filter(user_id__in=removed, pk__lte=last_like_id).order_by(
+        'user_id', '-pk'
+    ).values_list('user_id', 'product_id'):
+        if len(remaining[user_id]) < cap:
+            remaining[user_id].append(product_id)
+
+    pairs = Counter()
+    for user_id, products in removed.items():
+        others = set(remaining[user_id]) - set(products)
+        for index, product_id in enumerate(products):
+            for other_id in (*others, *products[index + 1:]):
+                pairs[product_id, other_id] += 1
+                pairs[other_id, product_id] += 1
+    return pairs
+
+
+def refresh_recommendations(product_ids, batch_size=500):
+    """
+    Recompute the stored top-K neighbours of `product_ids`.
+
+    Neighbours are ranked by cosine similarity of their likers,
+    co_likes / sqrt(likes_a * likes_b), so popular products don't crowd
+    out everything else. The like totals are the products' like counters
+    (see products.counters), read `batch_size` products at a time.
+    """
+    top_k = get_recommendation_settings()['TOP_K']
+    product_ids = sorted(product_ids)
+    for start in range(0, len(product_ids), batch_size):
+        chunk = product_ids[start:start + batch_size]
+        rows = list(ProductCoOccurrence.objects.filter(product_id__in=chunk).values_list(
+            'product_id', 'other_id', 'count'
+        ))
+        involved = sorted(set(chunk) | {other_id for _, other_id, _ in rows})
+        likes = {}
+        for offset in range(0, len(involved), batch_size):
+            likes.update(get_many_counts(involved[offset:offset + batch_size], 'like_count'))
+        candidates = defaultdict(list)
+        for product_id, other_id, count in rows:
+            norm = math.sqrt(likes.get(product_id, 0) * likes.get(other_id, 0))
+            if norm:
+                candidates[product_id].append((count / norm, -other_id))
+
+        with transaction.atomic():
+            ProductRecommendation.objects.filter(product_id__in=chunk).delete()
+            ProductRecommendation.objects.bulk_create(
+                [
+                    ProductRecommendation(product_id=product_id, recommended_id=-negative_id, rank=rank, score=score)
+                    for product_id, scored in candidates.items()
+                    for rank, (score, negative_id) in enumerate(heapq.nlargest(top_k, scored), start=1)
+                ],
+                batch_size=batch_size
+            )
+
+
+def update_recommendations(rebuild=False):
+    """
+    Subtract the likes removed since the last run (see `forget_like`), count
+    the likes added since, and refresh the neighbours of the products either
+    touched. `rebuild` starts over from all likes.
+
+    Returns:
+        tuple: (likes processed, products refreshed)
+    """
+    config = get_recommendation_settings()
+    with transaction.atomic():
+        state = ProductRecommendationState.objects.select_for_update().filter(pk=1).first()
+        state = state or ProductRecommendationState(pk=1)
+        if rebuild:
+            ProductCoOccurrence.objects.all().delete()
+            ProductRecommendation.objects.all().delete()
+            ProductLikeRemoval.objects.all().delete()
+            state.last_like_id = 0
+
+        # Removals first: they are measured against the likes counted so far.
+        removals = list(ProductLikeRemoval.objects.values_list('pk', 'like_id', 'user_id', 'product_id'))
+        pairs = forget_removed_likes([removal[1:] for removal in removals], state.last_like_id)
+        subtract_pairs(pairs)
+        ProductLikeRemoval.objects.filter(pk__in=[removal[0] for removal in removals]).delete()
+        touched = {product_id for product_id, _ in pairs}
+
+        last_like = ProductLike.objects.aggregate(last=Max('pk'))['last'] or state.last_like_id
+        processed = ProductLike.objects.filter(pk__gt=state.last_like_id, pk__lte=last_like).count()
+        cursor = state.last_like_id
+        while cursor < last_like:
+            upto = min(cursor + config['BATCH_SIZE'], last_like)
+            pairs = count_pairs(cursor, upto)
+            add_pairs(pairs)
+            touched.update(product_id for product_id, _ in pairs)
+            cursor = upto
+
+        refresh_recommendations(touched)
+        state.last_like_id = last_like
+        state.save()
+        transaction.on_commit(lambda: bump_version(RECOMMENDATION_VERSION_KEY))
+    return processed, len(touched)
+
+
+def recommended_products(product_id, limit=None):
+    """The stored neighbours of a product, best first: one indexed lookup."""
+    top_k = get_recommendation_settings()['TOP_K']
+    limit = min(max(1, limit or top_k), top_k)
+    return Product.published.filter(
+        recommended_for__product_id=product_id
+    ).order_by('recommended_for__rank')[:limit]
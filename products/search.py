@@ -0,0 +1,231 @@
+import re
+from functools import lru_cache
+
+from django.conf import settings
+from django.core.exceptions import ImproperlyConfigured
+from django.db import connection
+from django.db.models import Q
+from django.db.models.expressions import RawSQL
+from django.utils.module_loading import import_string
+from rest_framework.filters import BaseFilterBackend
+
+from .models import Product
+
+SEARCH_DEFAULTS = {
+    'BACKEND': 'products.search.SQLiteFTS5Backend',
+    'MAX_RESULTS': 1000,
+}
+
+TOKEN_RE = re.compile(r'\w+', re.UNICODE)
+
+
+def get_search_settings():
+    """Return the PRODUCT_SEARCH setting merged over the defaults."""
+    return {**SEARCH_DEFAULTS, **getattr(settings, 'PRODUCT_SEARCH', {})}
+
+
+def searchable_products():
+    return Product.published.all()
+
+
+class BaseSearchBackend:
+    """
+    Interface of a product search engine.
+
+    A backend keeps its own index of active products up to date through
+    `index()`/`remove()` and answers `search()` with product IDs, most
+    relevant first.
+    """
+
+    def setup(self):
+        """Create whatever storage the index needs. Must be idempotent."""
+
+    def index(self, products):
+        """Add or refresh `products`; inactive or deleted ones are removed."""
+        raise NotImplementedError
+
+    def remove(self, product_ids):
+        """Drop products from the index."""
+        raise NotImplementedError
+
+    def rebuild(self, chunk_size=1000):
+        """
+        Rebuild the whole index from the database.
+
+        Returns:
+            int: Number of products indexed.
+        """
+        raise NotImplementedError
+
+    def search(self, query, limit):
+        """
+        Returns:
+            list: Up to `limit` product IDs, best match first.
+        """
+        raise NotImplementedError
+
+
+class DatabaseSearchBackend(BaseSearchBackend):
+    """
+    Plain `icontains` lookups on title and description, without an index.
+    Works on any database but scans the whole table.
+    """
+
+    def index(self, products):
+        pass
+
+    def remove(self, product_ids):
+        pass
+
+    def rebuild(self, chunk_size=1000):
+        return 0
+
+    def search(self, query, limit):
+        condition = Q()
+        for token in TOKEN_RE.findall(query):
+            condition &= Q(title__icontains=token) | Q(description__icontains=token)
+        return list(searchable_products().filter(condition).values_list('pk', flat=True)[:limit])
+
+
+class SQLiteFTS5Backend(BaseSearchBackend):
+    """
+    Full-text index in an SQLite FTS5 virtual table, keyed by product ID.
+
+    Results are ranked with BM25, with title matches weighted above
+    description matches. Every search term must match, and the last one
+    also matches as a prefix, so `?search=wireless head` finds
+    "Wireless Headphones".
+    """
+    table = 'products_product_fts'
+    title_weight = 10.0
+    description_weight = 1.0
+
+    def __init__(self):
+        if connection.vendor != 'sqlite':
+            raise ImproperlyConfigured('SQLiteFTS5Backend requires an SQLite database.')
+
+    def setup(self):
+        with connection.cursor() as cursor:
+            cursor.execute(
+                f'CREATE VIRTUAL TABLE IF NOT EXISTS {self.table} USING fts5('
+                "title, description, tokenize='unicode61 remove_diacritics 2', prefix='2 3')"
+            )
+
+    def _write(self, cursor, products):
+        cursor.executemany(
+            f'INSERT INTO {self.table} (rowid, title, description) VALUES (%s, %s, %s)',
+            [(product.pk, product.title, product.description) for product in products]
+        )
+
+    def index(self, products):
+        products = list(products)
+        self.remove([product.pk for product in products])
+        with connection.cursor() as cursor:
+            self._write(cursor, [
+                product for product in products
+                if product.is_active and not product.is_delete
+            ])
+
+    def remove(self, product_ids):
+        with connection.cursor() as cursor:
+            cursor.executemany(
+                f'DELETE FROM {self.table} WHERE rowid = %s',
+                [(product_id,) for product_id in product_ids]
+            )
+
+    def rebuild(self, chunk_size=1000):
+        self.setup()
+        with connection.cursor() as cursor:
+            cursor.execute(f'DELETE FROM {self.table}')
+            count = 0
+            chunk = []
+            products = searchable_products().only('pk', 'title', 'description').order_by('pk')
+            for product in products.iterator(chunk_size=chunk_size):
+                chunk.append(product)
+                if len(chunk) >= chunk_size:
+                    self._write(cursor, chunk)
+                    count += len(chunk)
+                    chunk = []
+            self._write(cursor, chunk)
+            count += len(chunk)
+            cursor.execute(f"INSERT INTO {self.table} ({self.table}) VALUES ('optimize')")
+        return count
+
+    @staticmethod
+    def build_match(query):
+        """Turn free text into a safe FTS5 MATCH expression."""
+        tokens = TOKEN_RE.findall(query)
+        if not tokens:
+            return None
+        terms = [f'"{token}"' for token in tokens]
+        terms[-1] += '*'
+        return ' '.join(terms)
+
+    def search(self, query, limit):
+        match = self.build_match(query)
+        if match is None:
+            return []
+        with connection.cursor() as cursor:
+            cursor.execute(
+                f'SELECT rowid FROM {self.table} WHERE {self.table} MATCH %s '
+                f'ORDER BY bm25({self.table}, %s, %s) LIMIT %s',
+                [match, self.title_weight, self.description_weight, limit]
+            )
+            return [row[0] for row in cursor.fetchall()]
+
+
+@lru_cache(maxsize=None)
+def _load_backend(path):
+    return import_string(path)()
+
+
+def get_search_backend():
+    """Return the backend configured in PRODUCT_SEARCH['BACKEND']."""
+    return _load_backend(get_search_settings()['BACKEND'])
+
+
+class ProductSearchFilter(BaseFilterBackend):
+    """
+    `?search=...` through the configured search backend.
+
+    Matches are returned by relevance unless the request also sets
+    `?ordering=`, in which case OrderingFilter takes over.
+
+    At most PRODUCT_SEARCH['MAX_RESULTS'] matches are considered; the view's
+    `search_truncated` attribute tells whether there were more.
+    """
+    search_param = 'search'
+
+    def filter_queryset(self, request, queryset, view):
+        query = request.query_params.get(self.search_param, '').strip()
+        if not query:
+            return queryset
+
+        limit = get_search_settings()['MAX_RESULTS']
+        ids = get_search_backend().search(query, limit + 1)
+        view.search_truncated = len(ids) > limit
+        ids = ids[:limit]
+        if not ids:
+            return queryset.none()
+        return queryset.filter(pk__in=ids).order_by(self.relevance(queryset.model, ids))
+
+    @staticmethod
+    def relevance(model, ids):
+        """
+        `CASE id WHEN <first> THEN 0 WHEN <second> THEN 1 ... END`, written as
+        raw SQL because compiling hundreds of `When()` objects costs far more
+        than the query itself.
+        """
+        quote = connection.ops.quote_name
+        column = f'{quote(model._meta.db_table)}.{quote(model._meta.pk.column)}'
+        params = [value for position, pk in enumerate(ids) for value in (pk, position)]
+        return RawSQL(f"CASE {column} {' '.join(['WHEN %s THEN %s'] * len(ids))} END", params)
+
+    def get_schema_operation_parameters(self, view):
+        return [{
+            'name': self.search_param,
+            'required': False,
+            'in': 'query',
+            'description': 'Full-text search on title and description, ranked by relevance.',
+            'schema': {'type': 'string'},
+        }]
@@ -1,16 +1,146 @@
+from django.db.models import Prefetch, prefetch_related_objects
+from django.urls import reverse
 from rest_framework import serializers
-from .models import Product, ProductComment, ProductLike
+from .models import Product, ProductComment, ProductImage, ProductLike, ProductTag
+from .comment_tree import load_comment_summaries, load_comment_trees, load_reply_previews
+from .compiled import CompiledListSerializer
+from .likes import load_liked_by
+
+
+def requested_expansions(context):
+    """Return the optional fields asked for with `?expand=a,b`."""
+    request = context.get('request')
+    if request is None:
+        return set()
+    return {name.strip() for name in request.query_params.get('expand', '').split(',') if name.strip()}
+
+
+def requested_fields(context):
+    """Return the fields asked for with `?fields=a,b`, or None for all of them."""
+    request = context.get('request')
+    if request is None or not request.query_params.get('fields'):
+        return None
+    return {name.strip() for name in request.query_params['fields'].split(',') if name.strip()}
+
+
+def request_user(context):
+    request = context.get('request')
+    return getattr(request, 'user', None)
+
+
+class ProductListSerializer(CompiledListSerializer):
+    """
+    Applies the child's `prefetch_plan` to the whole page: each field that
+    will be rendered loads its related data with one query, so a page costs
+    the same number of queries whatever its size. Rows are then rendered
+    through the compiled field plan (see `products.compiled`).
+    """
+
+    def to_representation(self, data):
+        if hasattr(data, 'all'):
+            data = data.all()
+        products = list(data)
+        fields = self.child.fields
+        for name, step in self.child.prefetch_plan.items():
+            if name not in fields or not products:
+                continue
+            if callable(step):
+                step(products, self.context)
+            else:
+                prefetch_related_objects(products, step)
+        return super().to_representation(products)
+
+
+class ProductImageSerializer(serializers.ModelSerializer):
+    """
+    `variants` maps each format to srcset-ready URLs by width, e.g.
+    {"webp": {"320w": ".../front.320w.webp", "640w": ...}}. It is empty
+    until the variants have been generated (see products.images).
+    """
+    variants = serializers.SerializerMethodField()
+
+    class Meta:
+        model = ProductImage
+        fields = ['id', 'image', 'variants']
+        list_serializer_class = CompiledListSerializer
+
+    def get_variants(self, obj):
+        storage = obj.image.storage
+        request = self.context.get('request')
+        return {
+            fmt: {
+                f'{width}w': request.build_absolute_uri(storage.url(name)) if request else storage.url(name)
+                for width, name in sorted(sizes.items(), key=lambda item: int(item[0]))
+            }
+            for fmt, sizes in obj.variants.items()
+        }
+
 
 class ProductSerializer(serializers.ModelSerializer):
+    """
+    Optional fields, included with `?expand=...`:
+    - `liked_by_me`: whether the current user has liked the product.
+    - `images`: the product images with their resized variants.
+    - `comments`: the whole comment tree. Clients should page through
+      `comment_summary.url` instead (see `ProductCommentListView`).
+
+    `comment_summary` ({"count", "threads", "url"}) is always present on a
+    single product and left out of lists unless expanded.
+
+    `?fields=id,title,price` keeps only the named fields; naming an optional
+    field there includes it too. Unknown names are ignored.
+    """
+    comment_summary = serializers.SerializerMethodField()
     comments = serializers.SerializerMethodField()
-    
+    liked_by_me = serializers.SerializerMethodField()
+    images = ProductImageSerializer(many=True, read_only=True)
+
+    expandable_fields = ('liked_by_me', 'images', 'comments')
+    list_expandable_fields = ('comment_summary',)
+
+    # How each field's related data is loaded for a page of products: a
+    # prefetch lookup, or a loader called with (products, context).
+    prefetch_plan = {
+        'tags': Prefetch('tags', queryset=ProductTag.objects.only('pk')),
+        'images': 'images',
+        'comment_summary': lambda products, context: load_comment_summaries(products),
+        'comments': lambda products, context: load_comment_trees(products),
+        'liked_by_me': lambda products, context: load_liked_by(products, request_user(context)),
+    }
+
     class Meta:
         model = Product
-        exclude = ('is_active', 'is_delete', 'quantity')
+        exclude = ('is_active', 'is_delete', 'quantity', 'reserved_quantity', 'trending_score')
+        list_serializer_class = ProductListSerializer
+
+    def get_fields(self):
+        fields = super().get_fields()
+        only = requested_fields(self.context)
+        wanted = requested_expansions(self.context) | (only or set())
+        optional = self.expandable_fields
+        if isinstance(self.parent, serializers.ListSerializer):
+            optional += self.list_expandable_fields
+        for name in list(fields):
+            if (name in optional and name not in wanted) or (only is not None and name not in only):
+                fields.pop(name)
+        return fields
         
+    def get_comment_summary(self, obj):
+        if not hasattr(obj, '_comment_summary'):
+            load_comment_summaries([obj])
+        url = reverse('product-comments', kwargs={'pk': obj.pk})
+        request = self.context.get('request')
+        return {**obj._comment_summary, 'url': request.build_absolute_uri(url) if request else url}
+
     def get_comments(self, obj):
-        comments = obj.comments.filter(is_active=True, is_delete=False, reply__isnull=True)
-        return ProductCommentSerializer(comments, many=True).data
+        if not hasattr(obj, '_comment_tree'):
+            load_comment_trees([obj])
+        return ProductCommentSerializer(obj._comment_tree, many=True).data
+
+    def get_liked_by_me(self, obj):
+        if not hasattr(obj, '_liked_by_me'):
+            load_liked_by([obj], request_user(self.context))
+        return obj._liked_by_me
     
 class ProductCommentSerializer(serializers.ModelSerializer):
     replies = serializers.SerializerMethodField()
@@ -19,15 +149,52 @@ class ProductCommentSerializer(serializers.ModelSerializer):
         exclude = ('is_active', 'is_delete')
     
     def get_replies(self, obj):
+        if hasattr(obj, '_reply_list'):
+            return ProductCommentSerializer(obj._reply_list, many=True).data
         if obj.replies.exists():
-            return ProductCommentSerializer(obj.replies.filter(is_active=True, is_delete=False), many=True).data
+            return ProductCommentSerializer(obj.replies.published(), many=True).data
         return []
 
 
+class CommentReplySerializer(serializers.ModelSerializer):
+    """A previewed reply: its own replies are only counted."""
+    reply_count = serializers.IntegerField(source='_reply_count', read_only=True)
+
+    class Meta:
+        model = ProductComment
+        exclude = ('is_active', 'is_delete')
+
+
+class CommentThreadListSerializer(serializers.ListSerializer):
+    """Loads reply counts and previews for the whole page with three queries."""
+
+    def to_representation(self, data):
+        if hasattr(data, 'all'):
+            data = data.all()
+        return super().to_representation(load_reply_previews(data))
+
+
+class CommentThreadSerializer(serializers.ModelSerializer):
+    """
+    A comment with `reply_count` and its first replies (PRODUCT_COMMENTS
+    ['REPLY_PREVIEW']); the rest come from the replies endpoint.
+    """
+    reply_count = serializers.IntegerField(source='_reply_count', read_only=True)
+    replies = CommentReplySerializer(source='_reply_preview', many=True, read_only=True)
+
+    class Meta:
+        model = ProductComment
+        exclude = ('is_active', 'is_delete')
+        list_serializer_class = CommentThreadListSerializer
+
+
 class ProductLikeSerializer(serializers.ModelSerializer):
     class Meta:
         model = ProductLike
         fields = ['id', 'product', 'user', 'created_at']
         read_only_fields = ['id', 'user', 'created_at']
-        
-    
\ No newline at end of file
+
+
+class ProductLikeToggleSerializer(serializers.Serializer):
+    liked = serializers.BooleanField(required=False, allow_null=True, default=None)
+
@@ -0,0 +1,141 @@
+from django.db.models.signals import m2m_changed, post_delete, post_save, pre_save
+from functools import partial
+
+from django.db import transaction
+from django.dispatch import receiver
+from django.utils import timezone
+
+from .attributes import invalidate_posting_lists
+from .cache import bump_catalog_version
+from .images import delete_variants, needs_variants, schedule_variants
+from .categories import bump_category_version
+from .models import Product, ProductAttributeValue, ProductCategory, ProductComment, ProductImage, ProductLike
+from .ratings import refresh_rating_stats
+from .recommendations import forget_like
+from .search import get_search_backend
+
+
+@receiver(post_save, sender=ProductComment)
+@receiver(post_delete, sender=ProductComment)
+def update_product_rating(sender, instance, **kwargs):
+    """
+    Keep the stored rating statistics of a product in sync with its comments.
+
+    Creating, editing, deactivating, soft-deleting or deleting a comment all
+    go through here. Bulk `QuerySet.update()` calls bypass signals; run
+    `manage.py rebuild_rating_stats` after those.
+    """
+    refresh_rating_stats([instance.product_id])
+
+
+SEARCHABLE_FIELDS = {'title', 'description', 'is_active', 'is_delete'}
+
+
+@receiver(post_save, sender=Product)
+def index_product(sender, instance, raw=False, update_fields=None, **kwargs):
+    """Keep the search index in sync; see `manage.py rebuild_search_index`."""
+    if raw or (update_fields and not SEARCHABLE_FIELDS & set(update_fields)):
+        return
+    get_search_backend().index([instance])
+
+
+@receiver(post_delete, sender=Product)
+def unindex_product(sender, instance, **kwargs):
+    get_search_backend().remove([instance.pk])
+
+
+def setup_search_backend(sender, **kwargs):
+    get_search_backend().setup()
+
+
+def touch_product(product_id):
+    """Move a product's version stamp (`modified_at`) after a related row changed."""
+    Product.objects.filter(pk=product_id).update(modified_at=timezone.now())
+
+
+@receiver(post_save, sender=Product)
+@receiver(post_delete, sender=Product)
+@receiver(post_save, sender=ProductCategory)
+@receiver(post_delete, sender=ProductCategory)
+def invalidate_catalog(sender, instance, **kwargs):
+    bump_catalog_version()
+
+
+@receiver(post_save, sender=ProductCategory)
+@receiver(post_delete, sender=ProductCategory)
+def invalidate_category_tree(sender, instance, **kwargs):
+    bump_category_version()
+
+
+@receiver(post_save, sender=ProductImage)
+@receiver(post_delete, sender=ProductImage)
+@receiver(post_save, sender=ProductComment)
+@receiver(post_delete, sender=ProductComment)
+@receiver(post_save, sender=ProductAttributeValue)
+@receiver(post_delete, sender=ProductAttributeValue)
+def invalidate_product_relation(sender, instance, **kwargs):
+    touch_product(instance.product_id)
+    bump_catalog_version()
+
+
+@receiver(m2m_changed, sender=Product.tags.through)
+def invalidate_product_tags(sender, instance, reverse, pk_set, **kwargs):
+    if not kwargs['action'].startswith('post_'):
+        return
+    if reverse:
+        Product.objects.filter(pk__in=pk_set or ()).update(modified_at=timezone.now())
+    else:
+        touch_product(instance.pk)
+    bump_catalog_version()
+
+
+@receiver(pre_save, sender=ProductAttributeValue)
+def remember_attribute_value(sender, instance, raw=False, **kwargs):
+    instance._previous_attribute_value_id = None
+    if instance.pk and not raw:
+        instance._previous_attribute_value_id = sender.objects.filter(pk=instance.pk).values_list(
+            'attribute_value_id', flat=True
+        ).first()
+
+
+@receiver(post_save, sender=ProductAttributeValue)
+@receiver(post_delete, sender=ProductAttributeValue)
+def update_attribute_index(sender, instance, **kwargs):
+    """Drop the posting lists of the values involved; they are reloaded on the next filter."""
+    previous = getattr(instance, '_previous_attribute_value_id', None)
+    invalidate_posting_lists({instance.attribute_value_id, previous} - {None})
+
+
+@receiver(pre_save, sender=ProductImage)
+def forget_replaced_variants(sender, instance, raw=False, **kwargs):
+    """Drop the variants of an original that is being replaced."""
+    instance._stale_variants = None
+    if not instance.pk or raw:
+        return
+    previous = sender.objects.filter(pk=instance.pk).values('image', 'variants').first()
+    if previous and previous['image'] != instance.image.name:
+        instance._stale_variants = previous['variants']
+        instance.variants = {}
+        instance.variants_source = ''
+
+
+@receiver(post_save, sender=ProductImage)
+def generate_image_variants(sender, instance, raw=False, **kwargs):
+    """Render resized/WebP variants after upload; see `manage.py generate_image_variants`."""
+    stale = getattr(instance, '_stale_variants', None)
+    if stale:
+        transaction.on_commit(partial(delete_variants, instance.image.storage, stale))
+    if raw or not instance.image or not needs_variants(instance):
+        return
+    transaction.on_commit(partial(schedule_variants, instance.pk))
+
+
+@receiver(post_delete, sender=ProductImage)
+def remove_image_variants(sender, instance, **kwargs):
+    delete_variants(instance.image.storage, instance.variants)
+
+
+@receiver(post_delete, sender=ProductLike)
+def uncount_like(sender, instance, **kwargs):
+    """Queue a removed like for the next recommendations run."""
+    forget_like(instance)
@@ -0,0 +1,233 @@
+import atexit
+import logging
+import threading
+import time
+from collections import Counter
+
+from django.conf import settings
+from django.db import connection, transaction
+
+from .counters import increment
+from .dedupe import get_view_deduplicator
+from .models import Product, ProductView
+
+logger = logging.getLogger(__name__)
+
+VIEW_BUFFER_DEFAULTS = {
+    'ENABLED': True,
+    'BATCH_SIZE': 100,
+    'FLUSH_INTERVAL': 5.0,
+    'MAX_PENDING': 1000,
+}
+
+
+def get_view_buffer_settings():
+    """Return the PRODUCT_VIEW_BUFFER setting merged over the defaults."""
+    return {**VIEW_BUFFER_DEFAULTS, **getattr(settings, 'PRODUCT_VIEW_BUFFER', {})}
+
+
+class ViewBuffer:
+    """
+    In-process buffer for product views.
+
+    Views are collected in memory and written in one go:
+    one `bulk_create` of ProductView rows plus one `view_count` increment
+    per product. A flush happens when `batch_size`
+    views are pending, or `flush_interval` seconds after the oldest pending
+    view, and once more at interpreter exit. The timed flush runs on a
+    daemon thread started with the first view (with `background`), so it
+    also happens when traffic stops.
+
+    A crash therefore loses at most `batch_size` views, or `flush_interval`
+    seconds of views. If a flush fails the views are queued again, but never
+    more than `max_pending` of them; the oldest ones are dropped beyond that.
+    """
+
+    def __init__(self, batch_size=100, flush_interval=5.0, max_pending=1000, background=True):
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.max_pending = max(max_pending, batch_size)
+        self.background = background
+        self._lock = threading.Lock()
+        self._flush_lock = threading.Lock()
+        self._pending = {}
+        self._oldest = None
+        self._timer = None
+
+    def __len__(self):
+        return len(self._pending)
+
+    def __contains__(self, key):
+        return key in self._pending
+
+    def add(self, product_id, user_id, ip_address):
+        """
+        Queue a view, flushing the buffer if it is due.
+
+        Returns:
+            bool: False if the same view was already pending.
+        """
+        viewer_key = ProductView.make_viewer_key(user_id, ip_address)
+        key = (product_id, viewer_key)
+        with self._lock:
+            if key in self._pending:
+                return False
+            self._pending[key] = (product_id, user_id, ip_address, viewer_key)
+            if self._oldest is None:
+                self._oldest = time.monotonic()
+            due = (
+                len(self._pending) >= self.batch_size
+                or time.monotonic() - self._oldest >= self.flush_interval
+            )
+            if self.background and self._timer is None:
+                self._timer = threading.Thread(target=self._flush_periodically, name='view-buffer', daemon=True)
+                self._timer.start()
+        if due:
+            self.flush()
+        return True
+
+    def _flush_periodically(self):
+        while True:
+            with self._lock:
+                oldest = self._oldest
+            wait = self.flush_interval if oldest is None else oldest + self.flush_interval - time.monotonic()
+            if wait > 0:
+                time.sleep(wait)
+                continue
+            try:
+                self.flush()
+            finally:
+                # The thread must not keep its own database connection open.
+                connection.close()
+
+    def discard(self):
+        """Drop every pending view without writing it."""
+        with self._lock:
+            self._pending = {}
+            self._oldest = None
+
+    def _take(self):
+        with self._lock:
+            entries = list(self._pending.values())
+            self._pending = {}
+            self._oldest = None
+        return entries
+
+    def _requeue(self, entries):
+        with self._lock:
+            merged = {(entry[0], entry[3]): entry for entry in entries}
+            merged.update(self._pending)
+            overflow = len(merged) - self.max_pending
+            if overflow > 0:
+                logger.warning('Dropping %d buffered product views.', overflow)
+                merged = dict(list(merged.items())[overflow:])
+            self._pending = merged
+            if merged and self._oldest is None:
+                self._oldest = time.monotonic()
+
+    def flush(self):
+        """
+        Write every pending view to the database.
+
+        Returns:
+            int: Number of views written.
+        """
+        with self._flush_lock:
+            entries = self._take()
+            if not entries:
+                return 0
+            try:
+                return write_views(entries, batch_size=self.batch_size)
+            except Exception:
+                logger.exception('Flushing %d product views failed.', len(entries))
+                self._requeue(entries)
+                return 0
+
+
+def write_views(entries, batch_size=None):
+    """
+    Write views in one transaction.
+
+    Entries are (product_id, user_id, ip_address, viewer_key) tuples. Views
+    already stored are skipped with a single lookup on the
+    `unique_product_viewer` index, then the rest are inserted with one
+    `bulk_create` and `view_count` is bumped with one counter increment per
+    product (see `products.counters`).
+
+    Returns:
+        int: Number of views written.
+    """
+    with transaction.atomic():
+        product_ids = {entry[0] for entry in entries}
+        existing_products = set(
+            Product.objects.filter(pk__in=product_ids).values_list('pk', flat=True)
+        )
+        existing_views = set(
+            ProductView.objects.filter(
+                product_id__in=product_ids,
+                viewer_key__in={entry[3] for entry in entries}
+            ).values_list('product_id', 'viewer_key')
+        )
+        entries = [
+            entry for entry in entries
+            if entry[0] in existing_products and (entry[0], entry[3]) not in existing_views
+        ]
+        counts = Counter(entry[0] for entry in entries)
+
+        ProductView.objects.bulk_create(
+            [
+                ProductView(
+                    product_id=product_id,
+                    user_id=user_id,
+                    ip_address=ip_address,
+                    viewer_key=viewer_key
+                )
+                for product_id, user_id, ip_address, viewer_key in entries
+            ],
+            batch_size=batch_size,
+            ignore_conflicts=True
+        )
+        for product_id, count in counts.items():
+            increment(product_id, 'view_count', count)
+    return len(entries)
+
+
+def _build_view_buffer():
+    config = get_view_buffer_settings()
+    return ViewBuffer(
+        batch_size=config['BATCH_SIZE'],
+        flush_interval=config['FLUSH_INTERVAL'],
+        max_pending=config['MAX_PENDING'],
+    )
+
+
+view_buffer = _build_view_buffer()
+atexit.register(view_buffer.flush)
+
+
+def record_view(product_id, user, ip_address):
+    """
+    Record a view of a product unless this user/IP has already viewed it.
+
+    Repeat visitors are detected by the deduplicator configured in
+    PRODUCT_VIEW_DEDUPE (see `products.dedupe`). With
+    PRODUCT_VIEW_BUFFER['ENABLED'] the view is queued in `view_buffer` and
+    written later; otherwise it is written immediately.
+
+    Returns:
+        bool: True if a new view was recorded.
+    """
+    user_id = user.pk if user else None
+    viewer_key = ProductView.make_viewer_key(user_id, ip_address)
+    buffered = get_view_buffer_settings()['ENABLED']
+    deduplicator = get_view_deduplicator()
+
+    if buffered and (product_id, viewer_key) in view_buffer:
+        return False
+    if deduplicator.seen(product_id, viewer_key):
+        return False
+    deduplicator.remember(product_id, viewer_key)
+
+    if buffered:
+        return view_buffer.add(product_id, user_id, ip_address)
+    return write_views([(product_id, user_id, ip_address, viewer_key)]) > 0
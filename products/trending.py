@@ -0,0 +1,120 @@
+import math
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Count, F, Max
+from django.db.models.functions import TruncHour
+from django.utils import timezone
+
+from .cache import bump_version
+from .categories import subtree_filter
+from .models import Product, ProductLike, ProductTrendingState, ProductView
+
+TRENDING_DEFAULTS = {
+    'HALF_LIFE': 24 * 3600,
+    'VIEW_WEIGHT': 1.0,
+    'LIKE_WEIGHT': 5.0,
+    'TOP_N': 10,
+    'MAX_TOP_N': 50,
+    'REBASE_AFTER': 30 * 24 * 3600,
+    'BATCH_SIZE': 500,
+}
+
+TRENDING_VERSION_KEY = 'products:version:trending'
+
+
+def get_trending_settings():
+    """Return the PRODUCT_TRENDING setting merged over the defaults."""
+    return {**TRENDING_DEFAULTS, **getattr(settings, 'PRODUCT_TRENDING', {})}
+
+
+def decay_rate():
+    return math.log(2) / get_trending_settings()['HALF_LIFE']
+
+
+def weight_at(moment, epoch):
+    """
+    Forward decay: an event at `moment` weighs exp(rate * (moment - epoch)).
+
+    Every stored score shares the same `epoch`, so ranking never needs the
+    old scores to be decayed; only products with new events are written.
+    """
+    return math.exp(decay_rate() * (moment - epoch).total_seconds())
+
+
+def new_event_weights(model, after_id, upto_id, weight, epoch):
+    """
+    Weighted, decayed counts of the rows of `model` in (after_id, upto_id],
+    from one query grouped by product and hour.
+    """
+    rows = model.objects.filter(pk__gt=after_id, pk__lte=upto_id).annotate(
+        hour=TruncHour('created_at')
+    ).order_by().values('product_id', 'hour').annotate(events=Count('pk'))
+    weights = {}
+    for row in rows:
+        # Events are placed in the middle of their hour.
+        moment = row['hour'] + timedelta(minutes=30)
+        weights[row['product_id']] = weights.get(row['product_id'], 0) + weight * row['events'] * weight_at(moment, epoch)
+    return weights
+
+
+def rebase(state, now):
+    """Move the epoch to `now`, scaling every score down to match (one UPDATE)."""
+    factor = 1 / weight_at(now, state.epoch)
+    Product.objects.exclude(trending_score=0).update(trending_score=F('trending_score') * factor)
+    state.epoch = now
+
+
+def update_trending_scores(now=None):
+    """
+    Add the views and likes recorded since the last run to the stored scores.
+
+    Only new rows are read (by pk, past the state's cursors) and only
+    products that received events are written. Unlikes do not lower a score;
+    it simply decays.
+
+    Returns:
+        int: Number of products whose score changed.
+    """
+    config = get_trending_settings()
+    now = now or timezone.now()
+    with transaction.atomic():
+        state = ProductTrendingState.objects.select_for_update().filter(pk=1).first()
+        if state is None:
+            state = ProductTrendingState(pk=1, epoch=now)
+        if (now - state.epoch).total_seconds() > config['REBASE_AFTER']:
+            rebase(state, now)
+
+        last_view = ProductView.objects.aggregate(last=Max('pk'))['last'] or state.last_view_id
+        last_like = ProductLike.objects.aggregate(last=Max('pk'))['last'] or state.last_like_id
+        added = new_event_weights(ProductView, state.last_view_id, last_view, config['VIEW_WEIGHT'], state.epoch)
+        for product_id, weight in new_event_weights(
+            ProductLike, state.last_like_id, last_like, config['LIKE_WEIGHT'], state.epoch
+        ).items():
+            added[product_id] = added.get(product_id, 0) + weight
+
+        products = list(Product.objects.filter(pk__in=added).only('pk', 'trending_score'))
+        for product in products:
+            product.trending_score += added[product.pk]
+        Product.objects.bulk_update(products, ['trending_score'], batch_size=config['BATCH_SIZE'])
+
+        state.last_view_id = last_view
+        state.last_like_id = last_like
+        state.save()
+        transaction.on_commit(lambda: bump_version(TRENDING_VERSION_KEY))
+    return len(products)
+
+
+def trending_products(category=None, limit=None):
+    """
+    The top `limit` active products by stored score, optionally within a
+    category subtree; a range scan of the `trending_score` index when
+    unscoped.
+    """
+    config = get_trending_settings()
+    limit = min(max(1, limit or config['TOP_N']), config['MAX_TOP_N'])
+    queryset = Product.published.filter(trending_score__gt=0)
+    if category is not None:
+        queryset = queryset.filter(subtree_filter(category.path, prefix='category__'))
+    return queryset.order_by('-trending_score', '-pk')[:limit]
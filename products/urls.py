@@ -3,8 +3,21 @@ from . import views
 
 urlpatterns = [
     path('products/', views.ProductListAPIView.as_view(), name='product-list'),
+    path('products/batch/', views.ProductBatchAPIView.as_view(), name='product-batch'),
+    path('products/trending/', views.TrendingProductsAPIView.as_view(), name='trending-products'),
     path('product/<int:pk>/', views.ProductDetailAPIView.as_view(), name='product-detail'),
+    path('product/<int:pk>/recommendations/', views.ProductRecommendationsAPIView.as_view(), name='product-recommendations'),
     path('product/<int:pk>/like/', views.ProductLikeToggleView.as_view(), name='product-like'),
     path('product/<int:pk>/comment/', views.ProductCommentCreateView.as_view(), name='product-comment'),
+    path('product/<int:pk>/comments/', views.ProductCommentListView.as_view(), name='product-comments'),
+    path(
+        'product/<int:pk>/comments/<int:comment_pk>/replies/',
+        views.ProductCommentReplyListView.as_view(),
+        name='product-comment-replies'
+    ),
     path('products/liked/', views.LikedProductsListView.as_view(), name='liked-products'),
+    path('products/liked/ids/', views.LikedProductIdsView.as_view(), name='liked-product-ids'),
+    path('products/categories/tree/', views.CategoryTreeView.as_view(), name='category-tree'),
+    path('products/export/', views.ProductExportView.as_view(), name='product-export'),
+    path('products/cache/stats/', views.ResponseCacheStatsView.as_view(), name='product-cache-stats'),
 ]
@@ -1,43 +1,191 @@
 from rest_framework.generics import (
+    GenericAPIView,
     ListAPIView,
     RetrieveAPIView,
     CreateAPIView,
 )
 from rest_framework.views import APIView
-from rest_framework.filters import SearchFilter, OrderingFilter
+from rest_framework.filters import OrderingFilter
 from rest_framework.response import Response
 from rest_framework import status, permissions
+from rest_framework.exceptions import ValidationError
 from django_filters.rest_framework import DjangoFilterBackend
+from django.http import StreamingHttpResponse
 from django.shortcuts import get_object_or_404
-from django.db.models import Q, Prefetch, F
+from django.utils import timezone
 
-from .serializers import ProductSerializer, ProductCommentSerializer
-from core.utils import get_client_ip
+from .serializers import (
+    CommentThreadSerializer,
+    ProductSerializer,
+    ProductCommentSerializer,
+    ProductLikeToggleSerializer,
+)
+from .filters import ProductFilter
+from .search import ProductSearchFilter
+from .attributes import AttributeFilter
+from .pagination import CommentPagination, ProductPagination
+from .comment_tree import visible_comments
+from .cache import CATALOG_VERSION_KEY, CachedResponseMixin, get_cache_stats, get_version
+from .categories import get_category, get_category_tree, get_category_version
+from .trending import TRENDING_VERSION_KEY, trending_products
+from .recommendations import RECOMMENDATION_VERSION_KEY, recommended_products
+from .facets import get_facets, requested_facets
+from .exporting import RENDERERS, export_queryset, iter_export_rows, parse_since
+from .conditional import STAMP_FIELDS, conditional_response, last_modified_of, make_etag
+from core.utils import get_client_ip, parse_id
+from .tracking import record_view
+from .likes import set_like
+from .counters import get_counts
 from .models import (
     Product,
-    ProductView,
     ProductLike
 )
 
-class ProductListAPIView(ListAPIView):
+class ProductListAPIView(CachedResponseMixin, ListAPIView):
     """
     API view to retrieve a list of active products.
 
     Provides read-only access to products:
-    - Supports searching by title and description (e.g., `?search=...`)
-    - Supports ordering by price or creation date (e.g., `?ordering=-price`)
+    - Supports full-text searching by title and description, ranked by relevance
+      (e.g., `?search=...`, see `products.search`). Only the best
+      PRODUCT_SEARCH['MAX_RESULTS'] matches are listed; searches add a
+      `truncated` flag that is true when more products matched
+    - Supports ordering by price, creation date or rating (e.g., `?ordering=-rating_average`)
+    - Supports filtering by rating (e.g., `?min_rating=4`)
+    - Supports filtering by category including its subcategories
+      (e.g., `?category=electronics` or `?category=3`)
+    - Supports filtering by attributes (e.g., `?attribute=color:red,blue&attribute=size:m`
+      for red or blue products in size M, see `products.attributes`)
+    - Rows leave out `comments` unless asked for with `?expand=comments`;
+      `?fields=id,title,price` keeps only the named fields
+    - `?expand=liked_by_me` adds whether the current user liked each product,
+      computed for the whole page with a single query
+    - Related data is loaded per page following `ProductSerializer.prefetch_plan`,
+      so the number of queries does not depend on the page size
+    - `?pagination=cursor` switches to keyset pagination (no COUNT, no OFFSET),
+      ordered by `?ordering=` (price or created_at, default `-created_at`)
+    - `?facets=category,tag,attribute,price` (or `?facets=all`) adds a `facets`
+      object with counts over all matching products, one grouped query per
+      facet (see `products.facets`)
 
     Only products marked as is_active=True and is_delete=False will be returned.
+    Responses carry a strong ETag derived from the version stamps of the
+    page's products (see `products.conditional`); a matching `If-None-Match`
+    is answered with 304 before anything is serialized. There is no
+    Last-Modified: products leaving the page don't move the newest stamp.
+    Anonymous responses are cached per query string until the catalog changes
+    (see `products.cache`).
     """
-    queryset = Product.objects.filter(is_active=True, is_delete=False)
+    queryset = Product.published.all()
     serializer_class = ProductSerializer
+    cache_prefix = 'list'
+
+    pagination_class = ProductPagination
+    filter_backends = [DjangoFilterBackend, AttributeFilter, ProductSearchFilter, OrderingFilter]
+    filterset_class = ProductFilter
+    ordering_fields = ['price', 'created_at', 'rating_average']
+
+    def list(self, request, *args, **kwargs):
+        return self.get_cached_response(request, lambda: self.build_response(request))
+
+    def build_response(self, request):
+        queryset = self.filter_queryset(self.get_queryset())
+        page = self.paginate_queryset(queryset)
+        stamps = [
+            {'pk': product.pk, **{field: getattr(product, field) for field in STAMP_FIELDS}}
+            for product in page
+        ]
+        signature = self.paginator.get_page_signature()
+        facets = requested_facets(request)
+        if facets:
+            # Facets cover products outside the page too.
+            signature = (*signature, get_version(CATALOG_VERSION_KEY))
+        truncated = getattr(self, 'search_truncated', None)
+        if truncated is not None:
+            signature = (*signature, truncated)
+        etag = make_etag(request, stamps, signature)
+        return conditional_response(
+            request,
+            etag,
+            None,
+            lambda: self.build_page_response(request, page, queryset, facets)
+        )
 
-    filter_backends = [DjangoFilterBackend, SearchFilter, OrderingFilter]
-    search_fields = ['title', 'description']
-    ordering_fields = ['price', 'created_at']
+    def build_page_response(self, request, page, queryset, facets):
+        response = self.get_paginated_response(self.get_serializer(page, many=True).data)
+        if facets:
+            response.data['facets'] = get_facets(request, queryset, facets)
+        if getattr(self, 'search_truncated', None) is not None:
+            response.data['truncated'] = self.search_truncated
+        return response
 
 
-class ProductDetailAPIView(RetrieveAPIView):
+class ProductBatchAPIView(CachedResponseMixin, GenericAPIView):
+    """
+    API view to retrieve several specific products at once, for carts,
+    wishlists and recommendation widgets.
+
+    - `?ids=12,7,40` or `?slugs=red-shoe,blue-hat` (one of them, at most
+      `max_items` values; duplicates are ignored).
+    - Products come back in the requested order; requested products that do
+      not exist or are not active are listed under `missing`.
+    - `?fields=` / `?expand=` work as on the product list.
+
+    The products are loaded with one query plus the fixed prefetches of the
+    requested fields, and no product view is recorded. Responses carry an
+    ETag of the products' version stamps and anonymous responses are cached
+    until the catalog changes, as on the product list.
+
+    Response JSON example:
+    {
+        "results": [{"id": 12, ...}, {"id": 40, ...}],
+        "missing": [7]
+    }
+    """
+    queryset = Product.published.all()
+    serializer_class = ProductSerializer
+    filter_backends = []
+    pagination_class = None
+    cache_prefix = 'batch'
+    max_items = 50
+
+    def get_lookup(self, request):
+        """Return the field to match on and the requested values, in order."""
+        params = request.query_params
+        if bool(params.get('ids')) == bool(params.get('slugs')):
+            raise ValidationError({'detail': 'Pass either `ids` or `slugs`.'})
+        param, field = ('ids', 'pk') if params.get('ids') else ('slugs', 'slug')
+        values = list(dict.fromkeys(value.strip() for value in params[param].split(',') if value.strip()))
+        if field == 'pk':
+            values = [parse_id(value) for value in values]
+            if None in values:
+                raise ValidationError({'ids': 'Expected comma-separated product IDs.'})
+            values = list(dict.fromkeys(values))
+        if len(values) > self.max_items:
+            raise ValidationError({param: f'At most {self.max_items} products can be requested at once.'})
+        return field, values
+
+    def get(self, request, *args, **kwargs):
+        field, values = self.get_lookup(request)
+        return self.get_cached_response(request, lambda: self.build_response(request, field, values))
+
+    def build_response(self, request, field, values):
+        found = {getattr(product, field): product for product in self.get_queryset().filter(**{f'{field}__in': values})}
+        products = [found[value] for value in values if value in found]
+        missing = [value for value in values if value not in found]
+        stamps = [
+            {'pk': product.pk, **{name: getattr(product, name) for name in STAMP_FIELDS}}
+            for product in products
+        ]
+        return conditional_response(
+            request,
+            make_etag(request, stamps, missing),
+            None,
+            lambda: Response({'results': self.get_serializer(products, many=True).data, 'missing': missing})
+        )
+
+
+class ProductDetailAPIView(CachedResponseMixin, RetrieveAPIView):
     """
     API view to retrieve the details of a single product.
 
@@ -47,30 +195,108 @@ class ProductDetailAPIView(RetrieveAPIView):
 
     View data is stored using the ProductView model.
     Only one view is recorded per unique combination of user (if authenticated) or IP.
+    Views are buffered in memory and written in batches (see `products.tracking`).
+
+    Responses carry a strong ETag and Last-Modified derived from the product's
+    version stamp (see `products.conditional`); a matching `If-None-Match` is
+    answered with 304 before anything is serialized. Anonymous responses are
+    also cached under that stamp (see `products.cache`).
     """
-    queryset = Product.objects.filter(is_active=True, is_delete=False)
+    queryset = Product.published.all()
     serializer_class = ProductSerializer
+    cache_prefix = 'detail'
+
+    def get_cache_versions(self):
+        return [self.etag]
 
     def retrieve(self, request, *args, **kwargs):
-        product = self.get_object()
+        stamp = get_object_or_404(self.get_queryset().values('pk', *STAMP_FIELDS), pk=kwargs['pk'])
         user = request.user if request.user.is_authenticated else None
-        ip = get_client_ip(request)
 
-        
-        already_viewed = ProductView.objects.filter(
-            Q(user=user) | Q(ip_address=ip),
-            product=product
-        ).exists()
+        # The write may still be buffered; reflect it in this response.
+        self.new_view = record_view(stamp['pk'], user, get_client_ip(request))
+        stamp['view_count'] += self.new_view
 
-        if not already_viewed:
-            ProductView.objects.create(product=product, user=user, ip_address=ip)
-            product.view_count += 1
-            product.save(update_fields=['view_count'])
+        self.etag = make_etag(request, [stamp])
+        return conditional_response(
+            request,
+            self.etag,
+            last_modified_of([stamp]),
+            lambda: self.get_cached_response(request, self.build_response)
+        )
 
+    def build_response(self):
+        product = self.get_object()
+        product.view_count += self.new_view
         serializer = self.get_serializer(product)
         return Response(serializer.data)
     
 
+class TrendingProductsAPIView(CachedResponseMixin, ListAPIView):
+    """
+    API view to retrieve the currently trending products, for a "trending" rail.
+
+    Products are ranked by a time-decayed score of their recent views and
+    likes, which `manage.py update_trending_scores` keeps up to date
+    incrementally (see `products.trending`). The list is not paginated.
+
+    - `?limit=20` sets the number of products (default 10, at most 50).
+    - `?category=<id or slug>` ranks only that category and its subcategories.
+
+    Anonymous responses are cached until the scores or the catalog change.
+    """
+    serializer_class = ProductSerializer
+    pagination_class = None
+    filter_backends = []
+    cache_prefix = 'trending'
+
+    def get_cache_versions(self):
+        return [get_version(CATALOG_VERSION_KEY), get_version(TRENDING_VERSION_KEY)]
+
+    def get_queryset(self):
+        params = self.request.query_params
+        category = None
+        if params.get('category'):
+            category = get_category(params['category'])
+            if category is None:
+                return Product.objects.none()
+        return trending_products(category, parse_id(params.get('limit', '')))
+
+    def list(self, request, *args, **kwargs):
+        build = super().list
+        return self.get_cached_response(request, lambda: build(request, *args, **kwargs))
+
+
+class ProductRecommendationsAPIView(CachedResponseMixin, ListAPIView):
+    """
+    API view to retrieve "customers who liked this also liked" products.
+
+    Recommendations are precomputed from users' likes by
+    `manage.py update_recommendations` (see `products.recommendations`), so
+    serving them is a single indexed lookup. The list is not paginated.
+
+    - `?limit=5` sets the number of products (default and maximum: TOP_K).
+
+    Unknown or unpublished products return 404. Anonymous responses are
+    cached until the recommendations or the catalog change.
+    """
+    serializer_class = ProductSerializer
+    pagination_class = None
+    filter_backends = []
+    cache_prefix = 'recommendations'
+
+    def get_cache_versions(self):
+        return [get_version(CATALOG_VERSION_KEY), get_version(RECOMMENDATION_VERSION_KEY)]
+
+    def get_queryset(self):
+        product_id = get_object_or_404(Product.published.values_list('pk', flat=True), pk=self.kwargs['pk'])
+        return recommended_products(product_id, parse_id(self.request.query_params.get('limit', '')))
+
+    def list(self, request, *args, **kwargs):
+        build = super().list
+        return self.get_cached_response(request, lambda: build(request, *args, **kwargs))
+
+
 class ProductLikeToggleView(APIView):
     """
     API view to like or unlike a product.
@@ -80,10 +306,15 @@ class ProductLikeToggleView(APIView):
     - If the user has already liked the product, the like will be removed (unlike).
     - Always returns the updated like status and the total like count for the product.
 
+    - Send `{"liked": true}` or `{"liked": false}` to set the status instead of
+      toggling it; repeating such a request has no further effect.
+
     Rules:
     - Only authenticated users can access this endpoint.
     - Each user can have at most one like per product.
     - Like data is stored in the `ProductLike` model, ensuring uniqueness via a constraint.
+    - Concurrent requests are safe: the constraint decides which one creates the like,
+      and `like_count` is updated through sharded counters (see `products.counters`).
 
     Response JSON example:
     {
@@ -97,25 +328,15 @@ class ProductLikeToggleView(APIView):
 
     def post(self, request, pk, *args, **kwargs):
         product = get_object_or_404(Product, pk=pk)
-        like_qs = ProductLike.objects.filter(user=request.user, product=product)
-
-        if like_qs.exists():
-            like_qs.delete()
-            liked = False
-            like_count = product.like_count - 1
-        else:
-            ProductLike.objects.create(user=request.user, product=product)
-            liked = True
-            like_count = product.like_count + 1
-            
-        product.like_count = like_count
-        product.save()
+        serializer = ProductLikeToggleSerializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        liked = set_like(product, request.user, liked=serializer.validated_data['liked'])
 
         return Response(
             {
                 'product_id': product.id,
                 'liked': liked,
-                'like_count': like_count
+                'like_count': get_counts(product.pk)['like_count']
             },
             status=status.HTTP_200_OK
         )
@@ -157,6 +378,50 @@ class ProductCommentCreateView(CreateAPIView):
         serializer.save(user=self.request.user, product_id=product_id)
 
 
+class ProductCommentListView(CachedResponseMixin, ListAPIView):
+    """
+    API view to page through the comments of a product.
+
+    Returns the visible top-level comments, oldest first
+    (`?ordering=-created_at` for newest first), with keyset pagination
+    (`next`/`previous` cursor links). Each comment carries `reply_count` and
+    its first few replies (PRODUCT_COMMENTS['REPLY_PREVIEW']); fetch the rest
+    from `ProductCommentReplyListView`. A page costs the same few queries
+    whatever the number of comments or the shape of the threads.
+
+    Anonymous responses are cached until the catalog changes.
+    """
+    serializer_class = CommentThreadSerializer
+    pagination_class = CommentPagination
+    cache_prefix = 'comments'
+
+    def get_product_id(self):
+        return get_object_or_404(
+            Product.published.values_list('pk', flat=True),
+            pk=self.kwargs['pk']
+        )
+
+    def get_queryset(self):
+        return visible_comments(self.get_product_id()).filter(reply__isnull=True)
+
+    def list(self, request, *args, **kwargs):
+        build = super().list
+        return self.get_cached_response(request, lambda: build(request, *args, **kwargs))
+
+
+class ProductCommentReplyListView(ProductCommentListView):
+    """
+    API view to page through the direct replies of a comment, in the same
+    shape and order as `ProductCommentListView`.
+    """
+    cache_prefix = 'comment-replies'
+
+    def get_queryset(self):
+        comments = visible_comments(self.get_product_id())
+        parent = get_object_or_404(comments.values_list('pk', flat=True), pk=self.kwargs['comment_pk'])
+        return comments.filter(reply_id=parent)
+
+
 class LikedProductsListView(ListAPIView):
     """
     API view to retrieve all products liked by the authenticated user.
@@ -164,13 +429,14 @@ class LikedProductsListView(ListAPIView):
     Features:
     - Only authenticated users can access.
     - Returns Product objects that the current user has liked.
-    - Optimized to avoid N+1 queries by:
-        * `select_related('category')` for category FK (if used in serializer).
-        * `prefetch_related('likes')` to load likes efficiently (if serializer uses it).
+    - Optimized to avoid N+1 queries: related data is loaded per page following
+      `ProductSerializer.prefetch_plan`, for the fields requested with
+      `?fields=` / `?expand=` (as on the product list).
 
     Queryset Notes:
     - Filtering is done via `likes__user=self.request.user`.
     - You can add ordering, filtering, and pagination via DRF settings.
+    - `?pagination=cursor` switches to keyset pagination, as on the product list.
 
     Example response:
     [
@@ -186,16 +452,123 @@ class LikedProductsListView(ListAPIView):
 
     serializer_class = ProductSerializer
     permission_classes = [permissions.IsAuthenticated]
+    pagination_class = ProductPagination
 
     def get_queryset(self):
-        queryset = Product.objects.filter(
+        return Product.objects.filter(
             likes__user=self.request.user
         )
 
-        queryset = queryset.select_related('category')
 
-        queryset = queryset.prefetch_related(
-            Prefetch('likes', queryset=ProductLike.objects.select_related('user'))
+class LikedProductIdsView(APIView):
+    """
+    API view to retrieve only the IDs of the products liked by the authenticated user.
+
+    Meant for clients that keep a local "liked" set, so they don't have to
+    page through full product objects. The list is not paginated.
+
+    Response JSON example:
+    {
+        "ids": [42, 17, 3]
+    }
+    """
+
+    permission_classes = [permissions.IsAuthenticated]
+
+    def get(self, request, *args, **kwargs):
+        ids = ProductLike.objects.filter(user=request.user).order_by('-created_at').values_list(
+            'product_id', flat=True
+        )
+        return Response({'ids': list(ids)}, status=status.HTTP_200_OK)
+
+
+class CategoryTreeView(APIView):
+    """
+    API view to retrieve the whole active category tree, for navigation menus.
+
+    The tree is built from a single query and cached until a category is
+    saved or deleted. Responses carry an ETag of the tree version, so a
+    matching `If-None-Match` is answered with 304.
+
+    Response JSON example:
+    [
+        {
+            "id": 1,
+            "title": "Electronics",
+            "slug": "electronics",
+            "children": [
+                {"id": 7, "title": "Phones", "slug": "phones", "children": []}
+            ]
+        }
+    ]
+    """
+
+    def get(self, request, *args, **kwargs):
+        etag = make_etag(request, [], extra=[get_category_version()])
+        return conditional_response(
+            request,
+            etag,
+            None,
+            lambda: Response(get_category_tree(), status=status.HTTP_200_OK)
         )
 
-        return queryset
+
+class ProductExportView(APIView):
+    """
+    API view to stream the whole catalog (staff only), for partner feeds.
+
+    - `?output=ndjson` (default) streams one JSON object per line;
+      `?output=csv` streams CSV with a header row.
+    - Without `since`, exports every active product in ID order.
+    - `?since=2025-01-31T00:00:00Z` exports only products modified since
+      then, including deactivated and soft-deleted ones, in modification
+      order. Pass the `X-Export-Started` header of the previous export to
+      pick up exactly where it left off.
+
+    Rows are read in chunks with related categories, tags and image URLs
+    resolved per chunk (see `products.exporting`), so memory use does not
+    grow with the catalog.
+
+    NDJSON line example:
+    {"id": 42, "title": "Phone X", "slug": "phone-x", "price": "499.00", "category": "phones",
+     "tags": ["sale"], "images": ["http://.../media/product_images/phone-x/front.jpg"], ...}
+    """
+
+    permission_classes = [permissions.IsAdminUser]
+
+    def get(self, request, *args, **kwargs):
+        output = request.query_params.get('output', 'ndjson')
+        if output not in RENDERERS:
+            raise ValidationError({'output': f"Choose one of: {', '.join(RENDERERS)}."})
+        since = request.query_params.get('since')
+        try:
+            since = parse_since(since) if since else None
+        except ValueError as error:
+            raise ValidationError({'since': str(error)})
+
+        started = timezone.now()
+        render, content_type = RENDERERS[output]
+        rows = iter_export_rows(export_queryset(since), build_url=request.build_absolute_uri)
+        response = StreamingHttpResponse(render(rows), content_type=content_type)
+        response['Content-Disposition'] = f'attachment; filename="products.{output}"'
+        response['X-Export-Started'] = started.isoformat()
+        return response
+
+
+class ResponseCacheStatsView(APIView):
+    """
+    API view to inspect the catalog response cache (admins only).
+
+    Response JSON example:
+    {
+        "hits": 1520,
+        "misses": 310,
+        "hit_rate": 0.8306
+    }
+    """
+
+    permission_classes = [permissions.IsAdminUser]
+
+    def get(self, request, *args, **kwargs):
+        return Response(get_cache_stats(), status=status.HTTP_200_OK)
+
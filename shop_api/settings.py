@@ -144,4 +144,123 @@ SPECTACULAR_SETTINGS = {
     'DESCRIPTION': 'Shop api',
     'VERSION': '1.0.0',
     'SERVE_INCLUDE_SCHEMA': False,
-}
\ No newline at end of file
+}
+
+# Product view tracking
+# Views are buffered in memory and written in batches, when BATCH_SIZE views
+# are pending, by a background thread FLUSH_INTERVAL seconds after the oldest
+# one, and at exit. A crash loses at most BATCH_SIZE views or FLUSH_INTERVAL
+# seconds of views; if writing fails, no more than MAX_PENDING views are kept
+# for the next attempt.
+PRODUCT_VIEW_BUFFER = {
+    'ENABLED': True,
+    'BATCH_SIZE': 100,
+    'FLUSH_INTERVAL': 5.0,
+    'MAX_PENDING': 1000,
+}
+
+# Repeat-view detection, keyed by (product, user or IP).
+# 'exact' looks the pair up in ProductView's unique index; 'bloom' keeps a
+# rotating Bloom filter of at most MAX_MEMORY bytes in each process and never
+# touches the database for repeat visitors, at FALSE_POSITIVE_RATE.
+PRODUCT_VIEW_DEDUPE = {
+    'MODE': 'bloom',
+    'FALSE_POSITIVE_RATE': 0.001,
+    'MAX_MEMORY': 4 * 1024 * 1024,
+}
+
+# Like/view counters are spread over SHARDS rows per product and rolled up
+# into Product by `manage.py rollup_counters --interval 10`. Use 1 to update
+# Product directly.
+PRODUCT_COUNTERS = {
+    'SHARDS': 8,
+}
+
+# Product search. BACKEND is any products.search.BaseSearchBackend subclass;
+# use 'products.search.DatabaseSearchBackend' on databases without FTS5.
+PRODUCT_SEARCH = {
+    'BACKEND': 'products.search.SQLiteFTS5Backend',
+    'MAX_RESULTS': 1000,
+}
+
+# Caches. 'default' is per-process memory; 'catalog-file' is shared by all
+# processes on the host and survives restarts.
+CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+    },
+    'catalog-file': {
+        'BACKEND': 'django.core.cache.backends.filebased.FileBasedCache',
+        'LOCATION': BASE_DIR / '.cache' / 'catalog',
+    },
+}
+
+# Anonymous product list/detail responses, cached in CACHES[ALIAS] for at
+# most TIMEOUT seconds and invalidated through version counters kept in the
+# same cache. ALIAS must be shared by every web worker and management
+# command (file-based, Redis, Memcached, ...): a locmem cache only works for
+# a single process, as other processes never see its version bumps.
+PRODUCT_RESPONSE_CACHE = {
+    'ENABLED': True,
+    'ALIAS': 'catalog-file',
+    'TIMEOUT': 300,
+}
+
+# Facet counts on the product list (`?facets=...`). PRICE_BUCKETS are the
+# lower edges of the price ranges; results are cached for TIMEOUT seconds
+# per set of filters and catalog version.
+PRODUCT_FACETS = {
+    'PRICE_BUCKETS': (0, 50, 100, 250, 500, 1000),
+    'TIMEOUT': 300,
+}
+
+# Resized copies of product images, written next to the original in each of
+# FORMATS for every width in WIDTHS (never upscaled). Rendering runs in a
+# pool of WORKERS processes; set ASYNC to False to render inline.
+PRODUCT_IMAGE_VARIANTS = {
+    'WIDTHS': (320, 640, 1280),
+    'FORMATS': ('webp', 'jpeg'),
+    'QUALITY': 80,
+    'WORKERS': 2,
+    'ASYNC': True,
+}
+
+# Adding an item to a cart holds its stock for TTL seconds.
+# `manage.py release_expired_reservations --interval 60` gives expired holds
+# back, BATCH_SIZE at a time.
+CART_RESERVATIONS = {
+    'TTL': 15 * 60,
+    'BATCH_SIZE': 500,
+}
+
+# Trending products. Views and likes count VIEW_WEIGHT/LIKE_WEIGHT and lose
+# half their weight every HALF_LIFE seconds. `manage.py
+# update_trending_scores --interval 300` adds new events to the scores,
+# writing BATCH_SIZE products per UPDATE, and rescales them to a new epoch
+# every REBASE_AFTER seconds so the stored weights stay within float range.
+PRODUCT_TRENDING = {
+    'HALF_LIFE': 24 * 3600,
+    'VIEW_WEIGHT': 1.0,
+    'LIKE_WEIGHT': 5.0,
+    'TOP_N': 10,
+    'MAX_TOP_N': 50,
+    'REBASE_AFTER': 30 * 24 * 3600,
+    'BATCH_SIZE': 500,
+}
+
+# "Customers who liked this also liked". `manage.py update_recommendations
+# --interval 3600` counts new likes into co-occurrence pairs and keeps the
+# TOP_K neighbours of each touched product; only a user's MAX_USER_LIKES
+# most recent likes are paired.
+PRODUCT_RECOMMENDATIONS = {
+    'TOP_K': 20,
+    'BATCH_SIZE': 5000,
+    'MAX_USER_LIKES': 500,
+}
+
+# Product comments endpoint: top-level comments per page, and replies
+# inlined under each comment before clients fetch the rest.
+PRODUCT_COMMENTS = {
+    'PAGE_SIZE': 20,
+    'REPLY_PREVIEW': 3,
+}
@@ -1,3 +1,5 @@
+import time
+
 from rest_framework.test import APIClient
 from django.urls import reverse
 from django.contrib.auth import get_user_model
@@ -57,4 +59,49 @@ def discount_code(db):
 def discount_code_factory(db):
     def create_discount_code(**kwargs):
         return DiscountCode.objects.create(**kwargs)
-    return create_discount_code
\ No newline at end of file
+    return create_discount_code
+
+@pytest.fixture(autouse=True)
+def reset_view_tracking(monkeypatch):
+    from products.dedupe import get_view_deduplicator
+    from products.tracking import view_buffer
+    # Tests flush explicitly; a timed flush from another thread would race them.
+    monkeypatch.setattr(view_buffer, 'background', False)
+    yield
+    view_buffer.discard()
+    get_view_deduplicator().clear()
+
+
+@pytest.fixture(autouse=True)
+def clear_response_cache(settings):
+    from products.cache import get_cache
+    # Tests run in one process, so an in-memory cache is enough.
+    settings.PRODUCT_RESPONSE_CACHE = {'ALIAS': 'default'}
+    yield
+    get_cache().clear()
+
+
+@pytest.fixture
+def no_response_cache(settings):
+    settings.PRODUCT_RESPONSE_CACHE = {'ALIAS': 'default', 'ENABLED': False}
+
+
+@pytest.fixture
+def retry_locked():
+    """
+    Call `func(*args, **kwargs)`, retrying while the database is locked.
+
+    SQLite allows a single writer, so concurrent writers in the threaded
+    tests may find a table locked. Gives up after `attempts` tries.
+    """
+    from django.db import OperationalError
+
+    def call(func, *args, attempts=200, **kwargs):
+        for _ in range(attempts):
+            try:
+                return func(*args, **kwargs)
+            except OperationalError as error:
+                last_error = error
+                time.sleep(0.01)
+        pytest.fail(f'Database still locked after {attempts} attempts: {last_error}')
+    return call
@@ -183,8 +183,8 @@ class TestCartApi:
 
     def test_cart_viewset_create_and_update(self, api_client, user, product_factory):
         api_client.force_authenticate(user=user)
-        p1 = product_factory(title='one', price=10)
-        p2 = product_factory(title='two', price=20)
+        p1 = product_factory(title='one', price=10, quantity=5)
+        p2 = product_factory(title='two', price=20, quantity=5)
 
         resp = api_client.post(reverse('cart-list'), {"items": [{"product_id": p1.id, "quantity": 2}]}, format='json')
         assert resp.status_code == status.HTTP_201_CREATED
@@ -203,4 +203,105 @@ class TestCartApi:
         user = user_factory(mobile='09111111111')
         Cart.objects.create(user=user)
         with pytest.raises(IntegrityError):
-            Cart.objects.create(user=user)
\ No newline at end of file
+            Cart.objects.create(user=user)
+
+class TestStockReservations:
+    def test_cart_items_hold_stock(self, api_client, user, product_factory):
+        from products.models import Product
+
+        api_client.force_authenticate(user=user)
+        phone = product_factory(title='phone', price=10, quantity=3)
+
+        resp = api_client.post(reverse('cart-list'), {"items": [{"product_id": phone.id, "quantity": 4}]}, format='json')
+        assert resp.status_code == status.HTTP_400_BAD_REQUEST
+        assert 'Only 3 units' in str(resp.data['items'])
+        assert not Cart.objects.exists()
+
+        resp = api_client.post(reverse('cart-list'), {"items": [{"product_id": phone.id, "quantity": 2}]}, format='json')
+        assert resp.status_code == status.HTTP_201_CREATED
+        assert resp.data['items'][0]['reserved_until']
+        phone.refresh_from_db()
+        assert (phone.reserved_quantity, phone.available_quantity) == (2, 1)
+
+        # replacing the items releases the old hold before taking the new one
+        resp = api_client.put(reverse('cart-detail', kwargs={'pk': resp.data['id']}),
+                              {"items": [{"product_id": phone.id, "quantity": 3}]}, format='json')
+        assert resp.status_code == status.HTTP_200_OK
+        assert Product.objects.get(pk=phone.pk).reserved_quantity == 3
+
+        Cart.objects.get(pk=resp.data['id']).delete()
+        assert Product.objects.get(pk=phone.pk).reserved_quantity == 0
+
+    def test_sweeper_releases_expired_holds(self, cart, product_factory):
+        from io import StringIO
+        from django.core.management import call_command
+        from carts.models import StockReservation
+        from carts.reservations import reserve
+        from products.models import Product
+
+        phone = product_factory(title='phone', price=10, quantity=5)
+        item = CartItem.objects.create(cart=cart, product=phone, quantity=2)
+        reserve(item)
+        reserve(item, 4)
+        assert Product.objects.get(pk=phone.pk).reserved_quantity == 4
+
+        StockReservation.objects.update(expires_at=timezone.now() - timedelta(seconds=1))
+        stdout = StringIO()
+        call_command('release_expired_reservations', stdout=stdout)
+        assert 'Released 1 expired reservations' in stdout.getvalue()
+        assert Product.objects.get(pk=phone.pk).reserved_quantity == 0
+        assert not StockReservation.objects.exists()
+
+        # the item stays in the cart and can hold stock again
+        reserve(item)
+        item.delete()
+        assert Product.objects.get(pk=phone.pk).reserved_quantity == 0
+
+
+@pytest.mark.django_db(transaction=True)
+def test_concurrent_reservations_never_oversell(product_factory, user_factory, retry_locked):
+    from concurrent.futures import ThreadPoolExecutor
+    from django.db import connection
+    from carts.reservations import reserve
+    from products.models import Product
+
+    phone = product_factory(title='phone', price=10, quantity=10)
+    items = [
+        CartItem.objects.create(cart=Cart.objects.create(user=user_factory(mobile=f'0913000{i:04d}')), product=phone)
+        for i in range(25)
+    ]
+
+    def hold(item):
+        try:
+            retry_locked(reserve, item)
+            return True
+        except ValidationError:
+            return False
+        finally:
+            connection.close()
+
+    with ThreadPoolExecutor(max_workers=8) as pool:
+        results = list(pool.map(hold, items))
+
+    assert results.count(True) == 10
+    assert Product.objects.get(pk=phone.pk).reserved_quantity == 10
+
+
+@pytest.mark.django_db
+def test_stale_reservation_is_not_applied(product_factory, cart):
+    from carts.models import StockReservation
+    from carts.reservations import _apply_reservation, reserve
+    from products.models import Product
+
+    phone = product_factory(title='phone', price=10, quantity=100)
+    item = CartItem.objects.create(cart=cart, product=phone)
+    reserve(item, 2)
+    stale = StockReservation.objects.get(item=item)
+    # another request changes the hold between the read and the write
+    reserve(item, 5)
+
+    assert _apply_reservation(item, stale, 3) is False
+    assert _apply_reservation(item, None, 3) is False
+    assert _apply_reservation(item, stale, 0) is False
+    assert Product.objects.get(pk=phone.pk).reserved_quantity == 5
+    assert StockReservation.objects.get(item=item).quantity == 5
@@ -1,9 +1,12 @@
+import json
+
 from rest_framework.test import APIClient
 from rest_framework import status
 from django.core.exceptions import ValidationError
 from django.urls import reverse
 import pytest
 
+from products.counters import get_counts
 from products.models import (
     Attribute, AttributeValue, ProductAttributeValue, ProductComment,
     ProductInventory, Product
@@ -97,6 +100,1660 @@ class TestProductApi:
         assert product.quantity == 2
         assert inventory_minus_1 in product.inventory_logs.all()
         assert inventory_plus_3 in product.inventory_logs.all()
+
+    def test_inventory_is_checked_at_write_time(self, product):
+        ProductInventory.objects.create(product=product, change=2)
+        stale = Product.objects.get(pk=product.pk)
+        ProductInventory.objects.create(product=product, change=-2)
+
+        # clean() still sees the stale quantity; the UPDATE does not
+        with pytest.raises(ValidationError):
+            ProductInventory.objects.create(product=stale, change=-1)
+        product.refresh_from_db()
+        assert product.quantity == 0
+        assert product.inventory_logs.count() == 2
+
+    def test_inventory_compaction(self, product):
+        from django.utils import timezone
+        from django.utils.timezone import timedelta
+        from products.inventory import compact_inventory, ledger_balance
+
+        for change in (5, -2, 4):
+            ProductInventory.objects.create(product=product, change=change)
+        ProductInventory.objects.update(created_at=timezone.now() - timedelta(days=60))
+        latest = ProductInventory.objects.create(product=product, change=-1)
+
+        assert compact_inventory(timezone.now() - timedelta(days=30)) == (1, 3)
+        assert compact_inventory(timezone.now() - timedelta(days=30)) == (0, 0)
+        assert list(product.inventory_logs.all()) == [latest]
+        assert (product.inventory_snapshot.change, product.inventory_snapshot.entries) == (7, 3)
+        product.refresh_from_db()
+        assert ledger_balance(product.pk) == product.quantity == 6
         
         
-        
\ No newline at end of file
+        
+
+@pytest.mark.django_db
+@pytest.mark.usefixtures('no_response_cache')
+class TestCommentTree:
+    def _count_queries(self, client, url):
+        from django.db import connection
+        from django.test.utils import CaptureQueriesContext
+
+        with CaptureQueriesContext(connection) as ctx:
+            res = client.get(url)
+        assert res.status_code == status.HTTP_200_OK
+        return len(ctx.captured_queries), res
+
+    def test_nested_replies_are_serialized(self, api_client, user, product):
+        root = ProductComment.objects.create(user=user, product=product, text='root')
+        child = ProductComment.objects.create(user=user, product=product, text='child', reply=root)
+        ProductComment.objects.create(user=user, product=product, text='grandchild', reply=child)
+        ProductComment.objects.create(user=user, product=product, text='hidden', reply=root, is_delete=True)
+
+        res = api_client.get(reverse('product-detail', kwargs={'pk': product.id}), {'expand': 'comments'})
+        comments = res.data['comments']
+        assert [c['text'] for c in comments] == ['root']
+        assert [c['text'] for c in comments[0]['replies']] == ['child']
+        assert comments[0]['replies'][0]['replies'][0]['text'] == 'grandchild'
+
+    def test_query_count_independent_of_thread_shape(self, api_client, user, product_factory):
+        products = [product_factory(title=f'p{i}', price=10) for i in range(3)]
+        for product in products:
+            ProductComment.objects.create(user=user, product=product, text='root')
+
+        detail_url = reverse('product-detail', kwargs={'pk': products[0].id}) + '?expand=comments'
+        list_url = reverse('product-list')
+        api_client.get(detail_url)  # record the view so later requests are repeat visits
+        shallow_detail, _ = self._count_queries(api_client, detail_url)
+        shallow_list, _ = self._count_queries(api_client, list_url)
+
+        for product in products:
+            parent = product.comments.first()
+            for depth in range(6):
+                for width in range(4):
+                    reply = ProductComment.objects.create(
+                        user=user, product=product, text=f'{depth}-{width}', reply=parent
+                    )
+                parent = reply
+
+        deep_detail, _ = self._count_queries(api_client, detail_url)
+        deep_list, res = self._count_queries(api_client, list_url)
+        assert deep_detail == shallow_detail
+        assert deep_list == shallow_list
+        assert 'comments' not in res.data['results'][0]
+        _, res = self._count_queries(api_client, f'{list_url}?expand=comments')
+        assert len(res.data['results'][0]['comments'][0]['replies']) == 4
+
+
+@pytest.mark.django_db
+class TestRatingStats:
+    def test_stats_follow_comment_changes(self, user, product):
+        c1 = ProductComment.objects.create(user=user, product=product, text='a', rate=5)
+        c2 = ProductComment.objects.create(user=user, product=product, text='b', rate=2)
+        product.refresh_from_db()
+        assert (product.rating_count, product.rating_sum) == (2, 7)
+        assert product.average_rating == 3.5
+        assert product.rating_histogram == {1: 0, 2: 1, 3: 0, 4: 0, 5: 1}
+
+        c2.rate = 4
+        c2.save()
+        c1.is_active = False
+        c1.save()
+        product.refresh_from_db()
+        assert (product.rating_count, product.rating_sum) == (1, 4)
+
+        c2.is_delete = True
+        c2.save()
+        product.refresh_from_db()
+        assert product.rating_count == 0
+        assert product.average_rating == 0
+
+    def test_rebuild_command(self, user, product):
+        from io import StringIO
+        from django.core.management import call_command
+
+        ProductComment.objects.create(user=user, product=product, text='a', rate=3)
+        # QuerySet.update() bypasses signals, leaving the stats stale
+        ProductComment.objects.update(rate=1)
+        modified_at = Product.objects.get(pk=product.pk).modified_at
+        call_command('rebuild_rating_stats', stdout=StringIO())
+        product.refresh_from_db()
+        assert product.rating_sum == 1
+        assert product.rating_1_count == 1
+        # The version stamp moves with the ratings, so cached copies revalidate.
+        assert product.modified_at > modified_at
+
+        call_command('rebuild_rating_stats', stdout=StringIO())
+        assert Product.objects.get(pk=product.pk).modified_at == product.modified_at
+
+    def test_list_sort_and_filter_by_rating(self, api_client, user, product_factory):
+        low = product_factory(title='low', price=10)
+        high = product_factory(title='high', price=10)
+        ProductComment.objects.create(user=user, product=low, text='meh', rate=2)
+        ProductComment.objects.create(user=user, product=high, text='wow', rate=5)
+
+        url = reverse('product-list')
+        res = api_client.get(url, {'ordering': '-rating_average'})
+        assert [p['title'] for p in res.data['results']] == ['high', 'low']
+
+        res = api_client.get(url, {'min_rating': 4})
+        assert [p['title'] for p in res.data['results']] == ['high']
+
+
+@pytest.mark.django_db
+@pytest.mark.usefixtures('no_response_cache')
+class TestViewBuffer:
+    def test_detail_view_is_buffered(self, api_client, product):
+        from products.models import ProductView
+        from products.tracking import view_buffer
+
+        url = reverse('product-detail', kwargs={'pk': product.id})
+        assert api_client.get(url).data['view_count'] == 1
+        api_client.get(url)
+        # pending, and not queued twice
+        assert len(view_buffer) == 1
+        assert not ProductView.objects.exists()
+
+        assert view_buffer.flush() == 1
+        assert get_counts(product.id)['view_count'] == 1
+        assert ProductView.objects.filter(product=product).count() == 1
+
+    def test_flush_on_batch_size(self, product_factory):
+        from products.models import ProductView
+        from products.tracking import ViewBuffer
+
+        p1 = product_factory(title='a', price=1)
+        p2 = product_factory(title='b', price=1)
+        buffer = ViewBuffer(batch_size=3, flush_interval=3600)
+        buffer.add(p1.id, None, '10.0.0.1')
+        buffer.add(p1.id, None, '10.0.0.2')
+        assert not ProductView.objects.exists()
+        buffer.add(p2.id, None, '10.0.0.1')
+
+        assert len(buffer) == 0
+        assert ProductView.objects.count() == 3
+        assert get_counts(p1.id)['view_count'] == 2
+        assert get_counts(p2.id)['view_count'] == 1
+
+    @pytest.mark.django_db(transaction=True)
+    def test_flush_on_timer(self, product):
+        import time
+        from products.models import ProductView
+        from products.tracking import ViewBuffer
+
+        buffer = ViewBuffer(batch_size=10, flush_interval=0.05)
+        buffer.add(product.id, None, '10.0.0.1')
+        deadline = time.monotonic() + 10
+        while len(buffer) and time.monotonic() < deadline:
+            time.sleep(0.01)
+        # no further add() was needed to flush; wait for the write to finish
+        assert len(buffer) == 0
+        with buffer._flush_lock:
+            pass
+        assert ProductView.objects.filter(product=product).count() == 1
+
+    def test_unbuffered_mode(self, api_client, product, settings):
+        settings.PRODUCT_VIEW_BUFFER = {'ENABLED': False}
+        api_client.get(reverse('product-detail', kwargs={'pk': product.id}))
+        assert get_counts(product.id)['view_count'] == 1
+
+
+class TestViewDedupe:
+    def test_rotating_bloom_filter(self):
+        from products.dedupe import RotatingBloomFilter
+
+        bloom = RotatingBloomFilter(memory_bytes=4096, false_positive_rate=0.01)
+        assert bloom.memory_bytes <= 4096
+        items = [f'seen-{i}' for i in range(bloom.capacity)]
+        for item in items:
+            bloom.add(item)
+        assert all(item in bloom for item in items)
+        false_positives = sum(f'other-{i}' in bloom for i in range(10000))
+        assert false_positives / 10000 < 0.02
+
+        # Filling another generation forgets the oldest one
+        for i in range(bloom.capacity * 2):
+            bloom.add(f'new-{i}')
+        assert sum(item in bloom for item in items) < len(items) // 10
+
+    @pytest.mark.django_db
+    @pytest.mark.usefixtures('no_response_cache')
+    def test_repeat_visitor_skips_database(self, api_client, product, settings, django_assert_num_queries):
+        from products.tracking import view_buffer
+
+        settings.PRODUCT_VIEW_DEDUPE = {'MODE': 'bloom', 'MAX_MEMORY': 1024}
+        url = reverse('product-detail', kwargs={'pk': product.id})
+        api_client.get(url)
+        view_buffer.flush()
+
+        # version stamp, product, tags and comments only; no ProductView query
+        with django_assert_num_queries(4):
+            api_client.get(url)
+
+    @pytest.mark.django_db
+    @pytest.mark.parametrize('mode', ['exact', 'bloom'])
+    def test_views_keyed_by_user_or_ip(self, api_client, user, product, settings, mode):
+        settings.PRODUCT_VIEW_DEDUPE = {'MODE': mode}
+        settings.PRODUCT_VIEW_BUFFER = {'ENABLED': False}
+        url = reverse('product-detail', kwargs={'pk': product.id})
+
+        api_client.get(url, REMOTE_ADDR='10.0.0.1')
+        api_client.get(url, REMOTE_ADDR='10.0.0.2')
+        api_client.get(url, REMOTE_ADDR='10.0.0.1')
+        api_client.force_authenticate(user=user)
+        api_client.get(url, REMOTE_ADDR='10.0.0.3')
+        api_client.get(url, REMOTE_ADDR='10.0.0.4')
+
+        assert get_counts(product.id)['view_count'] == 3
+
+
+@pytest.mark.django_db
+class TestLikeCounters:
+    def test_explicit_like_is_idempotent(self, api_client, user, product):
+        url = reverse('product-like', kwargs={'pk': product.id})
+        api_client.force_authenticate(user=user)
+
+        for _ in range(3):
+            res = api_client.post(url, {'liked': True}, format='json')
+            assert res.data['liked'] is True
+            assert res.data['like_count'] == 1
+        res = api_client.post(url, {'liked': False}, format='json')
+        res = api_client.post(url, {'liked': False}, format='json')
+        assert res.data['liked'] is False
+        assert res.data['like_count'] == 0
+
+    def test_rollup_moves_shards_into_product(self, product, settings):
+        from products.counters import increment, rollup_counters
+        from products.models import ProductCounterShard
+
+        settings.PRODUCT_COUNTERS = {'SHARDS': 4}
+        for _ in range(20):
+            increment(product.id, 'like_count')
+        increment(product.id, 'view_count', 7)
+        assert ProductCounterShard.objects.filter(product=product).count() > 1
+
+        assert rollup_counters() == 1
+        product.refresh_from_db()
+        assert (product.like_count, product.view_count) == (20, 7)
+        assert get_counts(product.id) == {'like_count': 20, 'view_count': 7}
+
+
+@pytest.mark.django_db(transaction=True)
+def test_concurrent_like_toggles_are_exact(product, user_factory, retry_locked):
+    from concurrent.futures import ThreadPoolExecutor
+    from django.db import connection
+    from products.counters import rollup_counters
+    from products.likes import set_like
+    from products.models import ProductLike
+
+    users = [user_factory(mobile=f'0912000{i:04d}') for i in range(20)]
+    toggles_per_user = 5
+
+    def toggle_many(user):
+        try:
+            for _ in range(toggles_per_user):
+                retry_locked(set_like, product, user)
+        finally:
+            connection.close()
+
+    with ThreadPoolExecutor(max_workers=8) as pool:
+        list(pool.map(toggle_many, users))
+
+    # An odd number of toggles leaves every user liking the product
+    liked = ProductLike.objects.filter(product=product).count()
+    assert liked == len(users)
+    rollup_counters()
+    product.refresh_from_db()
+    assert product.like_count == liked
+
+
+@pytest.mark.django_db
+class TestLikedByMe:
+    def test_liked_by_me_on_list_page(self, api_client, user, product_factory):
+        from django.db import connection
+        from django.test.utils import CaptureQueriesContext
+        from products.likes import like_product
+
+        products = [product_factory(title=f'p{i}', price=10) for i in range(4)]
+        like_product(products[1], user)
+        like_product(products[3], user)
+        api_client.force_authenticate(user=user)
+        url = reverse('product-list')
+
+        res = api_client.get(url)
+        assert 'liked_by_me' not in res.data['results'][0]
+
+        with CaptureQueriesContext(connection) as ctx:
+            res = api_client.get(url, {'expand': 'liked_by_me'})
+        like_queries = [q for q in ctx.captured_queries if 'products_productlike' in q['sql']]
+        assert len(like_queries) == 1
+        liked = {p['title']: p['liked_by_me'] for p in res.data['results']}
+        assert liked == {'p0': False, 'p1': True, 'p2': False, 'p3': True}
+
+    def test_liked_by_me_for_anonymous(self, api_client, product):
+        res = api_client.get(reverse('product-detail', kwargs={'pk': product.id}), {'expand': 'liked_by_me'})
+        assert res.data['liked_by_me'] is False
+
+    def test_liked_product_ids(self, api_client, user, product_factory):
+        from products.likes import like_product
+
+        p1 = product_factory(title='a', price=1)
+        p2 = product_factory(title='b', price=1)
+        product_factory(title='c', price=1)
+        like_product(p1, user)
+        like_product(p2, user)
+        api_client.force_authenticate(user=user)
+
+        res = api_client.get(reverse('liked-product-ids'))
+        assert res.status_code == status.HTTP_200_OK
+        assert sorted(res.data['ids']) == sorted([p1.id, p2.id])
+
+
+@pytest.mark.django_db
+class TestProductSearch:
+    def _titles(self, api_client, **params):
+        res = api_client.get(reverse('product-list'), params)
+        assert res.status_code == status.HTTP_200_OK
+        return [p['title'] for p in res.data['results']]
+
+    def test_ranked_and_prefix_search(self, api_client, product_factory):
+        product_factory(title='Phone case', description='Fits the wireless headphones box', price=5)
+        product_factory(title='Wireless Headphones', description='Noise cancelling', price=50)
+        product_factory(title='Desk lamp', description='Warm light', price=20)
+
+        assert self._titles(api_client, search='wireless headphones') == ['Wireless Headphones', 'Phone case']
+        assert self._titles(api_client, search='headph') == ['Wireless Headphones', 'Phone case']
+        assert self._titles(api_client, search='lamp', ordering='price') == ['Desk lamp']
+        assert self._titles(api_client, search='"); DROP') == []
+
+    def test_truncated_flag(self, api_client, product_factory, settings, no_response_cache):
+        product_factory(title='Red kettle', price=5)
+        product_factory(title='Blue kettle', price=6)
+        url = reverse('product-list')
+
+        res = api_client.get(url, {'search': 'kettle'})
+        assert res.data['count'] == 2 and res.data['truncated'] is False
+        assert 'truncated' not in api_client.get(url).data
+
+        settings.PRODUCT_SEARCH = {'MAX_RESULTS': 1}
+        res = api_client.get(url, {'search': 'kettle'})
+        assert res.data['count'] == 1 and res.data['truncated'] is True
+
+    def test_index_follows_saves_and_deletes(self, api_client, product_factory):
+        product = product_factory(title='Old name', description='', price=5)
+        product.title = 'Shiny kettle'
+        product.save()
+        assert self._titles(api_client, search='kettle') == ['Shiny kettle']
+        assert self._titles(api_client, search='old') == []
+
+        product.is_active = False
+        product.save()
+        assert self._titles(api_client, search='kettle') == []
+
+        product.is_active = True
+        product.save()
+        product.delete()
+        assert self._titles(api_client, search='kettle') == []
+
+    def test_rebuild_command(self, api_client, product_factory):
+        from io import StringIO
+        from django.core.management import call_command
+        from products.search import get_search_backend
+
+        product_factory(title='Garden hose', description='', price=5)
+        get_search_backend().remove(Product.objects.values_list('pk', flat=True))
+        assert self._titles(api_client, search='hose') == []
+
+        call_command('rebuild_search_index', stdout=StringIO())
+        assert self._titles(api_client, search='hose') == ['Garden hose']
+
+
+@pytest.mark.django_db
+class TestCursorPagination:
+    def _walk(self, api_client, url, params, link='next'):
+        pages = []
+        res = api_client.get(url, params)
+        while True:
+            assert res.status_code == status.HTTP_200_OK
+            assert 'count' not in res.data
+            pages.append([p['id'] for p in res.data['results']])
+            if not res.data[link]:
+                return pages, res
+            res = api_client.get(res.data[link])
+
+    def test_walk_pages_with_ties(self, api_client, product_factory):
+        # Many equal prices: the pk tiebreaker must keep boundaries stable
+        products = [product_factory(title=f'p{i}', price=10 + i % 3) for i in range(25)]
+        expected = [p.id for p in sorted(products, key=lambda p: (-p.price, -p.id))]
+
+        pages, last = self._walk(
+            api_client, reverse('product-list'), {'pagination': 'cursor', 'ordering': '-price'}
+        )
+        assert [len(page) for page in pages] == [10, 10, 5]
+        assert sum(pages, []) == expected
+
+        back, _ = self._walk(api_client, last.data['previous'], {}, link='previous')
+        assert sum(reversed(back), []) == expected[:20]
+
+    def test_default_ordering_and_query_count(self, api_client, product_factory):
+        from django.db import connection
+        from django.test.utils import CaptureQueriesContext
+
+        for i in range(30):
+            product_factory(title=f'p{i}', price=5)
+        url = reverse('product-list')
+
+        with CaptureQueriesContext(connection) as first:
+            res = api_client.get(url, {'pagination': 'cursor'})
+        ids = [p['id'] for p in res.data['results']]
+        assert ids == sorted(ids, reverse=True)
+        third_url = api_client.get(res.data['next']).data['next']
+        with CaptureQueriesContext(connection) as third:
+            res = api_client.get(third_url)
+        assert len(res.data['results']) == 10
+        assert len(first.captured_queries) == len(third.captured_queries)
+        assert not any('COUNT(' in q['sql'] or 'OFFSET' in q['sql'] for q in third.captured_queries)
+
+    def test_invalid_cursor(self, api_client):
+        res = api_client.get(reverse('product-list'), {'cursor': 'not-a-cursor'})
+        assert res.status_code == status.HTTP_404_NOT_FOUND
+
+
+@pytest.fixture(params=['locmem', 'file'])
+def response_cache(request, settings, tmp_path):
+    if request.param == 'file':
+        settings.CACHES = {
+            **settings.CACHES,
+            'catalog-file': {
+                'BACKEND': 'django.core.cache.backends.filebased.FileBasedCache',
+                'LOCATION': str(tmp_path),
+            },
+        }
+        settings.PRODUCT_RESPONSE_CACHE = {'ALIAS': 'catalog-file'}
+    return request.param
+
+
+@pytest.mark.django_db
+@pytest.mark.usefixtures('response_cache')
+class TestResponseCache:
+    def test_list_hit_and_query_normalization(self, api_client, product):
+        url = reverse('product-list')
+        assert api_client.get(url, {'ordering': 'price', 'page': 1})['X-Cache'] == 'MISS'
+        res = api_client.get(f'{url}?page=1&ordering=price')
+        assert res['X-Cache'] == 'HIT'
+        assert res.data['results'][0]['title'] == product.title
+
+    def test_invalidation(self, api_client, user, product):
+        from products.models import ProductCategory
+
+        list_url = reverse('product-list')
+        detail_url = reverse('product-detail', kwargs={'pk': product.id})
+        api_client.get(list_url)
+        api_client.get(detail_url)
+
+        ProductComment.objects.create(user=user, product=product, text='new comment')
+        res = api_client.get(detail_url)
+        assert res['X-Cache'] == 'MISS'
+        assert res.data['comment_summary']['count'] == 1
+        assert api_client.get(list_url)['X-Cache'] == 'MISS'
+
+        ProductCategory.objects.create(title='Toys')
+        assert api_client.get(list_url)['X-Cache'] == 'MISS'
+        assert api_client.get(detail_url)['X-Cache'] == 'HIT'
+
+        product.title = 'Renamed'
+        product.save()
+        assert api_client.get(detail_url).data['title'] == 'Renamed'
+
+    def test_cached_detail_still_records_views(self, api_client, product):
+        from products.tracking import view_buffer
+
+        url = reverse('product-detail', kwargs={'pk': product.id})
+        api_client.get(url, REMOTE_ADDR='10.0.0.1')
+        assert api_client.get(url, REMOTE_ADDR='10.0.0.2')['X-Cache'] == 'HIT'
+        view_buffer.flush()
+        assert get_counts(product.id)['view_count'] == 2
+
+    def test_authenticated_requests_bypass_cache(self, api_client, user, product):
+        api_client.force_authenticate(user=user)
+        api_client.get(reverse('product-list'))
+        assert 'X-Cache' not in api_client.get(reverse('product-list'))
+
+    def test_stats_endpoint(self, api_client, user_factory, product):
+        url = reverse('product-list')
+        api_client.get(url)
+        api_client.get(url)
+        api_client.get(url)
+
+        admin = user_factory(mobile='09000000001', is_staff=True)
+        api_client.force_authenticate(user=admin)
+        res = api_client.get(reverse('product-cache-stats'))
+        assert res.data == {'hits': 2, 'misses': 1, 'hit_rate': 0.6667}
+
+
+@pytest.mark.django_db
+class TestConditionalGet:
+    def test_detail_not_modified_without_serialization(self, api_client, user, product, django_assert_num_queries):
+        url = reverse('product-detail', kwargs={'pk': product.id})
+        api_client.get(url)
+        res = api_client.get(url)
+        etag = res['ETag']
+        assert res['Last-Modified']
+
+        # The version stamp lookup only: no product, comments or tags queries
+        with django_assert_num_queries(1):
+            res = api_client.get(url, HTTP_IF_NONE_MATCH=etag)
+        assert res.status_code == status.HTTP_304_NOT_MODIFIED
+        assert res['ETag'] == etag
+
+        ProductComment.objects.create(user=user, product=product, text='changes the stamp')
+        res = api_client.get(url, HTTP_IF_NONE_MATCH=etag)
+        assert res.status_code == status.HTTP_200_OK
+        assert res['ETag'] != etag
+
+    def test_etag_varies_with_representation(self, api_client, product):
+        url = reverse('product-detail', kwargs={'pk': product.id})
+        api_client.get(url)
+        plain = api_client.get(url)['ETag']
+        expanded = api_client.get(url, {'expand': 'liked_by_me'})['ETag']
+        assert plain != expanded
+
+    def test_list_not_modified(self, api_client, product_factory, no_response_cache):
+        product_factory(title='a', price=1)
+        url = reverse('product-list')
+        etag = api_client.get(url)['ETag']
+
+        res = api_client.get(url, HTTP_IF_NONE_MATCH=etag)
+        assert res.status_code == status.HTTP_304_NOT_MODIFIED
+
+        product_factory(title='b', price=1)
+        assert api_client.get(url, HTTP_IF_NONE_MATCH=etag).status_code == status.HTTP_200_OK
+
+    def test_like_invalidates_liked_by_me(self, api_client, user, product, django_capture_on_commit_callbacks, no_response_cache):
+        from products.likes import like_product
+
+        api_client.force_authenticate(user=user)
+        urls = [
+            reverse('product-detail', kwargs={'pk': product.id}),
+            reverse('product-list'),
+        ]
+        etags = [api_client.get(url, {'expand': 'liked_by_me'})['ETag'] for url in urls]
+        with django_capture_on_commit_callbacks(execute=True):
+            like_product(product, user)
+
+        detail = api_client.get(urls[0], {'expand': 'liked_by_me'}, HTTP_IF_NONE_MATCH=etags[0])
+        assert detail.status_code == status.HTTP_200_OK
+        assert detail.data['liked_by_me'] is True
+        listing = api_client.get(urls[1], {'expand': 'liked_by_me'}, HTTP_IF_NONE_MATCH=etags[1])
+        assert listing.status_code == status.HTTP_200_OK
+        assert listing.data['results'][0]['liked_by_me'] is True
+
+    def test_list_has_no_last_modified(self, api_client, product, no_response_cache):
+        res = api_client.get(reverse('product-list'))
+        assert res['ETag']
+        assert 'Last-Modified' not in res
+
+    def test_cached_list_answers_conditional_requests(self, api_client, product):
+        url = reverse('product-list')
+        etag = api_client.get(url)['ETag']
+        res = api_client.get(url, HTTP_IF_NONE_MATCH=etag)
+        assert res.status_code == status.HTTP_304_NOT_MODIFIED
+
+
+@pytest.mark.django_db
+class TestCategoryTree:
+    @pytest.fixture
+    def categories(self):
+        from products.models import ProductCategory
+
+        electronics = ProductCategory.objects.create(title='Electronics')
+        phones = ProductCategory.objects.create(title='Phones', parnt=electronics)
+        android = ProductCategory.objects.create(title='Android', parnt=phones)
+        toys = ProductCategory.objects.create(title='Toys')
+        return electronics, phones, android, toys
+
+    def test_paths_follow_moves(self, categories):
+        from io import StringIO
+        from django.core.management import call_command
+        from products.models import ProductCategory
+
+        electronics, phones, android, toys = categories
+        assert android.path == electronics.path + phones.path_segment(phones.pk) + android.path_segment(android.pk)
+
+        phones.parnt = toys
+        phones.save()
+        android.refresh_from_db()
+        assert android.path.startswith(toys.path + phones.path_segment(phones.pk))
+
+        electronics.parnt = android
+        electronics.save()
+        toys.parnt = android
+        with pytest.raises(ValidationError):
+            toys.save()
+
+        ProductCategory.objects.update(path='')
+        call_command('rebuild_category_paths', stdout=StringIO())
+        android.refresh_from_db()
+        assert android.path == toys.path + phones.path_segment(phones.pk) + android.path_segment(android.pk)
+
+    def test_filter_includes_subcategories(self, api_client, categories, product_factory):
+        electronics, phones, android, toys = categories
+        product_factory(title='Tablet', price=1, category=electronics)
+        product_factory(title='Pixel', price=1, category=android)
+        product_factory(title='Robot', price=1, category=toys)
+
+        url = reverse('product-list')
+        res = api_client.get(url, {'category': electronics.slug})
+        assert {row['title'] for row in res.data['results']} == {'Tablet', 'Pixel'}
+
+        res = api_client.get(url, {'category': phones.pk})
+        assert [row['title'] for row in res.data['results']] == ['Pixel']
+        assert api_client.get(url, {'category': 'missing'}).data['results'] == []
+        for value in ('²', str(2 ** 64)):
+            res = api_client.get(url, {'category': value})
+            assert res.status_code == status.HTTP_200_OK and res.data['results'] == []
+
+    def test_tree_endpoint_is_cached(self, api_client, categories, django_assert_num_queries):
+        from products.models import ProductCategory
+
+        url = reverse('category-tree')
+        res = api_client.get(url)
+        assert [node['title'] for node in res.data] == ['Electronics', 'Toys']
+        assert res.data[0]['children'][0]['children'][0]['title'] == 'Android'
+
+        with django_assert_num_queries(0):
+            cached = api_client.get(url, HTTP_IF_NONE_MATCH=res['ETag'])
+        assert cached.status_code == status.HTTP_304_NOT_MODIFIED
+
+        ProductCategory.objects.create(title='Books')
+        assert [node['title'] for node in api_client.get(url).data] == ['Books', 'Electronics', 'Toys']
+
+
+@pytest.mark.django_db
+class TestFacets:
+    @pytest.fixture
+    def catalog(self, product_factory):
+        from products.models import ProductCategory, ProductTag
+
+        phones = ProductCategory.objects.create(title='Phones')
+        toys = ProductCategory.objects.create(title='Toys')
+        sale = ProductTag.objects.create(title='Sale')
+        color = Attribute.objects.create(title='Color', slug='color')
+        red = AttributeValue.objects.create(attribute=color, value='Red')
+
+        cheap_phone = product_factory(title='Cheap phone', description='phone', price=20, category=phones)
+        product_factory(title='Good phone', description='phone', price=300, category=phones)
+        robot = product_factory(title='Robot', description='toy', price=75, category=toys)
+        cheap_phone.tags.add(sale)
+        robot.tags.add(sale)
+        ProductAttributeValue.objects.create(product=robot, attribute_value=red)
+        return phones, toys
+
+    @pytest.fixture(autouse=True)
+    def one_per_page(self, monkeypatch):
+        from products.pagination import ProductPagination
+        monkeypatch.setattr(ProductPagination, 'page_size', 1)
+
+    def test_counts_cover_all_matches(self, api_client, catalog, settings, django_assert_num_queries):
+        settings.PRODUCT_FACETS = {'PRICE_BUCKETS': (0, 50, 100)}
+        phones, toys = catalog
+
+        api_client.get(reverse('product-list'))
+        # count, page, its tags, then one query per facet
+        with django_assert_num_queries(7):
+            res = api_client.get(reverse('product-list'), {'facets': 'all', 'page': 2})
+        facets = res.data['facets']
+        assert len(res.data['results']) == 1
+        assert [(row['slug'], row['count']) for row in facets['category']] == [('phones', 2), ('toys', 1)]
+        assert [(row['slug'], row['count']) for row in facets['tag']] == [('sale', 2)]
+        assert facets['attribute'] == {'color': [{'id': facets['attribute']['color'][0]['id'], 'value': 'Red', 'count': 1}]}
+        assert [row['count'] for row in facets['price']] == [1, 1, 1]
+
+        res = api_client.get(reverse('product-list'), {'facets': 'category', 'search': 'phone'})
+        assert list(res.data['facets']) == ['category']
+        assert [(row['slug'], row['count']) for row in res.data['facets']['category']] == [('phones', 2)]
+
+    def test_facets_cached_per_filters(self, api_client, user, catalog, django_assert_num_queries):
+        api_client.force_authenticate(user=user)
+        url = reverse('product-list')
+        res = api_client.get(url, {'facets': 'price', 'ordering': 'price'})
+        assert res.data['facets']['price'][-1]['count'] == 0
+
+        # another ordering shares the entry: count, page and its tags only
+        with django_assert_num_queries(3):
+            api_client.get(url, {'facets': 'price', 'ordering': '-price'})
+
+        Product.objects.create(title='Lego', price=5000)
+        assert api_client.get(url, {'facets': 'price'}).data['facets']['price'][-1]['count'] == 1
+
+
+@pytest.mark.django_db
+class TestAttributeFilter:
+    @pytest.fixture
+    def values(self):
+        color = Attribute.objects.create(title='Color', slug='color')
+        size = Attribute.objects.create(title='Size', slug='size')
+        return {
+            'red': AttributeValue.objects.create(attribute=color, value='Red'),
+            'blue': AttributeValue.objects.create(attribute=color, value='Blue'),
+            'm': AttributeValue.objects.create(attribute=size, value='M'),
+            'l': AttributeValue.objects.create(attribute=size, value='L'),
+        }
+
+    def titles(self, api_client, *terms):
+        res = api_client.get(reverse('product-list'), {'attribute': list(terms), 'ordering': 'price'})
+        return [row['title'] for row in res.data['results']]
+
+    def test_and_or_filters(self, api_client, values, product_factory, no_response_cache, django_assert_num_queries):
+        for title, price, options in [('Red M', 1, 'red m'), ('Blue M', 2, 'blue m'), ('Red L', 3, 'red l')]:
+            product = product_factory(title=title, price=price)
+            for option in options.split():
+                ProductAttributeValue.objects.create(product=product, attribute_value=values[option])
+
+        assert self.titles(api_client, 'color:red') == ['Red M', 'Red L']
+        assert self.titles(api_client, 'color:red,BLUE', 'size:m') == ['Red M', 'Blue M']
+        assert self.titles(api_client, 'color:red', 'size:xl') == []
+        assert self.titles(api_client, 'weight:1') == []
+
+        from products.attributes import AttributeFilter, match_products
+        from rest_framework.request import Request
+        from rest_framework.test import APIRequestFactory
+        request = Request(APIRequestFactory().get('/', {'attribute': 'size:xl'}))
+        # an unknown value is resolved once and ends the lookup
+        with django_assert_num_queries(1):
+            assert AttributeFilter().filter_queryset(request, Product.objects.all(), None).query.is_empty()
+
+        blue_m = Product.objects.get(title='Blue M')
+        # posting lists are cached: only the values are resolved
+        with django_assert_num_queries(1):
+            assert match_products({'color': {'blue'}, 'size': {'m'}}) == {blue_m.pk}
+
+    def test_large_match_uses_subqueries(self, api_client, values, product_factory, no_response_cache, monkeypatch):
+        for title, price, options in [('Red M', 1, 'red m'), ('Blue M', 2, 'blue m'), ('Red L', 3, 'red l')]:
+            product = product_factory(title=title, price=price)
+            for option in options.split():
+                ProductAttributeValue.objects.create(product=product, attribute_value=values[option])
+        monkeypatch.setattr('products.attributes.MAX_INLINE_IDS', 1)
+
+        assert self.titles(api_client, 'color:red') == ['Red M', 'Red L']
+        assert self.titles(api_client, 'color:red,blue', 'size:m') == ['Red M', 'Blue M']
+
+    def test_index_follows_changes(self, api_client, values, product, no_response_cache):
+        assert self.titles(api_client, 'color:blue') == []
+
+        link = ProductAttributeValue.objects.create(product=product, attribute_value=values['blue'])
+        assert self.titles(api_client, 'color:blue') == [product.title]
+
+        link.attribute_value = values['red']
+        link.save()
+        assert self.titles(api_client, 'color:blue') == []
+        assert self.titles(api_client, 'color:red') == [product.title]
+
+        link.delete()
+        assert self.titles(api_client, 'color:red') == []
+
+
+@pytest.mark.django_db
+class TestImportProducts:
+    def run(self, path, *args):
+        from io import StringIO
+        from django.core.management import call_command
+
+        stdout, stderr = StringIO(), StringIO()
+        call_command('import_products', str(path), *args, stdout=stdout, stderr=stderr)
+        return stdout.getvalue(), stderr.getvalue()
+
+    def titles(self, api_client, params):
+        return [row['title'] for row in api_client.get(reverse('product-list'), params).data['results']]
+
+    def test_csv_upsert(self, tmp_path, product, api_client):
+        from products.models import ProductCategory
+
+        ProductCategory.objects.create(title='Phones')
+        Attribute.objects.create(title='Color', slug='color')
+        Product.objects.create(title='Taken', slug='pixel', price=1)
+        source = tmp_path / 'catalog.csv'
+        source.write_text(
+            'title,description,price,quantity,category,tags,attributes\n'
+            f'{product.title},updated,150,3,,,\n'
+            'Pixel,android phone,499.99,10,phones,"new,sale",color:Black\n'
+            'Pixel!,duplicate slug,1,1,,,\n'
+            'Broken,,abc,1,,,\n'
+            'Orphan,,1,1,Garden,,\n'
+        )
+        out, err = self.run(source, '--chunk-size', '2')
+        assert '2 created, 1 updated, 2 rows skipped' in out
+        assert 'Row 5:' in err and "Row 6: unknown category 'Garden'" in err
+
+        product.refresh_from_db()
+        assert (product.description, product.price, product.quantity) == ('updated', 150, 3)
+        pixel = Product.objects.get(title='Pixel')
+        assert pixel.slug == 'pixel-2'
+        assert Product.objects.get(title='Pixel!').slug == 'pixel-3'
+        assert pixel.category.slug == 'phones'
+        assert sorted(pixel.tags.values_list('title', flat=True)) == ['new', 'sale']
+        assert self.titles(api_client, {'attribute': 'color:black'}) == ['Pixel']
+        assert self.titles(api_client, {'search': 'android'}) == ['Pixel']
+        assert not (tmp_path / 'catalog.csv.import-state').exists()
+
+    def test_jsonl_resume(self, tmp_path):
+        source = tmp_path / 'catalog.jsonl'
+        source.write_text('\n'.join(
+            json.dumps({'title': f'Item {number}', 'price': number, 'tags': ['bulk']}) for number in range(5)
+        ))
+        state = tmp_path / 'catalog.jsonl.import-state'
+        state.write_text(json.dumps({'rows': 3}))
+
+        out, _ = self.run(source, '--resume')
+        assert 'Resuming after 3 rows' in out
+        assert sorted(Product.objects.values_list('title', flat=True)) == ['Item 3', 'Item 4']
+        assert Product.objects.get(title='Item 4').tags.get().title == 'bulk'
+
+    @pytest.mark.parametrize('field, message', [
+        ({'price': 'NaN'}, 'must be numbers'),
+        ({'price': 'Infinity'}, 'must be numbers'),
+        ({'quantity': [1]}, 'must be numbers'),
+        ({'tags': 5}, 'tags must be'),
+        ({'attributes': ['a']}, 'attributes must be'),
+    ])
+    def test_malformed_row_is_a_row_error(self, tmp_path, field, message):
+        source = tmp_path / 'catalog.jsonl'
+        source.write_text('\n'.join([
+            json.dumps({'title': 'Bad', 'price': 1, **field}),
+            json.dumps({'title': 'Good', 'price': 1}),
+        ]))
+
+        _, err = self.run(source)
+        assert message in err
+        assert list(Product.objects.values_list('title', flat=True)) == ['Good']
+
+
+@pytest.mark.django_db
+class TestProductExport:
+    @pytest.fixture
+    def staff_client(self, api_client, user_factory):
+        api_client.force_authenticate(user=user_factory(mobile='09000000002', is_staff=True))
+        return api_client
+
+    def test_staff_only(self, api_client, user):
+        api_client.force_authenticate(user=user)
+        assert api_client.get(reverse('product-export')).status_code == status.HTTP_403_FORBIDDEN
+
+    def test_ndjson_and_csv(self, staff_client, product_factory, django_assert_max_num_queries):
+        from products.models import ProductCategory, ProductTag
+
+        phones = ProductCategory.objects.create(title='Phones')
+        sale = ProductTag.objects.create(title='Sale')
+        for number in range(5):
+            product_factory(title=f'Phone {number}', price=number, category=phones).tags.add(sale)
+        product_factory(title='Hidden', price=1, is_active=False)
+
+        # product chunks of 2, each with categories, tags and images: fixed per chunk
+        from products.exporting import export_queryset, iter_export_rows
+        with django_assert_max_num_queries(3 * 4 + 1):
+            rows = list(iter_export_rows(export_queryset(), chunk_size=2))
+        assert [row['title'] for row in rows] == [f'Phone {number}' for number in range(5)]
+
+        res = staff_client.get(reverse('product-export'))
+        assert res['Content-Type'] == 'application/x-ndjson'
+        lines = [json.loads(line) for line in b''.join(res.streaming_content).decode().splitlines()]
+        assert len(lines) == 5
+        assert (lines[0]['category'], lines[0]['tags'], lines[0]['price']) == ('phones', ['sale'], '0.00')
+
+        res = staff_client.get(reverse('product-export'), {'output': 'csv'})
+        content = b''.join(res.streaming_content).decode().splitlines()
+        assert content[0].startswith('id,title,slug')
+        assert len(content) == 6
+
+    def test_incremental_since(self, staff_client, product_factory):
+        from django.utils import timezone
+        from django.utils.timezone import timedelta
+
+        old = product_factory(title='Old', price=1)
+        Product.objects.filter(pk=old.pk).update(modified_at=timezone.now() - timedelta(days=2))
+        product_factory(title='New', price=1)
+        gone = product_factory(title='Gone', price=1)
+        gone.is_delete = True
+        gone.save()
+
+        since = (timezone.now() - timedelta(days=1)).isoformat()
+        res = staff_client.get(reverse('product-export'), {'since': since})
+        assert res['X-Export-Started']
+        rows = [json.loads(line) for line in b''.join(res.streaming_content).decode().splitlines()]
+        assert [(row['title'], row['is_delete']) for row in rows] == [('New', False), ('Gone', True)]
+
+        assert staff_client.get(reverse('product-export'), {'since': 'yesterday'}).status_code == 400
+
+    def test_since_sees_stock_and_counter_changes(self, settings, staff_client, product_factory):
+        from django.utils import timezone
+        from django.utils.timezone import timedelta
+        from products.counters import increment, rollup_counters
+
+        settings.PRODUCT_COUNTERS = {'SHARDS': 4}
+        stocked, liked = product_factory(title='Stocked', price=1), product_factory(title='Liked', price=1)
+        Product.objects.update(modified_at=timezone.now() - timedelta(days=2))
+        since = (timezone.now() - timedelta(days=1)).isoformat()
+
+        ProductInventory.objects.create(product=stocked, change=5)
+        increment(liked.pk, 'like_count')
+        rollup_counters()
+
+        res = staff_client.get(reverse('product-export'), {'since': since})
+        rows = [json.loads(line) for line in b''.join(res.streaming_content).decode().splitlines()]
+        assert [(row['title'], row['quantity'], row['like_count']) for row in rows] == [('Stocked', 5, 0), ('Liked', 0, 1)]
+
+    def test_command(self, product, tmp_path):
+        from io import StringIO
+        from django.core.management import call_command
+
+        stdout = StringIO()
+        call_command('export_products', stdout=stdout)
+        assert json.loads(stdout.getvalue())['title'] == product.title
+
+        target = tmp_path / 'catalog.csv'
+        call_command('export_products', '--format', 'csv', '--output', str(target), stdout=StringIO())
+        assert len(target.read_text().splitlines()) == 2
+
+
+def make_upload(name='front.png', size=(800, 400)):
+    from io import BytesIO
+    from django.core.files.uploadedfile import SimpleUploadedFile
+    from PIL import Image
+
+    buffer = BytesIO()
+    Image.new('RGBA', size, (200, 30, 30, 255)).save(buffer, format='PNG')
+    return SimpleUploadedFile(name, buffer.getvalue(), content_type='image/png')
+
+
+@pytest.mark.django_db(transaction=True)
+class TestImageVariants:
+    @pytest.fixture(autouse=True)
+    def media(self, settings, tmp_path):
+        settings.MEDIA_ROOT = tmp_path
+        settings.PRODUCT_IMAGE_VARIANTS = {'WIDTHS': (320, 640, 1280), 'FORMATS': ('webp', 'jpeg'), 'ASYNC': False}
+        return tmp_path
+
+    def test_generated_after_upload(self, media, api_client, product):
+        from PIL import Image
+        from products.models import ProductImage
+
+        image = ProductImage.objects.create(product=product, image=make_upload())
+        image.refresh_from_db()
+        # 1280 would upscale the 800px original
+        assert {format: sorted(sizes) for format, sizes in image.variants.items()} == {
+            'webp': ['320', '640'], 'jpeg': ['320', '640']
+        }
+        name = image.variants['webp']['320']
+        assert name == image.image.name.rsplit('.', 1)[0] + '.320w.webp'
+        with Image.open(media / name) as variant:
+            assert (variant.format, variant.size) == ('WEBP', (320, 160))
+
+        res = api_client.get(reverse('product-detail', kwargs={'pk': product.id}), {'expand': 'images'})
+        assert res.data['images'][0]['variants']['webp']['640w'].endswith('.640w.webp')
+        assert 'images' not in api_client.get(reverse('product-detail', kwargs={'pk': product.id})).data
+
+        image.delete()
+        assert not (media / name).exists()
+
+    def test_replaced_original_drops_its_variants(self, media, product):
+        from products.models import ProductImage
+
+        image = ProductImage.objects.create(product=product, image=make_upload())
+        image.refresh_from_db()
+        old = image.variants['webp']['320']
+        assert (media / old).exists()
+
+        image.image = make_upload('back.png', size=(400, 200))
+        image.save()
+        image.refresh_from_db()
+        assert not (media / old).exists()
+        assert image.variants['webp'].keys() == {'320'}
+        assert image.variants['webp']['320'].startswith(image.image.name.rsplit('.', 1)[0])
+
+    def test_narrow_original_is_processed_once(self, media, product):
+        from io import StringIO
+        from django.core.management import call_command
+        from products import images
+        from products.models import ProductImage
+
+        image = ProductImage.objects.create(product=product, image=make_upload(size=(200, 100)))
+        image.refresh_from_db()
+        assert image.variants == {}
+        assert not images.needs_variants(image)
+
+        stdout = StringIO()
+        call_command('generate_image_variants', stdout=stdout)
+        assert 'Generated variants for 0 images' in stdout.getvalue()
+
+    @pytest.mark.django_db(transaction=True)
+    def test_async_variants_move_etag_and_cache(self, media, settings, monkeypatch, api_client, product):
+        import threading
+        from products import images
+        from products.models import ProductImage
+
+        # Hold the pool callback until the variant-less page has been cached.
+        release, stored = threading.Event(), threading.Event()
+        store_variants = images.store_variants
+
+        def gated_store(*args):
+            release.wait(30)
+            store_variants(*args)
+            stored.set()
+        monkeypatch.setattr(images, 'store_variants', gated_store)
+        settings.PRODUCT_IMAGE_VARIANTS = {**settings.PRODUCT_IMAGE_VARIANTS, 'ASYNC': True}
+        url = reverse('product-list')
+        params = {'expand': 'images'}
+        ProductImage.objects.create(product=product, image=make_upload())
+
+        res = api_client.get(url, params)
+        etag = res['ETag']
+        assert res.data['results'][0]['images'][0]['variants'] == {}
+        assert api_client.get(url, params)['X-Cache'] == 'HIT'
+
+        release.set()
+        assert stored.wait(30)
+        res = api_client.get(url, params)
+        assert res['X-Cache'] == 'MISS' and res['ETag'] != etag
+        assert res.data['results'][0]['images'][0]['variants']['webp'].keys() == {'320w', '640w'}
+
+    def test_backfill_command(self, media, product):
+        from io import StringIO
+        from django.core.management import call_command
+        from products.models import ProductImage
+
+        ProductImage.objects.bulk_create([
+            ProductImage(product=product, image=f'product_images/{product.slug}/{number}.png')
+            for number in range(3)
+        ])
+        for image in ProductImage.objects.all():
+            image.image.storage.save(image.image.name, make_upload(size=(400, 300)))
+
+        stdout = StringIO()
+        call_command('generate_image_variants', '--workers', '2', stdout=stdout)
+        assert 'Generated variants for 3 images (0 failed)' in stdout.getvalue()
+        assert all(image.variants['jpeg'].keys() == {'320'} for image in ProductImage.objects.all())
+
+        call_command('generate_image_variants', stdout=stdout)
+        assert 'Generated variants for 0 images' in stdout.getvalue()
+
+
+@pytest.mark.django_db(transaction=True)
+def test_concurrent_stock_changes_lose_nothing(product, retry_locked):
+    from concurrent.futures import ThreadPoolExecutor
+    from django.db import connection
+
+    ProductInventory.objects.create(product=product, change=30)
+
+    def adjust(change):
+        try:
+            retry_locked(ProductInventory.objects.create, product_id=product.pk, change=change)
+            return True
+        except ValidationError:
+            return False
+        finally:
+            connection.close()
+
+    # 60 sales of one unit against 30 in stock, interleaved with 10 restocks of one
+    changes = [-1] * 60 + [1] * 10
+    with ThreadPoolExecutor(max_workers=8) as pool:
+        results = list(pool.map(adjust, changes))
+
+    sold = sum(1 for change, applied in zip(changes, results) if applied and change < 0)
+    assert results[60:] == [True] * 10
+    assert 30 <= sold <= 40
+    product.refresh_from_db()
+    assert product.quantity == 30 + 10 - sold
+    assert product.quantity == sum(ProductInventory.objects.values_list('change', flat=True))
+
+
+@pytest.mark.django_db
+class TestTrending:
+    def view(self, product, count, age):
+        from django.utils import timezone
+        from products.models import ProductView
+
+        views = [ProductView.objects.create(product=product, ip_address=f'10.1.{age.days}.{n}') for n in range(count)]
+        ProductView.objects.filter(pk__in=[view.pk for view in views]).update(created_at=timezone.now() - age)
+
+    def test_scores_decay_and_update_incrementally(self, api_client, user, product_factory, django_assert_num_queries):
+        from django.utils.timezone import timedelta
+        from products.models import ProductCategory, ProductLike
+        from products.trending import update_trending_scores
+
+        toys = ProductCategory.objects.create(title='Toys')
+        old = product_factory(title='Old hit', price=1)
+        fresh = product_factory(title='Fresh', price=1, category=toys)
+        liked = product_factory(title='Liked', price=1)
+        product_factory(title='Unseen', price=1)
+
+        self.view(old, 3, timedelta(days=2))
+        self.view(fresh, 1, timedelta(hours=1))
+        assert update_trending_scores() == 2
+
+        url = reverse('trending-products')
+        assert [row['title'] for row in api_client.get(url).data] == ['Fresh', 'Old hit']
+
+        ProductLike.objects.create(product=liked, user=user)
+        # the next run reads only the new rows and writes one product: state,
+        # two cursors, two grouped reads, scores, one bulk update, state, and
+        # the savepoint pair
+        with django_assert_num_queries(10):
+            assert update_trending_scores() == 1
+        res = api_client.get(url, {'limit': 2})
+        assert res['X-Cache'] == 'MISS'
+        assert [row['title'] for row in res.data] == ['Liked', 'Fresh']
+        assert [row['title'] for row in api_client.get(url, {'category': 'toys'}).data] == ['Fresh']
+        assert 'trending_score' not in res.data[0]
+
+    def test_ignores_ordering_and_bad_limits(self, api_client, product_factory, no_response_cache):
+        from django.utils.timezone import timedelta
+        from products.trending import update_trending_scores
+
+        cheap, dear = product_factory(title='Cheap', price=1), product_factory(title='Dear', price=9)
+        self.view(cheap, 1, timedelta(hours=1))
+        self.view(dear, 2, timedelta(hours=1))
+        update_trending_scores()
+
+        url = reverse('trending-products')
+        # the list is a slice, which OrderingFilter must not reorder
+        res = api_client.get(url, {'ordering': 'price'})
+        assert [row['title'] for row in res.data] == ['Dear', 'Cheap']
+        for limit in ('²', str(2 ** 64), '-1'):
+            res = api_client.get(url, {'limit': limit})
+            assert res.status_code == status.HTTP_200_OK and len(res.data) == 2
+
+    def test_rebase_keeps_ranking(self, product_factory, settings):
+        from django.utils import timezone
+        from django.utils.timezone import timedelta
+        from products.models import ProductTrendingState
+        from products.trending import trending_products, update_trending_scores
+
+        settings.PRODUCT_TRENDING = {'REBASE_AFTER': 3600}
+        first, second = product_factory(title='First', price=1), product_factory(title='Second', price=1)
+        self.view(first, 2, timedelta(hours=1))
+        self.view(second, 1, timedelta(hours=1))
+        update_trending_scores()
+        before = list(trending_products())
+
+        later = timezone.now() + timedelta(days=2)
+        update_trending_scores(now=later)
+        assert ProductTrendingState.objects.get().epoch == later
+        assert list(trending_products()) == before
+        assert before[0].trending_score / Product.objects.get(pk=first.pk).trending_score == pytest.approx(4)
+
+
+@pytest.mark.django_db
+class TestRecommendations:
+    def like(self, users, *products):
+        from products.likes import like_product
+
+        for user in users:
+            for product in products:
+                like_product(product, user)
+
+    def users(self, count):
+        from django.contrib.auth import get_user_model
+
+        return [get_user_model().objects.create(mobile=f'0912000000{n}', password='Zxcvbnm@123') for n in range(count)]
+
+    def test_co_liked_products_are_recommended(self, api_client, product_factory, django_capture_on_commit_callbacks):
+        from products.models import ProductCoOccurrence
+        from products.recommendations import update_recommendations
+
+        users = self.users(4)
+        shoe, sock, lace, hat = (product_factory(title=title, price=1) for title in ('Shoe', 'Sock', 'Lace', 'Hat'))
+        self.like(users[:3], shoe, sock)
+        self.like(users[:1], lace)
+        self.like(users[3:], hat)
+        assert update_recommendations() == (8, 3)
+        assert ProductCoOccurrence.objects.get(product=shoe, other=sock).count == 3
+
+        url = reverse('product-recommendations', kwargs={'pk': shoe.pk})
+        assert [row['title'] for row in api_client.get(url).data] == ['Sock', 'Lace']
+        assert [row['title'] for row in api_client.get(url, {'limit': 1}).data] == ['Sock']
+        hat_url = reverse('product-recommendations', kwargs={'pk': hat.pk})
+        assert api_client.get(hat_url).data == []
+
+        # the next run only pairs the new like with its user's earlier likes
+        self.like(users[3:], shoe)
+        with django_capture_on_commit_callbacks(execute=True):
+            assert update_recommendations() == (1, 2)
+        assert ProductCoOccurrence.objects.get(product=shoe, other=sock).count == 3
+        assert ProductCoOccurrence.objects.get(product=hat, other=shoe).count == 1
+        res = api_client.get(hat_url)
+        assert res['X-Cache'] == 'MISS'
+        assert [row['title'] for row in res.data] == ['Shoe']
+
+        assert update_recommendations() == (0, 0)
+        before = sorted(ProductCoOccurrence.objects.values_list('product', 'other', 'count'))
+        assert update_recommendations(rebuild=True) == (9, 4)
+        assert sorted(ProductCoOccurrence.objects.values_list('product', 'other', 'count')) == before
+
+    def test_toggling_a_like_does_not_inflate_pairs(self, product_factory):
+        from products.likes import set_like
+        from products.models import ProductCoOccurrence, ProductLikeRemoval, ProductRecommendation
+        from products.recommendations import update_recommendations
+
+        users = self.users(2)
+        shoe, sock = product_factory(title='Shoe', price=1), product_factory(title='Sock', price=1)
+        self.like(users, shoe, sock)
+        update_recommendations()
+        counts = sorted(ProductCoOccurrence.objects.values_list('product', 'other', 'count'))
+        assert ProductCoOccurrence.objects.get(product=shoe, other=sock).count == 2
+
+        for _ in range(3):
+            assert set_like(sock, users[0]) is False
+            assert set_like(sock, users[0]) is True
+            update_recommendations()
+        assert sorted(ProductCoOccurrence.objects.values_list('product', 'other', 'count')) == counts
+
+        # unliking only queues the removal for the next run
+        set_like(sock, users[1], liked=False)
+        assert ProductCoOccurrence.objects.get(product=shoe, other=sock).count == 2
+        assert update_recommendations() == (0, 2)
+        assert not ProductLikeRemoval.objects.exists()
+        assert ProductCoOccurrence.objects.get(product=shoe, other=sock).count == 1
+        # one co-like over sqrt(2 shoe likes * 1 sock like)
+        assert ProductRecommendation.objects.get(product=sock).score == pytest.approx(2 ** -0.5)
+
+        # both likes of a pair removed before the run, as when a user is deleted
+        set_like(sock, users[0], liked=False)
+        set_like(shoe, users[0], liked=False)
+        update_recommendations()
+        assert not ProductCoOccurrence.objects.exists()
+        assert not ProductRecommendation.objects.filter(product=sock).exists()
+
+    def test_unknown_product_ordering_and_limits(self, api_client, product_factory, no_response_cache):
+        from products.recommendations import update_recommendations
+
+        users = self.users(2)
+        shoe, sock, lace = (product_factory(title=title, price=price) for title, price in (('Shoe', 1), ('Sock', 3), ('Lace', 2)))
+        self.like(users, shoe, sock)
+        self.like(users[:1], lace)
+        update_recommendations()
+
+        url = reverse('product-recommendations', kwargs={'pk': shoe.pk})
+        # the list is a slice, which OrderingFilter must not reorder
+        assert [row['title'] for row in api_client.get(url, {'ordering': 'price'}).data] == ['Sock', 'Lace']
+        for limit in ('²', str(2 ** 64)):
+            res = api_client.get(url, {'limit': limit})
+            assert res.status_code == status.HTTP_200_OK and len(res.data) == 2
+
+        missing = reverse('product-recommendations', kwargs={'pk': 10 ** 6})
+        assert api_client.get(missing).status_code == status.HTTP_404_NOT_FOUND
+        shoe.is_active = False
+        shoe.save()
+        assert api_client.get(url).status_code == status.HTTP_404_NOT_FOUND
+
+
+@pytest.mark.django_db
+@pytest.mark.usefixtures('no_response_cache')
+class TestSparseFieldsets:
+    def create_products(self, product_factory, user, count, start=0):
+        from products.likes import like_product
+        from products.models import ProductTag
+
+        tag = ProductTag.objects.get_or_create(title='Sale')[0]
+        for number in range(start, start + count):
+            product = product_factory(title=f'p{number}', price=number + 1)
+            product.tags.add(tag)
+            ProductComment.objects.create(user=user, product=product, text='hi')
+            like_product(product, user)
+
+    def count_queries(self, client, url, params=None):
+        from django.db import connection
+        from django.test.utils import CaptureQueriesContext
+
+        with CaptureQueriesContext(connection) as ctx:
+            res = client.get(url, params or {})
+        assert res.status_code == status.HTTP_200_OK
+        return len(ctx.captured_queries), res
+
+    @pytest.mark.parametrize('url_name', ['product-list', 'liked-products'])
+    def test_queries_independent_of_page_size(self, api_client, user, product_factory, url_name):
+        api_client.force_authenticate(user=user)
+        url = reverse(url_name)
+        params = {'expand': 'liked_by_me,images,comments'}
+        self.create_products(product_factory, user, 2)
+        few, res = self.count_queries(api_client, url, params)
+        assert len(res.data['results']) == 2
+
+        self.create_products(product_factory, user, 8, start=2)
+        many, res = self.count_queries(api_client, url, params)
+        assert len(res.data['results']) == 10
+        assert many == few
+        assert all(row['tags'] and row['comments'] for row in res.data['results'])
+
+    def test_list_is_slim_by_default(self, api_client, user, product_factory):
+        self.create_products(product_factory, user, 1)
+        url = reverse('product-list')
+        row = api_client.get(url).data['results'][0]
+        assert 'comments' not in row and row['tags']
+
+        detail = api_client.get(reverse('product-detail', kwargs={'pk': row['id']})).data
+        assert 'comments' not in detail
+        assert detail['comment_summary']['count'] == 1
+
+    def test_fields_selects_columns(self, api_client, user, product_factory):
+        self.create_products(product_factory, user, 1)
+        url = reverse('product-list')
+
+        # without tags requested, they are not loaded at all
+        queries, res = self.count_queries(api_client, url, {'fields': 'id,title,unknown'})
+        assert res.data['results'][0].keys() == {'id', 'title'}
+        assert queries == 2
+
+        row = api_client.get(url, {'fields': 'id,comments'}).data['results'][0]
+        assert row.keys() == {'id', 'comments'}
+        row = api_client.get(url, {'fields': 'title', 'expand': 'images'}).data['results'][0]
+        assert row.keys() == {'title'}
+
+
+@pytest.mark.django_db
+@pytest.mark.usefixtures('no_response_cache')
+class TestCommentEndpoints:
+    @pytest.fixture(autouse=True)
+    def small_pages(self, settings):
+        settings.PRODUCT_COMMENTS = {'PAGE_SIZE': 2, 'REPLY_PREVIEW': 2}
+
+    def thread(self, user, product, text, replies=0):
+        root = ProductComment.objects.create(user=user, product=product, text=text)
+        for number in range(replies):
+            ProductComment.objects.create(user=user, product=product, text=f'{text}.{number}', reply=root)
+        return root
+
+    def test_top_level_pages_with_reply_previews(self, api_client, user, product):
+        first = self.thread(user, product, 'a', replies=3)
+        self.thread(user, product, 'b')
+        self.thread(user, product, 'c', replies=1)
+        ProductComment.objects.create(user=user, product=product, text='hidden', is_delete=True)
+        ProductComment.objects.create(user=user, product=product, text='a.deep', reply=first.replies.first())
+
+        url = reverse('product-comments', kwargs={'pk': product.pk})
+        res = api_client.get(url)
+        assert [(row['text'], row['reply_count']) for row in res.data['results']] == [('a', 3), ('b', 0)]
+        assert [(row['text'], row['reply_count']) for row in res.data['results'][0]['replies']] == [('a.0', 1), ('a.1', 0)]
+
+        res = api_client.get(res.data['next'])
+        assert [row['text'] for row in res.data['results']] == ['c']
+        assert res.data['next'] is None
+
+        newest = api_client.get(url, {'ordering': '-created_at'}).data['results']
+        assert [row['text'] for row in newest] == ['c', 'b']
+
+        replies_url = reverse('product-comment-replies', kwargs={'pk': product.pk, 'comment_pk': first.pk})
+        res = api_client.get(replies_url)
+        assert [row['text'] for row in res.data['results']] == ['a.0', 'a.1']
+        assert [row['text'] for row in api_client.get(res.data['next']).data['results']] == ['a.2']
+
+    def test_queries_independent_of_threads(self, api_client, user, product):
+        from django.db import connection
+        from django.test.utils import CaptureQueriesContext
+
+        url = reverse('product-comments', kwargs={'pk': product.pk})
+        self.thread(user, product, 'a', replies=1)
+        with CaptureQueriesContext(connection) as shallow:
+            api_client.get(url)
+        for text in 'bcd':
+            self.thread(user, product, text, replies=5)
+        with CaptureQueriesContext(connection) as deep:
+            api_client.get(url)
+        # product, page, reply counts, previews and their reply counts
+        assert len(shallow) == len(deep) == 5
+
+    def test_not_found(self, api_client, user, product, product_factory):
+        comment = self.thread(user, product, 'a')
+        other = product_factory(title='Other', price=1)
+        url = reverse('product-comment-replies', kwargs={'pk': other.pk, 'comment_pk': comment.pk})
+        assert api_client.get(url).status_code == status.HTTP_404_NOT_FOUND
+
+        product.is_active = False
+        product.save()
+        url = reverse('product-comments', kwargs={'pk': product.pk})
+        assert api_client.get(url).status_code == status.HTTP_404_NOT_FOUND
+
+    def test_detail_links_to_comments(self, api_client, user, product):
+        self.thread(user, product, 'a', replies=2)
+        res = api_client.get(reverse('product-detail', kwargs={'pk': product.pk}))
+        summary = res.data['comment_summary']
+        assert (summary['count'], summary['threads']) == (3, 1)
+        assert summary['url'].endswith(reverse('product-comments', kwargs={'pk': product.pk}))
+        assert 'comments' not in res.data
+
+
+@pytest.mark.django_db
+@pytest.mark.usefixtures('no_response_cache')
+class TestCompiledSerializers:
+    @pytest.fixture
+    def catalog(self, user, product_factory):
+        from products.likes import like_product
+        from products.models import ProductCategory, ProductImage, ProductTag
+
+        phones = ProductCategory.objects.create(title='Phones')
+        sale, new = ProductTag.objects.create(title='Sale'), ProductTag.objects.create(title='New')
+        products = [
+            product_factory(title='Phone', description='Ünïcode "quoted"', price='19.90', category=phones),
+            product_factory(title='Case', description='', price='0.5'),
+            product_factory(title='Cable', description='x' * 300, price=1234567),
+        ]
+        products[0].tags.add(sale, new)
+        products[1].tags.add(sale)
+        image = ProductImage.objects.create(product=products[0], image='product_images/phone/front.jpg')
+        ProductImage.objects.filter(pk=image.pk).update(
+            variants={'webp': {'640': 'product_images/phone/front.640w.webp', '320': 'product_images/phone/front.320w.webp'}}
+        )
+        root = ProductComment.objects.create(user=user, product=products[0], text='root', rate=3)
+        ProductComment.objects.create(user=user, product=products[0], text='reply', reply=root)
+        for product in products[:2]:
+            like_product(product, user)
+        return products
+
+    @pytest.mark.parametrize('url_name', ['product-list', 'liked-products', 'trending-products'])
+    @pytest.mark.parametrize('params', [
+        {},
+        {'expand': 'liked_by_me,images,comments,comment_summary'},
+        {'fields': 'id,price,category,tags,created_at,rating_average'},
+        {'ordering': 'price', 'pagination': 'cursor'},
+    ])
+    def test_same_json_as_drf(self, api_client, user, catalog, monkeypatch, url_name, params):
+        from products.compiled import CompiledListSerializer
+        from products.trending import update_trending_scores
+
+        update_trending_scores()
+        api_client.force_authenticate(user=user)
+        url = reverse(url_name)
+        compiled = api_client.get(url, params)
+        monkeypatch.setattr(CompiledListSerializer, 'compiled', False)
+        reference = api_client.get(url, params)
+        assert compiled.status_code == reference.status_code == status.HTTP_200_OK
+        assert compiled.content == reference.content
+        assert compiled.get('ETag') == reference.get('ETag')
+
+    def test_values_rows(self, rf, catalog):
+        from rest_framework.request import Request
+        from products.compiled import compile_serializer, render
+        from products.serializers import ProductSerializer
+
+        request = Request(rf.get('/', {'fields': 'id,title,price,category,created_at'}))
+        serializer = ProductSerializer(many=True, context={'request': request}).child
+        rows = Product.objects.order_by('pk').values('id', 'title', 'price', 'category', 'created_at')
+        plan = compile_serializer(serializer, rows=True)
+        expected = [ProductSerializer(product, context={'request': request}).data for product in Product.objects.order_by('pk')]
+        assert [render(plan, row) for row in rows] == expected
+
+        with pytest.raises(TypeError):
+            compile_serializer(ProductSerializer(many=True, context={'request': Request(rf.get('/'))}).child, rows=True)
+
+
+@pytest.mark.django_db
+class TestProductBatch:
+    def test_ids_in_requested_order(self, api_client, product_factory, django_assert_num_queries):
+        from products.models import ProductTag, ProductView
+
+        sale = ProductTag.objects.create(title='Sale')
+        first, second, hidden = (product_factory(title=title, price=1) for title in ('First', 'Second', 'Hidden'))
+        for product in (first, second):
+            product.tags.add(sale)
+        hidden.is_active = False
+        hidden.save()
+
+        url = reverse('product-batch')
+        ids = f'{second.pk},{hidden.pk},{first.pk},999,{second.pk}'
+        # products, then their tags
+        with django_assert_num_queries(2):
+            res = api_client.get(url, {'ids': ids})
+        assert res.status_code == status.HTTP_200_OK
+        assert [row['title'] for row in res.data['results']] == ['Second', 'First']
+        assert res.data['results'][0]['tags'] == [sale.pk]
+        assert res.data['missing'] == [hidden.pk, 999]
+        assert not ProductView.objects.exists()
+        assert 'Last-Modified' not in res
+
+        cached = api_client.get(url, {'ids': ids})
+        assert cached['X-Cache'] == 'HIT'
+        assert api_client.get(url, {'ids': ids}, HTTP_IF_NONE_MATCH=res['ETag']).status_code == status.HTTP_304_NOT_MODIFIED
+
+    def test_slugs_and_fields(self, api_client, product_factory):
+        product_factory(title='Red shoe', price=1)
+        res = api_client.get(reverse('product-batch'), {'slugs': 'nope,red-shoe', 'fields': 'id,slug'})
+        assert [row.keys() for row in res.data['results']] == [{'id', 'slug'}]
+        assert res.data['missing'] == ['nope']
+
+    @pytest.mark.parametrize('params', [
+        {}, {'ids': '1', 'slugs': 'a'}, {'ids': '1,x'}, {'ids': '1,²'}, {'ids': f'1,{2 ** 64}'},
+        {'ids': ','.join(map(str, range(1, 52)))},
+    ])
+    def test_invalid_requests(self, api_client, params):
+        assert api_client.get(reverse('product-batch'), params).status_code == status.HTTP_400_BAD_REQUEST
+
+
+@pytest.mark.django_db
+@pytest.mark.usefixtures('no_response_cache')
+class TestQueryPlans:
+    """
+    EXPLAIN QUERY PLAN every SELECT a hot endpoint runs and fail when one of
+    them reads a large table in full, or sorts a page the index should order.
+    """
+    LARGE_TABLES = {
+        'products_product', 'products_productcomment', 'products_productlike', 'products_productview',
+        'products_productrecommendation', 'products_product_tags', 'products_productimage',
+    }
+    ENDPOINTS = [
+        ('product-list', {}),
+        ('product-list', {'ordering': 'price'}),
+        ('product-list', {'ordering': '-rating_average'}),
+        ('product-list', {'pagination': 'cursor', 'ordering': '-price'}),
+        ('product-list', {'category': 'phones', 'expand': 'images,comment_summary'}),
+        ('product-detail', {}),
+        ('product-comments', {}),
+        ('product-comment-replies', {}),
+        ('product-recommendations', {}),
+        ('trending-products', {}),
+        ('product-batch', {}),
+        ('liked-products', {}),
+        ('liked-products', {'pagination': 'cursor', 'ordering': 'price'}),
+        ('category-tree', {}),
+    ]
+
+    @pytest.fixture
+    def catalog(self, user, product_factory):
+        from products.likes import like_product
+        from products.models import ProductCategory, ProductRecommendation, ProductTag
+
+        phones = ProductCategory.objects.create(title='Phones')
+        sale = ProductTag.objects.create(title='Sale')
+        products = [product_factory(title=f'p{number}', price=number + 1, category=phones) for number in range(3)]
+        for product in products:
+            product.tags.add(sale)
+            like_product(product, user)
+        root = ProductComment.objects.create(user=user, product=products[0], text='root')
+        ProductComment.objects.create(user=user, product=products[0], text='reply', reply=root)
+        ProductRecommendation.objects.create(product=products[0], recommended=products[1], rank=1, score=1)
+        Product.objects.update(trending_score=1)
+        return products[0], root
+
+    def url(self, name, catalog):
+        product, comment = catalog
+        kwargs = {
+            'product-detail': {'pk': product.pk},
+            'product-comments': {'pk': product.pk},
+            'product-comment-replies': {'pk': product.pk, 'comment_pk': comment.pk},
+            'product-recommendations': {'pk': product.pk},
+        }.get(name, {})
+        return reverse(name, kwargs=kwargs)
+
+    def plans(self, client, url, params):
+        """[(sql, [plan details])] for each SELECT the request ran."""
+        from django.db import connection
+        from django.test.utils import CaptureQueriesContext
+
+        with CaptureQueriesContext(connection) as ctx:
+            res = client.get(url, params)
+        assert res.status_code == status.HTTP_200_OK
+        plans = []
+        with connection.cursor() as cursor:
+            for query in ctx.captured_queries:
+                if query['sql'].startswith('SELECT'):
+                    cursor.execute(f"EXPLAIN QUERY PLAN {query['sql']}")
+                    plans.append((query['sql'], [row[-1] for row in cursor.fetchall()]))
+        return plans
+
+    @pytest.mark.parametrize('name, params', ENDPOINTS)
+    def test_no_full_table_scans(self, api_client, user, catalog, name, params):
+        import re
+
+        api_client.force_authenticate(user=user)
+        if name == 'product-batch':
+            params = {'ids': ','.join(str(pk) for pk in Product.objects.values_list('pk', flat=True))}
+        scans = [
+            (sql, detail)
+            for sql, details in self.plans(api_client, self.url(name, catalog), params)
+            for detail in details
+            if (match := re.fullmatch(r'SCAN (\w+)(?: AS \w+)?', detail)) and match[1] in self.LARGE_TABLES
+        ]
+        assert scans == []
+
+    @pytest.mark.parametrize('name, params, index', [
+        ('product-list', {}, 'product_pub_created_idx'),
+        ('product-list', {'ordering': 'price'}, 'product_pub_price_idx'),
+        ('product-list', {'ordering': '-rating_average'}, 'product_pub_rating_idx'),
+        ('trending-products', {}, 'product_pub_trending_idx'),
+        ('product-comments', {}, 'comment_thread_idx'),
+        ('product-comment-replies', {'ordering': '-created_at'}, 'comment_thread_idx'),
+    ])
+    def test_pages_read_in_index_order(self, api_client, catalog, name, params, index):
+        pages = [
+            details for sql, details in self.plans(api_client, self.url(name, catalog), params)
+            if ' LIMIT ' in sql and any(index in detail for detail in details)
+        ]
+        assert pages
+        assert not any('TEMP B-TREE FOR ORDER BY' in detail for details in pages for detail in details)
+
+    @pytest.mark.parametrize('params, index', [
+        ({'pagination': 'cursor'}, 'product_created_id_idx'),
+        ({'pagination': 'cursor', 'ordering': 'price'}, 'product_price_id_idx'),
+    ])
+    def test_liked_pages_read_in_index_order(self, api_client, user, params, index):
+        from django.db import connection
+        from products.models import ProductLike
+
+        # A user who liked most of the catalog: walking the products in page
+        # order beats sorting all of their likes, once the planner knows it.
+        Product.objects.bulk_create([Product(title=f'p{n}', slug=f'p{n}', price=n) for n in range(500)])
+        ProductLike.objects.bulk_create([ProductLike(product=product, user=user) for product in Product.objects.all()])
+        with connection.cursor() as cursor:
+            cursor.execute('ANALYZE')
+        api_client.force_authenticate(user=user)
+
+        pages = [details for sql, details in self.plans(api_client, reverse('liked-products'), params) if ' LIMIT ' in sql]
+        assert any(index in detail for details in pages for detail in details)
+        assert not any('TEMP B-TREE FOR ORDER BY' in detail for details in pages for detail in details)
+
+    def test_published_manager(self, product_factory):
+        hidden = product_factory(title='Hidden', price=1, is_active=False)
+        deleted = product_factory(title='Deleted', price=1, is_delete=True)
+        shown = product_factory(title='Shown', price=1)
+        assert list(Product.published.all()) == [shown]
+        assert set(Product.objects.exclude(pk=shown.pk).published()) == set()
+        assert set(Product.objects.all()) == {hidden, deleted, shown}